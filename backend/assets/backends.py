@@ -0,0 +1,483 @@
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, BinaryIO, List
+
+from assets.types import Asset, AssetInfo
+from metrics.core import registry
+
+MEMORY_BYTES = registry.gauge(
+    "asset_store_memory_bytes", "Bytes of asset content held in memory"
+)
+DISK_BYTES = registry.gauge(
+    "asset_store_disk_bytes", "Bytes of asset content stored on local disk"
+)
+SPILLS = registry.counter(
+    "asset_store_spills_total", "Assets moved from memory to disk"
+)
+EVICTIONS = registry.counter(
+    "asset_store_evictions_total",
+    "Assets removed from the store to stay within its limits",
+    ["reason"],
+)
+
+# Streamed uploads stay in memory up to this size before going to a temp file
+UPLOAD_SPOOL_BYTES = 1024 * 1024
+
+# Seconds between scans of a filesystem backend's directory while its size
+# (as far as this worker knows) is within the limit
+FILESYSTEM_PRUNE_INTERVAL = 60
+
+
+class AssetBackend(ABC):
+    """Where asset content and metadata are kept"""
+
+    @abstractmethod
+    def put(self, info: AssetInfo, data: bytes) -> AssetInfo:
+        """Store an asset unless one with the same ID exists; return the stored metadata"""
+
+    @abstractmethod
+    def get(self, asset_id: str) -> Asset | None:
+        pass
+
+    @abstractmethod
+    def delete(self, asset_id: str) -> bool:
+        pass
+
+    @abstractmethod
+    def list(self) -> List[AssetInfo]:
+        pass
+
+    def create_upload(self) -> BinaryIO:
+        """A file to stream the content of a new asset into, see put_file"""
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+
+    def put_file(self, info: AssetInfo, file: BinaryIO) -> AssetInfo:
+        """Store an asset from a file returned by create_upload, closing the file"""
+        with file:
+            file.seek(0)
+            return self.put(info, file.read())
+
+    def discard_upload(self, file: BinaryIO) -> None:
+        file.close()
+
+    def close(self) -> None:
+        pass
+
+
+@dataclass
+class _Entry:
+    info: AssetInfo
+    last_access: float
+    # Content while in memory, or the file it was spilled to
+    data: bytes | None
+    path: str | None = None
+
+
+class MemoryAssetBackend(AssetBackend):
+    """
+    Assets held by this process.
+
+    The most recently used assets stay in memory up to `max_memory_bytes`.
+    Colder assets are written to a spill directory and served from a memory
+    map; once the spilled assets exceed `max_disk_bytes`, or an asset hasn't
+    been used for `ttl` seconds, it is dropped.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int,
+        max_disk_bytes: int,
+        ttl: float,
+        spill_dir: str,
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.spill_root = spill_dir
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        # Least recently used first
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._spill_dir: str | None = None
+        self._lock = threading.Lock()
+
+    def put(self, info: AssetInfo, data: bytes) -> AssetInfo:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            existing = self._entries.get(info.id)
+            if existing is not None:
+                self._touch(info.id, existing, now)
+                return existing.info
+
+            self._entries[info.id] = _Entry(info, now, data)
+            self.memory_bytes += info.size
+            self._enforce_limits()
+            self._update_gauges()
+            return info
+
+    def get(self, asset_id: str) -> Asset | None:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(asset_id)
+            if entry is None:
+                return None
+            self._touch(asset_id, entry, now)
+            if entry.data is not None:
+                return Asset(**vars(entry.info), data=entry.data)
+
+            assert entry.path is not None
+            try:
+                return Asset(**vars(entry.info), data=map_file(entry.path))
+            except FileNotFoundError:
+                self._remove(asset_id, "missing")
+                self._update_gauges()
+                return None
+
+    def delete(self, asset_id: str) -> bool:
+        with self._lock:
+            if asset_id not in self._entries:
+                return False
+            self._remove(asset_id)
+            self._update_gauges()
+            return True
+
+    def list(self) -> List[AssetInfo]:
+        with self._lock:
+            self._expire(time.monotonic())
+            return [entry.info for entry in self._entries.values()]
+
+    def close(self) -> None:
+        """Remove everything, including the spill directory"""
+        with self._lock:
+            self._entries.clear()
+            self.memory_bytes = 0
+            self.disk_bytes = 0
+            if self._spill_dir is not None:
+                shutil.rmtree(self._spill_dir, ignore_errors=True)
+                self._spill_dir = None
+            self._update_gauges()
+
+    def __contains__(self, asset_id: str) -> bool:
+        return asset_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _touch(self, asset_id: str, entry: _Entry, now: float) -> None:
+        entry.last_access = now
+        self._entries.move_to_end(asset_id)
+
+    def _expire(self, now: float) -> None:
+        while self._entries:
+            asset_id, entry = next(iter(self._entries.items()))
+            if now - entry.last_access < self.ttl:
+                break
+            self._remove(asset_id, "ttl")
+        self._update_gauges()
+
+    def _enforce_limits(self) -> None:
+        # Spill the least recently used in-memory assets...
+        for entry in list(self._entries.values()):
+            if self.memory_bytes <= self.max_memory_bytes:
+                break
+            if entry.data:
+                self._spill(entry)
+
+        # ...and drop the least recently used spilled ones
+        for asset_id, entry in list(self._entries.items()):
+            if self.disk_bytes <= self.max_disk_bytes:
+                break
+            if entry.path is not None:
+                self._remove(asset_id, "disk")
+
+    def _spill(self, entry: _Entry) -> None:
+        if self._spill_dir is None:
+            os.makedirs(self.spill_root, exist_ok=True)
+            # One directory per store, so workers sharing the root don't collide
+            self._spill_dir = tempfile.mkdtemp(dir=self.spill_root)
+
+        assert entry.data is not None
+        path = os.path.join(self._spill_dir, entry.info.id)
+        with open(path, "wb") as file:
+            file.write(entry.data)
+        entry.path = path
+        entry.data = None
+        self.memory_bytes -= entry.info.size
+        self.disk_bytes += entry.info.size
+        SPILLS.inc()
+
+    def _remove(self, asset_id: str, reason: str | None = None) -> None:
+        entry = self._entries.pop(asset_id)
+        if entry.path is None:
+            self.memory_bytes -= entry.info.size
+        else:
+            self.disk_bytes -= entry.info.size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+        if reason:
+            EVICTIONS.inc(reason=reason)
+
+    def _update_gauges(self) -> None:
+        MEMORY_BYTES.set(self.memory_bytes)
+        DISK_BYTES.set(self.disk_bytes)
+
+
+class FilesystemAssetBackend(AssetBackend):
+    """
+    Assets stored as files in a directory that every worker (or node, on a
+    network file system) can share.
+
+    Each asset is a content file named by its ID plus a JSON metadata file.
+    Both are written to a temporary name and renamed into place, so readers
+    never see partial files. Content is read through a memory map. Reads
+    bump the content file's modification time; assets unused for `ttl`
+    seconds, and the least recently used ones beyond `max_bytes`, are
+    removed when new assets are stored.
+
+    Scanning the directory for that is done at most every
+    FILESYSTEM_PRUNE_INTERVAL seconds, unless the assets this worker stored
+    since the last scan take the directory over `max_bytes`. Assets stored
+    by other workers in the meantime are only seen by the next scan.
+    """
+
+    def __init__(self, root: str, max_bytes: int, ttl: float):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # Directory size at the last scan plus what was stored since
+        self._estimated_bytes = 0
+        self._last_prune: float | None = None
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, asset_id: str) -> str:
+        if not asset_id.isalnum():
+            raise ValueError(f"Invalid asset ID: {asset_id}")
+        return os.path.join(self.root, asset_id)
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _read_info(self, asset_id: str) -> AssetInfo | None:
+        try:
+            with open(self._path(asset_id) + ".json") as file:
+                return AssetInfo(**json.load(file))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, info: AssetInfo, data: bytes) -> AssetInfo:
+        path = self._path(info.id)
+        existing = self._read_info(info.id)
+        if existing is not None and os.path.exists(path):
+            os.utime(path)
+            return existing
+
+        self._write_atomic(path, data)
+        self._write_atomic(path + ".json", json.dumps(asdict(info)).encode())
+        self._stored(info.size)
+        return info
+
+    def create_upload(self) -> BinaryIO:
+        # Written next to the assets, so storing it is a rename
+        return tempfile.NamedTemporaryFile(dir=self.root, prefix=".tmp-", delete=False)
+
+    def put_file(self, info: AssetInfo, file: BinaryIO) -> AssetInfo:
+        path = self._path(info.id)
+        file.close()
+        existing = self._read_info(info.id)
+        if existing is not None and os.path.exists(path):
+            os.unlink(file.name)
+            os.utime(path)
+            return existing
+
+        os.replace(file.name, path)
+        self._write_atomic(path + ".json", json.dumps(asdict(info)).encode())
+        self._stored(info.size)
+        return info
+
+    def discard_upload(self, file: BinaryIO) -> None:
+        file.close()
+        try:
+            os.unlink(file.name)
+        except FileNotFoundError:
+            pass
+
+    def get(self, asset_id: str) -> Asset | None:
+        if not asset_id.isalnum():
+            return None
+        info = self._read_info(asset_id)
+        if info is None:
+            return None
+        path = self._path(asset_id)
+        try:
+            os.utime(path)
+            return Asset(**vars(info), data=map_file(path))
+        except FileNotFoundError:
+            return None
+
+    def delete(self, asset_id: str) -> bool:
+        if not asset_id.isalnum():
+            return False
+        path = self._path(asset_id)
+        removed = False
+        for file_path in (path + ".json", path):
+            try:
+                os.remove(file_path)
+                removed = True
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def list(self) -> List[AssetInfo]:
+        infos: List[AssetInfo] = []
+        for name in os.listdir(self.root):
+            if name.endswith(".json") and not name.startswith("."):
+                info = self._read_info(name[: -len(".json")])
+                if info is not None:
+                    infos.append(info)
+        return infos
+
+    def _stored(self, size: int) -> None:
+        self._estimated_bytes += size
+        if (
+            self._last_prune is None
+            or self._estimated_bytes > self.max_bytes
+            or time.monotonic() - self._last_prune >= FILESYSTEM_PRUNE_INTERVAL
+        ):
+            self._prune()
+
+    def _prune(self) -> None:
+        self._last_prune = time.monotonic()
+        now = time.time()
+        files: List[tuple[float, int, str]] = []
+        for name in os.listdir(self.root):
+            if name.endswith(".json") or name.startswith("."):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, name))
+
+        # Least recently used first
+        files.sort()
+        total_bytes = sum(size for _, size, _ in files)
+        for mtime, size, name in files:
+            if now - mtime >= self.ttl:
+                reason = "ttl"
+            elif total_bytes > self.max_bytes:
+                reason = "disk"
+            else:
+                break
+            if self.delete(name):
+                EVICTIONS.inc(reason=reason)
+            total_bytes -= size
+        self._estimated_bytes = total_bytes
+        DISK_BYTES.set(total_bytes)
+
+
+class RedisAssetBackend(AssetBackend):
+    """
+    Assets stored in Redis (or any server speaking its protocol), shared by
+    every worker and node pointing at it.
+
+    Each asset is a hash holding its content and metadata. Keys expire
+    `ttl` seconds after their last use; to bound memory, configure the
+    server with a maxmemory limit and an LRU eviction policy.
+    """
+
+    KEY_PREFIX = "asset:"
+    INFO_FIELDS = ("media_type", "file_name", "category", "size")
+
+    def __init__(self, client: Any, ttl: float):
+        self.client = client
+        self.ttl = int(ttl)
+
+    def _key(self, asset_id: str) -> str:
+        return self.KEY_PREFIX + asset_id
+
+    def _info(self, asset_id: str, values: List[Any]) -> AssetInfo:
+        media_type, file_name, category, size = [
+            value.decode() if isinstance(value, bytes) else value for value in values
+        ]
+        return AssetInfo(
+            id=asset_id,
+            media_type=media_type,
+            file_name=file_name,
+            category=category or None,
+            size=int(size),
+        )
+
+    def put(self, info: AssetInfo, data: bytes) -> AssetInfo:
+        key = self._key(info.id)
+        values = self.client.hmget(key, self.INFO_FIELDS)
+        if values[0] is not None:
+            self.client.expire(key, self.ttl)
+            return self._info(info.id, values)
+
+        # Set the TTL in the same transaction, so the key can't be left
+        # without one if the connection drops in between
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.hset(
+            key,
+            mapping={
+                "data": data,
+                "media_type": info.media_type,
+                "file_name": info.file_name,
+                "category": info.category or "",
+                "size": info.size,
+            },
+        )
+        pipeline.expire(key, self.ttl)
+        pipeline.execute()
+        return info
+
+    def get(self, asset_id: str) -> Asset | None:
+        key = self._key(asset_id)
+        values = self.client.hmget(key, ("data",) + self.INFO_FIELDS)
+        if values[0] is None:
+            return None
+        self.client.expire(key, self.ttl)
+        return Asset(**vars(self._info(asset_id, values[1:])), data=values[0])
+
+    def delete(self, asset_id: str) -> bool:
+        return self.client.delete(self._key(asset_id)) > 0
+
+    def list(self) -> List[AssetInfo]:
+        infos: List[AssetInfo] = []
+        for key in self.client.scan_iter(match=self.KEY_PREFIX + "*"):
+            key = key.decode() if isinstance(key, bytes) else key
+            values = self.client.hmget(key, self.INFO_FIELDS)
+            if values[0] is not None:
+                infos.append(self._info(key[len(self.KEY_PREFIX) :], values))
+        return infos
+
+    def close(self) -> None:
+        self.client.close()
+
+
+def map_file(path: str) -> memoryview:
+    """Read-only memory map of a file, released when the view is garbage collected"""
+    with open(path, "rb") as file:
+        # Empty files can't be mapped
+        if os.fstat(file.fileno()).st_size == 0:
+            return memoryview(b"")
+        return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
@@ -0,0 +1,105 @@
+from typing import Dict, List
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from assets.store import AssetStore, AssetUpload
+from assets.types import AssetInfo
+
+# Upper bound on files in one multipart request
+MAX_FILES_PER_REQUEST = 100
+
+
+class MultipartAssetParser:
+    """
+    Stores the files of a multipart/form-data body while it is received.
+
+    Feed it the request body in chunks: each file part is written into an
+    AssetUpload as its bytes arrive, and committed to the store once the
+    part ends. Parts without a filename (plain form fields) are ignored.
+    """
+
+    def __init__(self, store: AssetStore, content_type: str, category: str | None = None):
+        media_type, options = parse_options_header(content_type)
+        boundary = options.get(b"boundary")
+        if media_type != b"multipart/form-data" or not boundary:
+            raise ValueError("Expected a multipart/form-data body with a boundary")
+
+        self.store = store
+        self.category = category
+        self.stored: List[AssetInfo] = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._upload: AssetUpload | None = None
+        self._ended = False
+        self._parser = MultipartParser(
+            boundary,
+            {
+                "on_part_begin": self._on_part_begin,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+                "on_end": self._on_end,
+            },
+        )
+
+    def feed(self, chunk: bytes) -> None:
+        self._parser.write(chunk)
+
+    def finish(self) -> List[AssetInfo]:
+        """Stored assets, in the order of the request; raises if the body was cut off"""
+        self._parser.finalize()
+        if not self._ended:
+            self.abort()
+            raise ValueError("Incomplete multipart body")
+        return self.stored
+
+    def abort(self) -> None:
+        """Discard the file that was being received, e.g. after a client disconnect"""
+        if self._upload is not None:
+            self._upload.discard()
+            self._upload = None
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_field.strip().lower()] = self._header_value.strip()
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        file_name = options.get(b"filename")
+        if file_name is None:
+            return
+
+        if len(self.stored) >= MAX_FILES_PER_REQUEST:
+            raise ValueError(f"At most {MAX_FILES_PER_REQUEST} files per request")
+        media_type = self._headers.get(b"content-type")
+        self._upload = self.store.upload(
+            media_type=media_type.decode("latin-1") if media_type else None,
+            file_name=file_name.decode("utf-8", errors="replace") or None,
+            category=self.category,
+        )
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._upload is not None:
+            self._upload.write(data[start:end])
+
+    def _on_part_end(self) -> None:
+        if self._upload is not None:
+            upload, self._upload = self._upload, None
+            self.stored.append(upload.commit())
+
+    def _on_end(self) -> None:
+        self._ended = True
@@ -0,0 +1,179 @@
+import base64
+import binascii
+import hashlib
+from typing import List
+
+from assets.backends import (
+    AssetBackend,
+    FilesystemAssetBackend,
+    MemoryAssetBackend,
+    RedisAssetBackend,
+)
+from assets.types import Asset, AssetInfo
+from config import (
+    ASSET_BACKEND,
+    ASSET_REDIS_URL,
+    ASSET_STORE_DIR,
+    ASSET_STORE_MAX_DISK_BYTES,
+    ASSET_STORE_MAX_MEMORY_BYTES,
+    ASSET_STORE_SPILL_DIR,
+    ASSET_STORE_TTL,
+)
+
+DEFAULT_MEDIA_TYPE = "application/octet-stream"
+
+
+def content_id(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def asset_info(
+    asset_id: str,
+    size: int,
+    media_type: str | None,
+    file_name: str | None,
+    category: str | None,
+) -> AssetInfo:
+    return AssetInfo(
+        id=asset_id,
+        media_type=media_type or DEFAULT_MEDIA_TYPE,
+        file_name=file_name or f"asset-{asset_id[:12]}",
+        category=category,
+        size=size,
+    )
+
+
+def decode_data_url(data_url: str) -> tuple[bytes, str | None]:
+    """Bytes and media type of a base64 data URL"""
+    if not data_url or not data_url.startswith("data:") or "," not in data_url:
+        raise ValueError("Invalid data URL")
+
+    # Parse data URL: data:image/png;base64,iVBORw0KGgoAAAANS...
+    header, data = data_url.split(",", 1)
+    media_type = header[len("data:") :].split(";")[0] or None
+    try:
+        return base64.b64decode(data, validate=True), media_type
+    except binascii.Error as e:
+        raise ValueError(f"Invalid base64 data in data URL: {e}")
+
+
+class AssetUpload:
+    """
+    An asset whose content arrives in chunks, e.g. from a streamed request.
+
+    Chunks are hashed as they are written into a file provided by the
+    backend, so the content is never held in memory as a whole (unless the
+    backend keeps assets in memory anyway).
+    """
+
+    def __init__(
+        self,
+        backend: AssetBackend,
+        media_type: str | None = None,
+        file_name: str | None = None,
+        category: str | None = None,
+    ):
+        self.backend = backend
+        self.media_type = media_type
+        self.file_name = file_name
+        self.category = category
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = backend.create_upload()
+
+    def write(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> AssetInfo:
+        info = asset_info(
+            self._hash.hexdigest(),
+            self.size,
+            self.media_type,
+            self.file_name,
+            self.category,
+        )
+        return self.backend.put_file(info, self._file)
+
+    def discard(self) -> None:
+        self.backend.discard_upload(self._file)
+
+
+class AssetStore:
+    """
+    Content-addressed store for uploaded assets.
+
+    Assets are kept as decoded bytes keyed by their content hash: uploading
+    the same file again returns the existing asset instead of a new copy.
+    Storage is delegated to an AssetBackend.
+    """
+
+    def __init__(self, backend: AssetBackend):
+        self.backend = backend
+
+    def put(
+        self,
+        data: bytes,
+        media_type: str | None = None,
+        file_name: str | None = None,
+        category: str | None = None,
+    ) -> AssetInfo:
+        info = asset_info(content_id(data), len(data), media_type, file_name, category)
+        return self.backend.put(info, data)
+
+    def put_data_url(
+        self,
+        data_url: str,
+        file_name: str | None = None,
+        file_type: str | None = None,
+        category: str | None = None,
+    ) -> AssetInfo:
+        data, media_type = decode_data_url(data_url)
+        return self.put(data, media_type or file_type, file_name, category)
+
+    def upload(
+        self,
+        media_type: str | None = None,
+        file_name: str | None = None,
+        category: str | None = None,
+    ) -> AssetUpload:
+        """Start storing an asset whose content will be written in chunks"""
+        return AssetUpload(self.backend, media_type, file_name, category)
+
+    def get(self, asset_id: str) -> Asset | None:
+        return self.backend.get(asset_id)
+
+    def delete(self, asset_id: str) -> bool:
+        return self.backend.delete(asset_id)
+
+    def list(self) -> List[AssetInfo]:
+        return self.backend.list()
+
+    def close(self) -> None:
+        self.backend.close()
+
+
+def create_asset_backend(name: str = ASSET_BACKEND) -> AssetBackend:
+    """The backend selected by ASSET_BACKEND"""
+    if name == "memory":
+        return MemoryAssetBackend(
+            max_memory_bytes=ASSET_STORE_MAX_MEMORY_BYTES,
+            max_disk_bytes=ASSET_STORE_MAX_DISK_BYTES,
+            ttl=ASSET_STORE_TTL,
+            spill_dir=ASSET_STORE_SPILL_DIR,
+        )
+    if name == "filesystem":
+        return FilesystemAssetBackend(
+            root=ASSET_STORE_DIR,
+            max_bytes=ASSET_STORE_MAX_DISK_BYTES,
+            ttl=ASSET_STORE_TTL,
+        )
+    if name == "redis":
+        import redis
+
+        return RedisAssetBackend(redis.Redis.from_url(ASSET_REDIS_URL), ASSET_STORE_TTL)
+    raise ValueError(f"Unknown ASSET_BACKEND: {name}")
+
+
+asset_store = AssetStore(create_asset_backend())
@@ -0,0 +1,22 @@
+from dataclasses import dataclass
+from typing import Union
+
+# Asset content: bytes, or a memory-mapped view for assets read from disk
+AssetData = Union[bytes, memoryview]
+
+
+@dataclass(frozen=True)
+class AssetInfo:
+    """Metadata of an uploaded file, stored once per distinct content"""
+
+    # Hex SHA-256 of the content, so the same file always gets the same ID
+    id: str
+    media_type: str
+    file_name: str
+    category: str | None
+    size: int
+
+
+@dataclass(frozen=True)
+class Asset(AssetInfo):
+    data: AssetData
@@ -1,24 +1,138 @@
 import re
+from typing import List
+
+FENCE_OPEN = "```html"
+FENCE_CLOSE = "```"
+HTML_OPEN = "<html"
+HTML_CLOSE = "</html>"
+# Characters kept from the previous chunk so markers split across chunks are found
+MARKER_OVERLAP = max(len(FENCE_OPEN), len(HTML_CLOSE)) - 1
+# What may come before <html on its line for it to start a document
+DOCUMENT_LINE_PREFIX = re.compile(r"\s*(?:<!DOCTYPE[^>]*>\s*)?", re.IGNORECASE)
+
+
+class HtmlStreamExtractor:
+    """
+    Extracts the HTML document from model output while it is streamed.
+
+    Each chunk is scanned once for the ```html code fence and the
+    <html ...> ... </html> boundaries, so the work over a whole stream is
+    linear in its length. `document` gives the same result as
+    extract_html_content on the text so far; `html` is the best guess while
+    the document is still incomplete; `closed` turns true as soon as the
+    document can no longer change:
+
+    - the code fence closed and contains an <html> tag, or
+    - </html> arrived outside of an unclosed code fence, for an <html> tag
+      that starts a line (possibly after a <!DOCTYPE>). A model mentioning
+      "<html>...</html>" in its prose before the code doesn't close it.
+    """
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._length = 0
+        self._tail = ""
+        # Start of the fence content and of its closing ```
+        self._fence_start: int | None = None
+        self._fence_end: int | None = None
+        self._fence_has_html = False
+        # Start of <html, end of its opening tag, and end of </html>
+        self._html_start: int | None = None
+        self._html_tag_end: int | None = None
+        self._html_end: int | None = None
+        self._html_starts_line = False
+
+    @property
+    def text(self) -> str:
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    @property
+    def closed(self) -> bool:
+        if self._fence_end is not None and self._fence_has_html:
+            return True
+        fence_is_open = self._fence_start is not None and self._fence_end is None
+        return (
+            self._html_end is not None
+            and self._html_starts_line
+            and not fence_is_open
+        )
+
+    def feed(self, chunk: str) -> bool:
+        """Add streamed text; returns whether the document is now closed"""
+        window = self._tail + chunk
+        offset = self._length - len(self._tail)
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+        self._tail = window[-MARKER_OVERLAP:]
+
+        def find(marker: str, start: int) -> int | None:
+            index = window.find(marker, max(start - offset, 0))
+            return None if index == -1 else offset + index
+
+        if self._fence_start is None:
+            fence_open = find(FENCE_OPEN, 0)
+            if fence_open is not None:
+                self._fence_start = fence_open + len(FENCE_OPEN)
+        if self._fence_start is not None and self._fence_end is None:
+            self._fence_end = find(FENCE_CLOSE, self._fence_start)
+            if self._fence_end is not None:
+                fence = self.text[self._fence_start : self._fence_end]
+                self._fence_has_html = HTML_OPEN in fence
+
+        if self._html_start is None:
+            self._html_start = find(HTML_OPEN, 0)
+            if self._html_start is not None:
+                text = self.text
+                line_start = text.rfind("\n", 0, self._html_start) + 1
+                self._html_starts_line = (
+                    DOCUMENT_LINE_PREFIX.fullmatch(text, line_start, self._html_start)
+                    is not None
+                )
+        if self._html_start is not None and self._html_tag_end is None:
+            tag_end = find(">", self._html_start + len(HTML_OPEN))
+            self._html_tag_end = None if tag_end is None else tag_end + 1
+        if self._html_tag_end is not None and self._html_end is None:
+            html_close = find(HTML_CLOSE, self._html_tag_end)
+            if html_close is not None:
+                self._html_end = html_close + len(HTML_CLOSE)
+
+        return self.closed
+
+    @property
+    def document(self) -> str | None:
+        """The extracted HTML, or None if the text has no HTML structure (yet)"""
+        fence = None
+        if self._fence_start is not None and self._fence_end is not None:
+            fence = self.text[self._fence_start : self._fence_end].strip()
+
+        if fence is not None and self._fence_has_html:
+            return fence
+        if self._html_start is not None and self._html_end is not None:
+            return self.text[self._html_start : self._html_end]
+        return fence
+
+    @property
+    def html(self) -> str:
+        """The document, or the unfinished part of it while it is streaming"""
+        document = self.document
+        if document is not None:
+            return document
+        if self._fence_start is not None:
+            return self.text[self._fence_start :].strip().rstrip("`")
+        if self._html_start is not None:
+            return self.text[self._html_start :]
+        return self.text
 
 
 def extract_html_content(text: str):
-    # First, try to extract from markdown code blocks
-    markdown_match = re.search(r"```html\s*(.*?)\s*```", text, re.DOTALL)
-    if markdown_match:
-        html_code = markdown_match.group(1).strip()
-        # Check if this contains <html> tags
-        if "<html" in html_code:
-            return html_code
-    
-    # Second, try to find content within <html> tags and include the tags themselves
-    match = re.search(r"(<html.*?>.*?</html>)", text, re.DOTALL)
-    if match:
-        return match.group(1)
-    
-    # Third, try to extract just the HTML content from markdown without requiring <html> tags
-    if markdown_match:
-        return markdown_match.group(1).strip()
-    
+    extractor = HtmlStreamExtractor()
+    extractor.feed(text)
+    document = extractor.document
+    if document is not None:
+        return document
+
     # If no HTML structure found, log warning and return original text
     print(
         "[HTML Extraction] No <html> tags or markdown HTML blocks found in the generated content. First 200 chars: " + text[:200]
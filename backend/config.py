@@ -2,6 +2,7 @@
 # Setting to True will stream a mock response instead of calling the OpenAI API
 # TODO: Should only be set to true when value is 'True', not any abitrary truthy value
 import os
+import tempfile
 
 NUM_VARIANTS = 1 # this controls the number of response variants generated by the system
 
@@ -13,6 +14,143 @@ OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", None)
 
 # Image generation (optional)
 REPLICATE_API_KEY = os.environ.get("REPLICATE_API_KEY", None)
+# Overall deadline for one Replicate prediction, including time spent queued
+REPLICATE_PREDICTION_TIMEOUT = float(os.environ.get("REPLICATE_PREDICTION_TIMEOUT", 120))
+# Seconds Replicate may hold the create request open until the prediction
+# finishes ("Prefer: wait", max 60). Set to 0 to only poll.
+REPLICATE_PREFER_WAIT = int(os.environ.get("REPLICATE_PREFER_WAIT", 30))
+
+# Shared provider clients (see models/clients.py)
+# Clients are reused across requests and keyed by (provider, api_key, base_url)
+PROVIDER_CLIENT_MAX_CLIENTS = int(os.environ.get("PROVIDER_CLIENT_MAX_CLIENTS", 32))
+PROVIDER_CLIENT_IDLE_TIMEOUT = float(
+    os.environ.get("PROVIDER_CLIENT_IDLE_TIMEOUT", 300)
+)
+PROVIDER_CLIENT_MAX_CONNECTIONS = int(
+    os.environ.get("PROVIDER_CLIENT_MAX_CONNECTIONS", 100)
+)
+PROVIDER_CLIENT_MAX_KEEPALIVE = int(os.environ.get("PROVIDER_CLIENT_MAX_KEEPALIVE", 20))
+PROVIDER_CLIENT_KEEPALIVE_EXPIRY = float(
+    os.environ.get("PROVIDER_CLIENT_KEEPALIVE_EXPIRY", 30)
+)
+
+# Image preprocessing for Claude
+# Processed screenshots are cached by content hash, bounded by total base64 size
+IMAGE_PROCESSING_CACHE_MAX_BYTES = int(
+    os.environ.get("IMAGE_PROCESSING_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+)
+# Worker threads used for image decoding/resizing so it doesn't block the event loop
+IMAGE_PROCESSING_WORKERS = int(os.environ.get("IMAGE_PROCESSING_WORKERS", 4))
+
+# Video mode frame selection: "uniform" takes every Nth frame, "scene" picks the
+# frames that differ most from their neighbours and drops near-duplicates
+VIDEO_FRAME_SELECTION = os.environ.get("VIDEO_FRAME_SELECTION", "uniform")
+
+# Video uploads are streamed to this directory and referenced by ID from the
+# WebSocket request instead of being sent inline as a base64 data URL.
+# Point all workers at the same directory when running more than one.
+VIDEO_UPLOAD_DIR = os.environ.get(
+    "VIDEO_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "screenshot-to-code-videos")
+)
+VIDEO_UPLOAD_MAX_BYTES = int(os.environ.get("VIDEO_UPLOAD_MAX_BYTES", 500 * 1024 * 1024))
+# Uploads that were never used for a generation are deleted after this many seconds
+VIDEO_UPLOAD_TTL = float(os.environ.get("VIDEO_UPLOAD_TTL", 3600))
+
+# Uploaded assets (see assets/store.py and assets/backends.py)
+# Backends:
+# - "memory" (default): recently used assets are kept in memory up to
+#   ASSET_STORE_MAX_MEMORY_BYTES; colder ones are spilled to
+#   ASSET_STORE_SPILL_DIR and dropped once the disk limit is reached.
+#   Assets are only visible to the worker that stored them.
+# - "filesystem": assets are files in ASSET_STORE_DIR, shared by all workers
+#   (and nodes, on a shared volume) and bounded by ASSET_STORE_MAX_DISK_BYTES.
+# - "redis": assets are stored on the Redis server at ASSET_REDIS_URL
+#   (needs the redis extra: `poetry install --extras redis`).
+# With any backend, assets unused for ASSET_STORE_TTL seconds are dropped.
+ASSET_BACKEND = os.environ.get("ASSET_BACKEND", "memory")
+ASSET_STORE_MAX_MEMORY_BYTES = int(
+    os.environ.get("ASSET_STORE_MAX_MEMORY_BYTES", 64 * 1024 * 1024)
+)
+ASSET_STORE_MAX_DISK_BYTES = int(
+    os.environ.get("ASSET_STORE_MAX_DISK_BYTES", 1024 * 1024 * 1024)
+)
+ASSET_STORE_TTL = float(os.environ.get("ASSET_STORE_TTL", 24 * 60 * 60))
+ASSET_STORE_SPILL_DIR = os.environ.get(
+    "ASSET_STORE_SPILL_DIR", os.path.join(tempfile.gettempdir(), "screenshot-to-code-assets")
+)
+ASSET_STORE_DIR = os.environ.get(
+    "ASSET_STORE_DIR", os.path.join(tempfile.gettempdir(), "screenshot-to-code", "assets")
+)
+ASSET_REDIS_URL = os.environ.get("ASSET_REDIS_URL", "redis://localhost:6379/0")
+
+# Generated image cache (see image_generation/cache.py)
+# Images are reused across sessions by (model, normalized alt text, size).
+# Backends: "sqlite" (default) or "none" to disable.
+IMAGE_CACHE_BACKEND = os.environ.get("IMAGE_CACHE_BACKEND", "sqlite")
+IMAGE_CACHE_PATH = os.environ.get(
+    "IMAGE_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "screenshot-to-code", "image_cache.sqlite3"),
+)
+# DALL-E and Replicate image URLs expire after an hour, so keep entries for less
+IMAGE_CACHE_TTL = float(os.environ.get("IMAGE_CACHE_TTL", 50 * 60))
+IMAGE_CACHE_MAX_ENTRIES = int(os.environ.get("IMAGE_CACHE_MAX_ENTRIES", 10000))
+
+# Image generation scheduling (see image_generation/scheduler.py)
+# Limits are per provider and shared by every WebSocket session in the process.
+# Set a requests-per-minute value to 0 to disable rate limiting for that provider.
+IMAGE_GENERATION_MAX_IN_FLIGHT = int(os.environ.get("IMAGE_GENERATION_MAX_IN_FLIGHT", 8))
+DALLE_REQUESTS_PER_MINUTE = float(os.environ.get("DALLE_REQUESTS_PER_MINUTE", 50))
+REPLICATE_REQUESTS_PER_MINUTE = float(
+    os.environ.get("REPLICATE_REQUESTS_PER_MINUTE", 300)
+)
+
+# WebSocket streaming
+# Streamed chunks for a variant are coalesced into one frame for up to this many
+# milliseconds or characters. Set the interval to 0 to send every chunk immediately.
+WS_CHUNK_FLUSH_INTERVAL_MS = float(os.environ.get("WS_CHUNK_FLUSH_INTERVAL_MS", 40))
+WS_CHUNK_FLUSH_MAX_CHARS = int(os.environ.get("WS_CHUNK_FLUSH_MAX_CHARS", 4096))
+
+# Early stream termination (see models/early_stop.py)
+# Provider streams are cancelled once the HTML document is complete, instead of
+# paying for the explanation models tend to add after it. A small share of
+# streams is left to run to the end to keep estimating the tokens this saves.
+# Off by default, since the explanation after the document is then not streamed.
+STREAM_STOP_AT_DOCUMENT_END = (
+    os.environ.get("STREAM_STOP_AT_DOCUMENT_END", "false").lower() == "true"
+)
+STREAM_EARLY_STOP_HOLDOUT = float(os.environ.get("STREAM_EARLY_STOP_HOLDOUT", 0.05))
+
+# Hedged requests (see models/hedging.py), off by default since a backup
+# request may be billed as well as the original one.
+# If a variant hasn't streamed its first chunk after the HEDGE_DELAY_PERCENTILE
+# of recent first-chunk latencies for its model (HEDGE_DEFAULT_DELAY until
+# enough have been seen, never less than HEDGE_MIN_DELAY), a backup request is
+# started and whichever streams first is kept. HEDGE_BACKUP_MODEL is "same" to
+# repeat the request, or "alternate" to use an equivalent model from another
+# provider when its API key is available (falling back to the same model).
+HEDGE_REQUESTS = os.environ.get("HEDGE_REQUESTS", "false").lower() == "true"
+HEDGE_DELAY_PERCENTILE = float(os.environ.get("HEDGE_DELAY_PERCENTILE", 95))
+HEDGE_MIN_DELAY = float(os.environ.get("HEDGE_MIN_DELAY", 2))
+HEDGE_DEFAULT_DELAY = float(os.environ.get("HEDGE_DEFAULT_DELAY", 15))
+HEDGE_BACKUP_MODEL = os.environ.get("HEDGE_BACKUP_MODEL", "same")
+
+# Provider failover (see models/failover.py)
+# Requests failing with a rate limit, server or connection error before
+# streaming anything are retried FAILOVER_MAX_RETRIES times (on top of the
+# provider SDK's own retries), waiting the provider's Retry-After or an
+# exponential backoff capped at FAILOVER_BACKOFF_MAX, then moved to an
+# equivalent model from another provider with an API key. After
+# CIRCUIT_BREAKER_FAILURES consecutive server or connection errors, a provider
+# is skipped for CIRCUIT_BREAKER_RESET_SECONDS. Off by default, since the code
+# may then come from a different model than the one selected.
+PROVIDER_FAILOVER = os.environ.get("PROVIDER_FAILOVER", "false").lower() == "true"
+FAILOVER_MAX_RETRIES = int(os.environ.get("FAILOVER_MAX_RETRIES", 1))
+FAILOVER_BACKOFF_BASE = float(os.environ.get("FAILOVER_BACKOFF_BASE", 1))
+FAILOVER_BACKOFF_MAX = float(os.environ.get("FAILOVER_BACKOFF_MAX", 8))
+CIRCUIT_BREAKER_FAILURES = int(os.environ.get("CIRCUIT_BREAKER_FAILURES", 5))
+CIRCUIT_BREAKER_RESET_SECONDS = float(
+    os.environ.get("CIRCUIT_BREAKER_RESET_SECONDS", 30)
+)
 
 # Debugging-related
 
@@ -2,6 +2,7 @@ import os
 import logging
 import uuid
 
+from codegen.utils import extract_html_content
 from config import DEBUG_DIR, IS_DEBUG_ENABLED
 
 
@@ -27,4 +28,4 @@ class DebugFileWriter:
             logging.error(f"Failed to write to file: {e}")
 
     def extract_html_content(self, text: str) -> str:
-        return str(text.split("<html>")[-1].rsplit("</html>", 1)[0] + "</html>")
+        return extract_html_content(text)
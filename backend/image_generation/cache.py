@@ -0,0 +1,196 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Set
+
+from config import (
+    IMAGE_CACHE_BACKEND,
+    IMAGE_CACHE_MAX_ENTRIES,
+    IMAGE_CACHE_PATH,
+    IMAGE_CACHE_TTL,
+)
+from metrics.core import registry
+
+IMAGE_CACHE_HITS = registry.counter(
+    "image_generation_cache_hits_total",
+    "Generated image lookups served from the persistent cache",
+    ["model"],
+)
+IMAGE_CACHE_MISSES = registry.counter(
+    "image_generation_cache_misses_total",
+    "Generated image lookups that required a new generation",
+    ["model"],
+)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case- and whitespace-insensitive form of an alt text prompt"""
+    return re.sub(r"\s+", " ", prompt).strip().lower()
+
+
+class GeneratedImageCache(ABC):
+    """
+    Maps (model, normalized prompt, size) to a generated image URL.
+
+    Lookups and writes are batched per page of prompts. Implementations may
+    block, so async callers should run them with asyncio.to_thread.
+    """
+
+    def get(self, model: str, prompt: str, size: str) -> str | None:
+        return self.get_many(model, [prompt], size).get(prompt)
+
+    def put(self, model: str, prompt: str, size: str, url: str) -> None:
+        self.put_many(model, size, {prompt: url})
+
+    def get_many(self, model: str, prompts: List[str], size: str) -> Dict[str, str]:
+        """URLs of the cached prompts, keyed by the prompts as given"""
+        normalized = {prompt: normalize_prompt(prompt) for prompt in prompts}
+        found = self._get_many(model, set(normalized.values()), size)
+        urls: Dict[str, str] = {}
+        for prompt, key in normalized.items():
+            if key in found:
+                urls[prompt] = found[key]
+                IMAGE_CACHE_HITS.inc(model=model)
+            else:
+                IMAGE_CACHE_MISSES.inc(model=model)
+        return urls
+
+    def put_many(self, model: str, size: str, urls: Dict[str, str]) -> None:
+        if urls:
+            self._put_many(
+                model,
+                size,
+                {normalize_prompt(prompt): url for prompt, url in urls.items()},
+            )
+
+    @abstractmethod
+    def _get_many(self, model: str, prompts: Set[str], size: str) -> Dict[str, str]:
+        pass
+
+    @abstractmethod
+    def _put_many(self, model: str, size: str, urls: Dict[str, str]) -> None:
+        pass
+
+
+class NullImageCache(GeneratedImageCache):
+    """Used when the cache is disabled"""
+
+    def _get_many(self, model: str, prompts: Set[str], size: str) -> Dict[str, str]:
+        return {}
+
+    def _put_many(self, model: str, size: str, urls: Dict[str, str]) -> None:
+        pass
+
+
+class SqliteImageCache(GeneratedImageCache):
+    """
+    Image cache stored in a local SQLite database, shared by every worker
+    on the machine.
+
+    Entries expire `ttl` seconds after they were generated (provider image
+    URLs are only valid for a limited time), and the least recently used
+    entries are evicted once there are more than `max_entries`.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS generated_images (
+                model TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                size TEXT NOT NULL,
+                url TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL,
+                PRIMARY KEY (model, prompt, size)
+            )
+            """
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS generated_images_last_accessed "
+            "ON generated_images (last_accessed)"
+        )
+        self._connection.commit()
+
+    def _get_many(self, model: str, prompts: Set[str], size: str) -> Dict[str, str]:
+        if not prompts:
+            return {}
+        now = time.time()
+        placeholders = ", ".join("?" * len(prompts))
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT prompt, url FROM generated_images "
+                f"WHERE model = ? AND size = ? AND prompt IN ({placeholders}) "
+                "AND created_at > ?",
+                (model, size, *prompts, now - self.ttl),
+            ).fetchall()
+            if rows:
+                self._connection.executemany(
+                    "UPDATE generated_images SET last_accessed = ? "
+                    "WHERE model = ? AND prompt = ? AND size = ?",
+                    [(now, model, prompt, size) for prompt, _ in rows],
+                )
+                self._connection.commit()
+            return dict(rows)
+
+    def _put_many(self, model: str, size: str, urls: Dict[str, str]) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO generated_images "
+                "(model, prompt, size, url, created_at, last_accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(model, prompt, size, url, now, now) for prompt, url in urls.items()],
+            )
+            self._evict(now)
+            self._connection.commit()
+
+    def _evict(self, now: float) -> None:
+        self._connection.execute(
+            "DELETE FROM generated_images WHERE created_at <= ?", (now - self.ttl,)
+        )
+        self._connection.execute(
+            "DELETE FROM generated_images WHERE rowid IN ("
+            "SELECT rowid FROM generated_images ORDER BY last_accessed DESC "
+            "LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM generated_images"
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+_image_cache: GeneratedImageCache | None = None
+
+
+def get_generated_image_cache() -> GeneratedImageCache:
+    """The process-wide cache selected by IMAGE_CACHE_BACKEND"""
+    global _image_cache
+    if _image_cache is None:
+        if IMAGE_CACHE_BACKEND == "sqlite":
+            _image_cache = SqliteImageCache(
+                IMAGE_CACHE_PATH, IMAGE_CACHE_TTL, IMAGE_CACHE_MAX_ENTRIES
+            )
+        elif IMAGE_CACHE_BACKEND == "none":
+            _image_cache = NullImageCache()
+        else:
+            raise ValueError(f"Unknown IMAGE_CACHE_BACKEND: {IMAGE_CACHE_BACKEND}")
+    return _image_cache
@@ -1,10 +1,20 @@
 import asyncio
 import re
-from typing import Dict, List, Literal, Union
-from openai import AsyncOpenAI
-from bs4 import BeautifulSoup
+from typing import Awaitable, Callable, Dict, List, Literal, Union
 
+from image_generation.cache import get_generated_image_cache
+from image_generation.img_tags import ImgTag, find_img_tags, rewrite_img_tags
 from image_generation.replicate import call_replicate
+from image_generation.scheduler import DEFAULT_SESSION, image_generation_scheduler
+from models.clients import openai_client
+
+# Size requested from each image model, part of the persistent cache key
+IMAGE_SIZES: Dict[str, str] = {"dalle3": "1024x1024", "flux": "1:1"}
+
+PLACEHOLDER_URL_PREFIX = "https://placehold.co"
+
+# Called with (alt text, image URL) as soon as each image is available
+ImageReadyCallback = Callable[[str, str], Awaitable[None]]
 
 
 async def process_tasks(
@@ -12,15 +22,35 @@ async def process_tasks(
     api_key: str,
     base_url: str | None,
     model: Literal["dalle3", "flux"],
+    session_id: str = DEFAULT_SESSION,
+    on_image_ready: ImageReadyCallback | None = None,
 ):
     import time
 
     start_time = time.time()
     if model == "dalle3":
-        tasks = [generate_image_dalle(prompt, api_key, base_url) for prompt in prompts]
+        tasks = [
+            generate_image_dalle(prompt, api_key, base_url, session_id)
+            for prompt in prompts
+        ]
     else:
-        tasks = [generate_image_replicate(prompt, api_key) for prompt in prompts]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+        tasks = [
+            generate_image_replicate(prompt, api_key, session_id) for prompt in prompts
+        ]
+
+    async def notify_when_ready(prompt: str, task: Awaitable[str | None]):
+        result = await task
+        if result and on_image_ready:
+            try:
+                await on_image_ready(prompt, result)
+            except Exception as e:
+                print(f"Failed to report generated image: {e}")
+        return result
+
+    results = await asyncio.gather(
+        *[notify_when_ready(prompt, task) for prompt, task in zip(prompts, tasks)],
+        return_exceptions=True,
+    )
     end_time = time.time()
     generation_time = end_time - start_time
     print(f"Image generation time: {generation_time:.2f} seconds")
@@ -37,34 +67,41 @@ async def process_tasks(
 
 
 async def generate_image_dalle(
-    prompt: str, api_key: str, base_url: str | None
+    prompt: str,
+    api_key: str,
+    base_url: str | None,
+    session_id: str = DEFAULT_SESSION,
 ) -> Union[str, None]:
-    client = AsyncOpenAI(api_key=api_key, base_url=base_url)
-    res = await client.images.generate(
-        model="dall-e-3",
-        quality="standard",
-        style="natural",
-        n=1,
-        size="1024x1024",
-        prompt=prompt,
-    )
-    await client.close()
+    async with image_generation_scheduler("openai").slot(
+        session_id
+    ), openai_client(api_key, base_url) as client:
+        res = await client.images.generate(
+            model="dall-e-3",
+            quality="standard",
+            style="natural",
+            n=1,
+            size=IMAGE_SIZES["dalle3"],  # type: ignore
+            prompt=prompt,
+        )
     return res.data[0].url
 
 
-async def generate_image_replicate(prompt: str, api_key: str) -> str:
+async def generate_image_replicate(
+    prompt: str, api_key: str, session_id: str = DEFAULT_SESSION
+) -> str:
 
     # We use Flux Schnell
-    return await call_replicate(
-        {
-            "prompt": prompt,
-            "num_outputs": 1,
-            "aspect_ratio": "1:1",
-            "output_format": "png",
-            "output_quality": 100,
-        },
-        api_key,
-    )
+    async with image_generation_scheduler("replicate").slot(session_id):
+        return await call_replicate(
+            {
+                "prompt": prompt,
+                "num_outputs": 1,
+                "aspect_ratio": IMAGE_SIZES["flux"],
+                "output_format": "png",
+                "output_quality": 100,
+            },
+            api_key,
+        )
 
 
 def extract_dimensions(url: str):
@@ -80,15 +117,51 @@ def extract_dimensions(url: str):
         return (100, 100)
 
 
-def create_alt_url_mapping(code: str) -> Dict[str, str]:
-    soup = BeautifulSoup(code, "html.parser")
-    images = soup.find_all("img")
+async def generate_image_urls(
+    prompts: List[str],
+    api_key: str,
+    base_url: str | None,
+    model: Literal["dalle3", "flux"],
+    session_id: str = DEFAULT_SESSION,
+    on_image_ready: ImageReadyCallback | None = None,
+) -> Dict[str, str | None]:
+    """Image URL for each prompt, reusing images from the persistent cache"""
+    persistent_cache = get_generated_image_cache()
+    size = IMAGE_SIZES[model]
+    mapped_image_urls: Dict[str, str | None] = {}
+
+    # Reuse images generated for the same prompt in earlier sessions
+    cached_urls = await asyncio.to_thread(
+        persistent_cache.get_many, model, prompts, size
+    )
+    for prompt in prompts:
+        if prompt in cached_urls:
+            mapped_image_urls[prompt] = cached_urls[prompt]
+            if on_image_ready:
+                await on_image_ready(prompt, cached_urls[prompt])
+    prompts_to_generate = [p for p in prompts if p not in mapped_image_urls]
+
+    if prompts_to_generate:
+        results = await process_tasks(
+            prompts_to_generate, api_key, base_url, model, session_id, on_image_ready
+        )
+        generated_urls = {
+            prompt: url for prompt, url in zip(prompts_to_generate, results) if url
+        }
+        await asyncio.to_thread(persistent_cache.put_many, model, size, generated_urls)
+        mapped_image_urls.update(zip(prompts_to_generate, results))
+
+    return mapped_image_urls
+
 
+def create_alt_url_mapping(code: str) -> Dict[str, str]:
     mapping: Dict[str, str] = {}
 
-    for image in images:
-        if not image["src"].startswith("https://placehold.co"):
-            mapping[image["alt"]] = image["src"]
+    for image in find_img_tags(code):
+        src = image.get("src")
+        alt = image.get("alt")
+        if src and alt is not None and not src.startswith(PLACEHOLDER_URL_PREFIX):
+            mapping[alt] = src
 
     return mapping
 
@@ -99,22 +172,26 @@ async def generate_images(
     base_url: Union[str, None],
     image_cache: Dict[str, str],
     model: Literal["dalle3", "flux"] = "dalle3",
+    session_id: str = DEFAULT_SESSION,
+    prefetched: Dict[str, Awaitable[str | None]] | None = None,
+    on_image_ready: ImageReadyCallback | None = None,
 ) -> str:
     # Find all images
-    soup = BeautifulSoup(code, "html.parser")
-    images = soup.find_all("img")
+    images = find_img_tags(code)
 
     # Extract alt texts as image prompts
     alts: List[str | None] = []
     for img in images:
         # Only include URL if the image starts with https://placehold.co
         # and it's not already in the image_cache
+        src = img.get("src")
+        alt = img.get("alt")
         if (
-            img.get("src", None)
-            and img["src"].startswith("https://placehold.co")
-            and image_cache.get(img.get("alt")) is None
+            src
+            and src.startswith(PLACEHOLDER_URL_PREFIX)
+            and (alt is None or image_cache.get(alt) is None)
         ):
-            alts.append(img.get("alt", None))
+            alts.append(alt)
 
     # Exclude images with no alt text
     filtered_alts: List[str] = [alt for alt in alts if alt is not None]
@@ -126,33 +203,64 @@ async def generate_images(
     if len(prompts) == 0:
         return code
 
+    # Images for some prompts may have been started while the code was streaming
+    prefetched = prefetched or {}
+    prefetched_prompts = [p for p in prompts if p in prefetched]
+    prompts_to_generate = [p for p in prompts if p not in prefetched]
+
+    async def await_prefetched(prompt: str) -> str | None:
+        try:
+            url = await prefetched[prompt]
+        except Exception as e:
+            print(f"An exception occurred: {e}")
+            return None
+        if url and on_image_ready:
+            await on_image_ready(prompt, url)
+        return url
+
     # Generate images
-    results = await process_tasks(prompts, api_key, base_url, model)
+    mapped_image_urls, prefetched_results = await asyncio.gather(
+        generate_image_urls(
+            prompts_to_generate, api_key, base_url, model, session_id, on_image_ready
+        ),
+        asyncio.gather(*[await_prefetched(p) for p in prefetched_prompts]),
+    )
+    mapped_image_urls.update(zip(prefetched_prompts, prefetched_results))
 
-    # Create a dict mapping alt text to image URL
-    mapped_image_urls = dict(zip(prompts, results))
+    for prompt, url in mapped_image_urls.items():
+        if not url:
+            print("Image generation failed for alt text:" + prompt)
 
     # Merge with image_cache
     mapped_image_urls = {**mapped_image_urls, **image_cache}
 
     # Replace old image URLs with the generated URLs
-    for img in images:
+    return replace_placeholder_images(code, mapped_image_urls, images)
+
+
+def replace_placeholder_images(
+    code: str,
+    image_urls: Dict[str, str | None],
+    images: List[ImgTag] | None = None,
+) -> str:
+    """Point placeholder images at the URL for their alt text, where there is one"""
+    if images is None:
+        images = find_img_tags(code)
+
+    def replace_placeholder(img: ImgTag) -> Dict[str, str] | None:
+        src = img.get("src")
+        alt = img.get("alt")
         # Skip images that don't start with https://placehold.co (leave them alone)
-        if not img["src"].startswith("https://placehold.co"):
-            continue
-
-        new_url = mapped_image_urls[img.get("alt")]
-
-        if new_url:
-            # Set width and height attributes
-            width, height = extract_dimensions(img["src"])
-            img["width"] = width
-            img["height"] = height
-            # Replace img['src'] with the mapped image URL
-            img["src"] = new_url
-        else:
-            print("Image generation failed for alt text:" + img.get("alt"))
+        if not src or not src.startswith(PLACEHOLDER_URL_PREFIX) or alt is None:
+            return None
+
+        new_url = image_urls.get(alt)
+        if not new_url:
+            return None
+
+        # Set width and height attributes and replace src with the mapped image URL
+        width, height = extract_dimensions(src)
+        return {"src": new_url, "width": str(width), "height": str(height)}
 
-    # Return the modified HTML
-    # (need to prettify it because BeautifulSoup messes up the formatting)
-    return soup.prettify()
+    # Splice the new attributes into the original HTML, keeping its formatting
+    return rewrite_img_tags(code, images, replace_placeholder)
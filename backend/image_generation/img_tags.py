@@ -0,0 +1,104 @@
+import html
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+
+# One scan over the document finds <img> tags and skips comments, scripts and
+# styles, whose contents are not markup. An <img> tag ends at the first ">"
+# outside of a quoted attribute value.
+TOKEN_PATTERN = re.compile(
+    r"<!--.*?(?:-->|\Z)"
+    r"|<(?P<raw>script|style)\b.*?(?:</(?P=raw)\s*>|\Z)"
+    r"|(?P<img><img\b(?:\"[^\"]*\"|'[^']*'|[^'\">])*>)",
+    re.IGNORECASE | re.DOTALL,
+)
+ATTRIBUTE_PATTERN = re.compile(
+    r"(?P<name>[^\s\"'>/=]+)"
+    r"(?:\s*=\s*(?:\"(?P<double>[^\"]*)\"|'(?P<single>[^']*)'|(?P<bare>[^\s\"'=<>`]+)))?"
+)
+
+
+@dataclass
+class ImgTag:
+    """An <img> tag and where it sits in the document"""
+
+    start: int
+    end: int
+    # Decoded attribute values, first occurrence wins like in browsers
+    attributes: Dict[str, str] = field(default_factory=dict)
+    # Span of each full `name=value` attribute, relative to the document
+    attribute_spans: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+
+    def get(self, name: str) -> str | None:
+        return self.attributes.get(name)
+
+
+def find_img_tags(code: str) -> List[ImgTag]:
+    """All <img> tags in an HTML document, in document order"""
+    tags: List[ImgTag] = []
+    for match in TOKEN_PATTERN.finditer(code):
+        if match.group("img") is None:
+            continue
+
+        tag = ImgTag(start=match.start(), end=match.end())
+        # Skip the "<img" prefix
+        for attribute in ATTRIBUTE_PATTERN.finditer(code, match.start() + 4, match.end() - 1):
+            name = attribute.group("name").lower()
+            if name in tag.attributes:
+                continue
+            value = next(
+                (v for v in attribute.group("double", "single", "bare") if v is not None),
+                "",
+            )
+            tag.attributes[name] = html.unescape(value)
+            tag.attribute_spans[name] = attribute.span()
+        tags.append(tag)
+    return tags
+
+
+def rewrite_img_tags(
+    code: str,
+    tags: List[ImgTag],
+    rewrite: Callable[[ImgTag], Dict[str, str] | None],
+) -> str:
+    """
+    Set attributes on <img> tags found by find_img_tags.
+
+    `rewrite` returns the attributes to set on a tag, or None to leave it
+    alone. Existing attributes are replaced where they stand and new ones are
+    appended to the tag; everything else in the document is kept byte for
+    byte.
+    """
+    parts: List[str] = []
+    position = 0
+    for tag in tags:
+        updates = rewrite(tag)
+        if not updates:
+            continue
+
+        # Closing of the tag: ">" or "/>"
+        close_start = tag.end - 1
+        if code[close_start - 1] == "/":
+            close_start -= 1
+        while close_start > tag.start and code[close_start - 1].isspace():
+            close_start -= 1
+
+        edits: List[Tuple[int, int, str]] = []
+        appended = ""
+        for name, value in updates.items():
+            attribute = f'{name}="{html.escape(value, quote=True)}"'
+            if name in tag.attribute_spans:
+                start, end = tag.attribute_spans[name]
+                edits.append((start, end, attribute))
+            else:
+                appended += " " + attribute
+        if appended:
+            edits.append((close_start, close_start, appended))
+
+        for start, end, replacement in sorted(edits):
+            parts.append(code[position:start])
+            parts.append(replacement)
+            position = end
+
+    parts.append(code[position:])
+    return "".join(parts)
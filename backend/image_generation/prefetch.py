@@ -0,0 +1,156 @@
+import asyncio
+import re
+from typing import Dict, List, Literal, Set
+
+from image_generation.core import PLACEHOLDER_URL_PREFIX, generate_image_urls
+from image_generation.img_tags import TOKEN_PATTERN, find_img_tags
+from image_generation.scheduler import DEFAULT_SESSION
+
+IMG_TAG_START = re.compile(r"<img\b", re.IGNORECASE)
+# End of a comment, script or style, whose contents are not markup
+RAW_TEXT_END = {
+    "comment": re.compile(r"-->"),
+    "script": re.compile(r"</script\s*>", re.IGNORECASE),
+    "style": re.compile(r"</style\s*>", re.IGNORECASE),
+}
+# Starts of tokens that can be cut off at the end of a chunk
+TOKEN_STARTS = ("<img", "<script", "<style", "<!--")
+# Text kept inside a comment, script or style in case it ends with part of
+# its closing tag (allowing for whitespace before the ">")
+MAX_PARTIAL_RAW_TEXT_END = 32
+
+
+class PlaceholderDetector:
+    """
+    Finds placeholder images in streamed code as soon as their tag is complete.
+
+    Tokens are found with img_tags.TOKEN_PATTERN, so like find_img_tags it
+    skips <img> tags inside comments, scripts and styles (e.g. JSX in a
+    React page). Text is scanned once: only an <img> tag that is still being
+    streamed, whether a comment, script or style is open, and the last few
+    characters in case they start a token are kept between chunks.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._seen: Set[str] = set()
+        # Pattern ending the comment, script or style being streamed, if any
+        self._raw_text_end: re.Pattern[str] | None = None
+
+    def feed(self, chunk: str) -> List[str]:
+        """Add streamed text and return alt texts of newly completed placeholders"""
+        self._buffer += chunk
+        alts: List[str] = []
+
+        position = 0
+        while True:
+            if self._raw_text_end is not None:
+                end = self._raw_text_end.search(self._buffer, position)
+                if end is None:
+                    keep_from = max(
+                        position, len(self._buffer) - MAX_PARTIAL_RAW_TEXT_END
+                    )
+                    break
+                self._raw_text_end = None
+                position = end.end()
+
+            match = TOKEN_PATTERN.search(self._buffer, position)
+            if match is None:
+                keep_from = self._incomplete_token_start(position)
+                break
+
+            if match.group("img") is not None:
+                alts.extend(self._new_placeholders(match.group()))
+                position = match.end()
+                continue
+
+            raw = match.group("raw")
+            kind = raw.lower() if raw else "comment"
+            content_start = match.start() + (len(raw) + 1 if raw else len("<!--"))
+            if content_start == len(self._buffer):
+                # "<script" may still turn out to be e.g. "<scripts"
+                keep_from = match.start()
+                break
+            self._raw_text_end = RAW_TEXT_END[kind]
+            position = content_start
+
+        self._buffer = self._buffer[keep_from:]
+        return alts
+
+    def _new_placeholders(self, img_tag: str) -> List[str]:
+        alts: List[str] = []
+        for tag in find_img_tags(img_tag):
+            src = tag.get("src")
+            alt = tag.get("alt")
+            if (
+                src
+                and src.startswith(PLACEHOLDER_URL_PREFIX)
+                and alt
+                and alt not in self._seen
+            ):
+                self._seen.add(alt)
+                alts.append(alt)
+        return alts
+
+    def _incomplete_token_start(self, position: int) -> int:
+        """Where a tag that is still incomplete, or the start of a token, begins"""
+        incomplete = IMG_TAG_START.search(self._buffer, position)
+        if incomplete:
+            return incomplete.start()
+        longest_start = max(len(start) for start in TOKEN_STARTS) - 1
+        tail_start = max(position, len(self._buffer) - longest_start)
+        last_open = self._buffer.rfind("<", tail_start)
+        if last_open != -1:
+            tail = self._buffer[last_open:].lower()
+            if any(start.startswith(tail) for start in TOKEN_STARTS):
+                return last_open
+        return len(self._buffer)
+
+
+class ImagePrefetcher:
+    """
+    Starts generating images for one variant while its code is streaming.
+
+    Feed it the variant's chunks; each placeholder image is generated as soon
+    as its tag has streamed, and the pending generations are handed to
+    generate_images once the code is complete.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str | None,
+        model: Literal["dalle3", "flux"],
+        image_cache: Dict[str, str],
+        session_id: str = DEFAULT_SESSION,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model: Literal["dalle3", "flux"] = model
+        self.image_cache = image_cache
+        self.session_id = session_id
+        self.detector = PlaceholderDetector()
+        self.tasks: Dict[str, asyncio.Task[str | None]] = {}
+
+    def feed(self, chunk: str) -> None:
+        for alt in self.detector.feed(chunk):
+            if alt in self.image_cache or alt in self.tasks:
+                continue
+            print(f"[IMAGE PREFETCH] Generating image while streaming: {alt}")
+            self.tasks[alt] = asyncio.create_task(self._generate(alt))
+
+    async def _generate(self, prompt: str) -> str | None:
+        urls = await generate_image_urls(
+            [prompt], self.api_key, self.base_url, self.model, self.session_id
+        )
+        return urls.get(prompt)
+
+    def cancel(self) -> None:
+        """
+        Stop generations that are no longer needed, e.g. after a variant
+        failed, or for placeholders that didn't make it into the final code
+        """
+        for alt, task in self.tasks.items():
+            if not task.done():
+                print(f"[IMAGE PREFETCH] Cancelling unused image: {alt}")
+                task.cancel()
@@ -1,65 +1,162 @@
 import asyncio
+import random
+import time
+from typing import Any, Iterator
+
 import httpx
 
+from config import REPLICATE_PREDICTION_TIMEOUT, REPLICATE_PREFER_WAIT
+from metrics.core import registry
+from models.clients import replicate_client
+
+REPLICATE_API_URL = "https://api.replicate.com/v1"
+FLUX_SCHNELL_PREDICTIONS_PATH = "/models/black-forest-labs/flux-schnell/predictions"
+
+# Status polling backs off exponentially from POLL_INITIAL_INTERVAL up to
+# POLL_MAX_INTERVAL seconds, with each sleep jittered between 50% and 100%
+POLL_INITIAL_INTERVAL = 0.2
+POLL_MAX_INTERVAL = 2.0
+POLL_BACKOFF_FACTOR = 1.5
+# Extra HTTP timeout on top of the time Replicate may hold a request open
+REQUEST_TIMEOUT = 10.0
+
+TERMINAL_STATUSES = ("succeeded", "failed", "canceled", "error")
+
+REQUESTS_PER_PREDICTION = registry.histogram(
+    "replicate_requests_per_prediction",
+    "HTTP requests sent to Replicate to run one prediction",
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+
+
+def poll_intervals(
+    initial: float = POLL_INITIAL_INTERVAL,
+    maximum: float = POLL_MAX_INTERVAL,
+    factor: float = POLL_BACKOFF_FACTOR,
+) -> Iterator[float]:
+    """Jittered, exponentially growing sleep durations between status checks"""
+    interval = initial
+    while True:
+        yield random.uniform(interval / 2, interval)
+        interval = min(maximum, interval * factor)
+
+
+async def call_replicate(
+    input: dict[str, str | int],
+    api_token: str,
+    api_url: str = REPLICATE_API_URL,
+    timeout: float | None = None,
+    prefer_wait: int | None = None,
+) -> str:
+    """
+    Run a Flux Schnell prediction and return the URL of the first output.
+
+    The create request asks Replicate to hold the connection open until the
+    prediction finishes ("Prefer: wait"), which usually makes it the only
+    request. Predictions that are still queued or running afterwards are
+    polled with exponential backoff until `timeout` seconds have passed since
+    the call started, and then canceled.
+    """
+    if timeout is None:
+        timeout = REPLICATE_PREDICTION_TIMEOUT
+    if prefer_wait is None:
+        prefer_wait = REPLICATE_PREFER_WAIT
+
+    start_time = time.monotonic()
+    deadline = start_time + timeout
 
-async def call_replicate(input: dict[str, str | int], api_token: str) -> str:
     headers = {
         "Authorization": f"Bearer {api_token}",
         "Content-Type": "application/json",
     }
+    create_headers = dict(headers)
+    wait = int(min(prefer_wait, 60, timeout))
+    if wait >= 1:
+        create_headers["Prefer"] = f"wait={wait}"
 
     data = {"input": input}
 
-    async with httpx.AsyncClient() as client:
+    async with replicate_client(api_token) as client:
         try:
             response = await client.post(
-                "https://api.replicate.com/v1/models/black-forest-labs/flux-schnell/predictions",
-                headers=headers,
+                api_url + FLUX_SCHNELL_PREDICTIONS_PATH,
+                headers=create_headers,
                 json=data,
+                timeout=wait + REQUEST_TIMEOUT,
             )
             response.raise_for_status()
-            response_json = response.json()
+            prediction: dict[str, Any] = response.json()
+            num_requests = 1
 
             # Extract the id from the response
-            prediction_id = response_json.get("id")
+            prediction_id = prediction.get("id")
             if not prediction_id:
                 raise ValueError("Prediction ID not found in initial response.")
+            status_check_url = prediction.get("urls", {}).get(
+                "get", f"{api_url}/predictions/{prediction_id}"
+            )
 
-            # Polling every 0.1 seconds until the status is succeeded or error (upto 10s)
-            num_polls = 0
-            max_polls = 100
-            while num_polls < max_polls:
-                num_polls += 1
+            intervals = poll_intervals()
+            while prediction.get("status") not in TERMINAL_STATUSES:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    await _cancel_prediction(client, prediction, api_url, headers)
+                    raise TimeoutError(
+                        f"Inference timed out after {timeout:.0f} seconds "
+                        f"(status: {prediction.get('status')})"
+                    )
 
-                await asyncio.sleep(0.1)
+                await asyncio.sleep(min(next(intervals), remaining))
 
                 # Check the status
-                status_check_url = (
-                    f"https://api.replicate.com/v1/predictions/{prediction_id}"
+                status_response = await client.get(
+                    status_check_url, headers=headers, timeout=REQUEST_TIMEOUT
                 )
-                status_response = await client.get(status_check_url, headers=headers)
                 status_response.raise_for_status()
-                status_response_json = status_response.json()
-                status = status_response_json.get("status")
-
-                # If status is succeeded or if there's an error, break out of the loop
-                if status == "succeeded":
-                    return status_response_json["output"][0]
-                elif status == "error":
-                    raise ValueError(
-                        f"Inference errored out: {status_response_json.get('error', 'Unknown error')}"
-                    )
-                elif status == "failed":
-                    raise ValueError("Inference failed")
+                prediction = status_response.json()
+                num_requests += 1
+
+            REQUESTS_PER_PREDICTION.observe(num_requests)
+            print(
+                f"[REPLICATE] Prediction {prediction_id} {prediction['status']} after "
+                f"{num_requests} requests in {time.monotonic() - start_time:.2f} seconds"
+            )
 
-            # If we've reached here, it means we've exceeded the max number of polls
-            raise TimeoutError("Inference timed out")
+            status = prediction["status"]
+            if status == "succeeded":
+                return prediction["output"][0]
+            elif status == "error":
+                raise ValueError(
+                    f"Inference errored out: {prediction.get('error', 'Unknown error')}"
+                )
+            elif status == "canceled":
+                raise ValueError("Inference canceled")
+            else:
+                raise ValueError(
+                    f"Inference failed: {prediction.get('error', 'Unknown error')}"
+                )
 
         except httpx.HTTPStatusError as e:
             raise ValueError(f"HTTP error occurred: {e}")
         except httpx.RequestError as e:
             raise ValueError(f"An error occurred while requesting: {e}")
-        except asyncio.TimeoutError:
-            raise TimeoutError("Request timed out")
+        except TimeoutError:
+            raise
         except Exception as e:
             raise ValueError(f"An unexpected error occurred: {e}")
+
+
+async def _cancel_prediction(
+    client: httpx.AsyncClient,
+    prediction: dict[str, Any],
+    api_url: str,
+    headers: dict[str, str],
+) -> None:
+    """Stop a prediction we gave up on so it doesn't keep running"""
+    cancel_url = prediction.get("urls", {}).get(
+        "cancel", f"{api_url}/predictions/{prediction['id']}/cancel"
+    )
+    try:
+        await client.post(cancel_url, headers=headers, timeout=REQUEST_TIMEOUT)
+    except httpx.HTTPError as e:
+        print(f"[REPLICATE] Failed to cancel prediction {prediction['id']}: {e}")
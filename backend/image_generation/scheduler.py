@@ -0,0 +1,173 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Literal
+
+from config import (
+    DALLE_REQUESTS_PER_MINUTE,
+    IMAGE_GENERATION_MAX_IN_FLIGHT,
+    REPLICATE_REQUESTS_PER_MINUTE,
+)
+from metrics.core import registry
+
+ImageProvider = Literal["openai", "replicate"]
+
+QUEUE_DEPTH = registry.gauge(
+    "image_generation_queue_depth",
+    "Image generation requests waiting for a scheduler slot",
+    ["provider"],
+)
+IN_FLIGHT = registry.gauge(
+    "image_generation_in_flight",
+    "Image generation requests currently running",
+    ["provider"],
+)
+QUEUE_WAIT = registry.histogram(
+    "image_generation_queue_wait_seconds",
+    "Time image generation requests spent waiting for a scheduler slot",
+    ["provider"],
+)
+
+DEFAULT_SESSION = "default"
+
+
+class ImageGenerationScheduler:
+    """
+    Limits concurrent image generation requests to one provider.
+
+    A request runs once there is a free in-flight slot and a token in the
+    requests-per-minute bucket. Waiting requests are queued per session and
+    sessions are served round-robin, so a page with many images cannot starve
+    other users.
+    """
+
+    def __init__(
+        self,
+        provider: ImageProvider,
+        max_in_flight: int,
+        requests_per_minute: float,
+        burst: int | None = None,
+    ):
+        self.provider = provider
+        self.max_in_flight = max(1, max_in_flight)
+        self.rate = requests_per_minute / 60
+        self.capacity = float(burst if burst is not None else self.max_in_flight)
+        self.tokens = self.capacity
+        self.in_flight = 0
+        self._updated_at = time.monotonic()
+        self._queues: OrderedDict[str, Deque[asyncio.Future[None]]] = OrderedDict()
+        self._refill_timer: asyncio.TimerHandle | None = None
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @asynccontextmanager
+    async def slot(self, session_id: str = DEFAULT_SESSION) -> AsyncIterator[None]:
+        """Wait for this session's turn and hold an in-flight slot"""
+        await self.acquire(session_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, session_id: str = DEFAULT_SESSION) -> None:
+        start_time = time.perf_counter()
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(session_id, deque()).append(future)
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just before the cancellation arrived
+                self.release()
+            else:
+                self._remove(session_id, future)
+            raise
+        finally:
+            self._update_gauges()
+
+        QUEUE_WAIT.observe(time.perf_counter() - start_time, provider=self.provider)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _remove(self, session_id: str, future: asyncio.Future[None]) -> None:
+        queue = self._queues.get(session_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+        if not queue:
+            del self._queues[session_id]
+        self._dispatch()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.rate > 0:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self._updated_at) * self.rate
+            )
+        self._updated_at = now
+
+    def _dispatch(self) -> None:
+        """Grant slots to waiting sessions in round-robin order"""
+        while self._queues and self.in_flight < self.max_in_flight:
+            if self.rate > 0:
+                self._refill()
+                if self.tokens < 1:
+                    self._schedule_refill((1 - self.tokens) / self.rate)
+                    break
+
+            session_id, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            if queue:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+            if future.done():
+                continue
+
+            if self.rate > 0:
+                self.tokens -= 1
+            self.in_flight += 1
+            future.set_result(None)
+
+        self._update_gauges()
+
+    def _schedule_refill(self, delay: float) -> None:
+        if self._refill_timer is not None:
+            return
+
+        def on_refill() -> None:
+            self._refill_timer = None
+            self._dispatch()
+
+        self._refill_timer = asyncio.get_running_loop().call_later(delay, on_refill)
+
+    def _update_gauges(self) -> None:
+        QUEUE_DEPTH.set(self.queue_depth, provider=self.provider)
+        IN_FLIGHT.set(self.in_flight, provider=self.provider)
+
+
+_schedulers: Dict[ImageProvider, ImageGenerationScheduler] = {}
+
+
+def image_generation_scheduler(provider: ImageProvider) -> ImageGenerationScheduler:
+    """The process-wide scheduler for an image provider"""
+    if provider not in _schedulers:
+        requests_per_minute = (
+            DALLE_REQUESTS_PER_MINUTE
+            if provider == "openai"
+            else REPLICATE_REQUESTS_PER_MINUTE
+        )
+        _schedulers[provider] = ImageGenerationScheduler(
+            provider, IMAGE_GENERATION_MAX_IN_FLIGHT, requests_per_minute
+        )
+    return _schedulers[provider]
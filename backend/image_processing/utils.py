@@ -1,14 +1,134 @@
+import asyncio
 import base64
+import hashlib
 import io
+import math
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 
+from config import IMAGE_PROCESSING_CACHE_MAX_BYTES, IMAGE_PROCESSING_WORKERS
+from metrics.core import registry
+
 CLAUDE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
 CLAUDE_MAX_IMAGE_DIMENSION = 7990
 
+# JPEG quality range searched when compressing images under the size limit
+JPEG_MAX_QUALITY = 95
+JPEG_MIN_QUALITY = 10
+JPEG_QUALITY_STEP = 5
+MAX_DOWNSCALE_ATTEMPTS = 3
+
+CACHE_HITS = registry.counter(
+    "image_processing_cache_hits_total", "Processed image cache hits"
+)
+CACHE_MISSES = registry.counter(
+    "image_processing_cache_misses_total", "Processed image cache misses"
+)
+CACHE_BYTES = registry.gauge(
+    "image_processing_cache_bytes", "Base64 bytes held by the processed image cache"
+)
+
+
+class ProcessedImageCache:
+    """
+    LRU cache of processed images keyed by a hash of the data URL.
+
+    Update requests resend every screenshot in the history, so the same image
+    is processed on every turn of an edit session. The cache is bounded by
+    the total size of the cached base64 strings.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(image_data_url: str) -> str:
+        return hashlib.sha256(image_data_url.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> tuple[str, str] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                CACHE_MISSES.inc()
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            CACHE_HITS.inc()
+            return entry
+
+    def put(self, key: str, value: tuple[str, str]) -> None:
+        size = _entry_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= _entry_size(previous)
+            self._entries[key] = value
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= _entry_size(evicted)
+            CACHE_BYTES.set(self.current_bytes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            CACHE_BYTES.set(0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _entry_size(value: tuple[str, str]) -> int:
+    return len(value[0]) + len(value[1])
+
+
+processed_image_cache = ProcessedImageCache(IMAGE_PROCESSING_CACHE_MAX_BYTES)
+
+# PIL releases the GIL while decoding, resizing and encoding, so a small thread
+# pool lets other WebSocket streams keep running while a large screenshot is processed
+image_processing_executor = ThreadPoolExecutor(
+    max_workers=IMAGE_PROCESSING_WORKERS, thread_name_prefix="image-processing"
+)
+
+
+async def process_image_async(image_data_url: str) -> tuple[str, str]:
+    """Run `process_image` in the image processing worker pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        image_processing_executor, process_image, image_data_url
+    )
+
+
+def shutdown_image_processing_executor() -> None:
+    image_processing_executor.shutdown(wait=False, cancel_futures=True)
+
 
 # Process image so it meets Claude requirements
 def process_image(image_data_url: str) -> tuple[str, str]:
+    cache_key = ProcessedImageCache.key_for(image_data_url)
+    cached = processed_image_cache.get(cache_key)
+    if cached is not None:
+        print("[CLAUDE IMAGE PROCESSING] cache hit")
+        return cached
+
+    result = _process_image_uncached(image_data_url)
+    processed_image_cache.put(cache_key, result)
+    return result
+
+
+def _process_image_uncached(image_data_url: str) -> tuple[str, str]:
 
     # Extract bytes and media type from base64 data URL
     media_type = image_data_url.split(";")[0].split(":")[1]
@@ -52,29 +172,84 @@ def process_image(image_data_url: str) -> tuple[str, str]:
     # Convert and compress as JPEG
     # We always compress as JPEG (95% at the least) even when we resize and the original image
     # is under the size limit.
-    quality = 95
-    output = io.BytesIO()
     img = img.convert("RGB")  # Ensure image is in RGB mode for JPEG conversion
-    img.save(output, format="JPEG", quality=quality)
-
-    # Reduce quality until image is under max size
-    while (
-        len(base64.b64encode(output.getvalue())) > CLAUDE_IMAGE_MAX_SIZE
-        and quality > 10
-    ):
-        output = io.BytesIO()
-        img.save(output, format="JPEG", quality=quality)
-        quality -= 5
+    jpeg_bytes, num_encodes = compress_jpeg_to_size_limit(img, CLAUDE_IMAGE_MAX_SIZE)
+    jpeg_base64 = base64.b64encode(jpeg_bytes).decode("utf-8")
 
     # Log so we know it was modified
     old_size = len(base64_data)
-    new_size = len(base64.b64encode(output.getvalue()))
+    new_size = len(jpeg_base64)
     print(
-        f"[CLAUDE IMAGE PROCESSING] image size updated: old size = {old_size} bytes, new size = {new_size} bytes"
+        f"[CLAUDE IMAGE PROCESSING] image size updated: old size = {old_size} bytes, new size = {new_size} bytes, encodes = {num_encodes}"
     )
 
     end_time = time.time()
     processing_time = end_time - start_time
     print(f"[CLAUDE IMAGE PROCESSING] processing time: {processing_time:.2f} seconds")
 
-    return ("image/jpeg", base64.b64encode(output.getvalue()).decode("utf-8"))
+    return ("image/jpeg", jpeg_base64)
+
+
+def base64_length(num_bytes: int) -> int:
+    """Length of the base64 encoding of `num_bytes` bytes (with padding)"""
+    return 4 * ((num_bytes + 2) // 3)
+
+
+def encode_jpeg(img: Image.Image, quality: int) -> bytes:
+    output = io.BytesIO()
+    img.save(output, format="JPEG", quality=quality)
+    return output.getvalue()
+
+
+def compress_jpeg_to_size_limit(
+    img: Image.Image, max_base64_size: int
+) -> tuple[bytes, int]:
+    """
+    Encode an RGB image as the highest quality JPEG whose base64 encoding fits
+    in `max_base64_size`.
+
+    Tries JPEG_MAX_QUALITY first (most screenshots fit), then binary searches
+    the qualities from JPEG_MIN_QUALITY in steps of JPEG_QUALITY_STEP so only
+    O(log n) full encodes are needed. If even
+    JPEG_MIN_QUALITY is too large, the image is downscaled in proportion to
+    the overshoot and searched again.
+
+    Returns the JPEG bytes and the number of encodes performed.
+    """
+    num_encodes = 0
+
+    for _ in range(MAX_DOWNSCALE_ATTEMPTS + 1):
+        best = encode_jpeg(img, JPEG_MAX_QUALITY)
+        num_encodes += 1
+        if base64_length(len(best)) <= max_base64_size:
+            return best, num_encodes
+
+        qualities = list(range(JPEG_MIN_QUALITY, JPEG_MAX_QUALITY, JPEG_QUALITY_STEP))
+        best_fit: bytes | None = None
+        smallest = best
+        low, high = 0, len(qualities) - 1
+        while low <= high:
+            middle = (low + high) // 2
+            candidate = encode_jpeg(img, qualities[middle])
+            num_encodes += 1
+            if base64_length(len(candidate)) <= max_base64_size:
+                best_fit = candidate
+                low = middle + 1
+            else:
+                smallest = min(smallest, candidate, key=len)
+                high = middle - 1
+
+        if best_fit is not None:
+            return best_fit, num_encodes
+
+        # Even the lowest quality is too large: shrink the image so the
+        # encoded size lands safely under the limit and try again
+        scale = math.sqrt(max_base64_size / base64_length(len(smallest))) * 0.9
+        new_size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+        img = img.resize(new_size, Image.DEFAULT_STRATEGY)
+        print(
+            f"[CLAUDE IMAGE PROCESSING] image downscaled to fit size limit: width = {new_size[0]}, height = {new_size[1]}"
+        )
+
+    # Give up and return the smallest encode we have
+    return smallest, num_encodes
@@ -70,3 +70,20 @@ MODEL_PROVIDER: dict[Llm, str] = {
 OPENAI_MODELS = {m for m, p in MODEL_PROVIDER.items() if p == "openai"}
 ANTHROPIC_MODELS = {m for m, p in MODEL_PROVIDER.items() if p == "anthropic"}
 GEMINI_MODELS = {m for m, p in MODEL_PROVIDER.items() if p == "gemini"}
+
+# Model used in place of a model from another provider, e.g. when hedging or
+# failing over to a different provider
+PROVIDER_DEFAULT_MODELS: dict[str, Llm] = {
+    "openai": Llm.GPT_4_1_2025_04_14,
+    "anthropic": Llm.CLAUDE_3_7_SONNET_2025_02_19,
+    "gemini": Llm.GEMINI_2_0_FLASH,
+}
+
+
+def alternate_models(model: Llm, providers: list[str]) -> list[Llm]:
+    """Equivalent models from the given providers, other than the model's own"""
+    return [
+        PROVIDER_DEFAULT_MODELS[provider]
+        for provider in providers
+        if provider != MODEL_PROVIDER[model] and provider in PROVIDER_DEFAULT_MODELS
+    ]
@@ -4,11 +4,26 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import screenshot, generate_code, home, evals, assets
+from assets.store import asset_store
+from image_processing.utils import shutdown_image_processing_executor
+from models.clients import client_registry
+from routes import screenshot, generate_code, home, evals, assets, metrics, video
 
-app = FastAPI(openapi_url=None, docs_url=None, redoc_url=None)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release pooled provider connections and worker threads on shutdown
+    await client_registry.aclose()
+    shutdown_image_processing_executor()
+    # Spilled assets live in a per-process directory
+    asset_store.close()
+
+
+app = FastAPI(openapi_url=None, docs_url=None, redoc_url=None, lifespan=lifespan)
 
 # Configure CORS settings
 app.add_middleware(
@@ -25,3 +40,5 @@ app.include_router(screenshot.router)
 app.include_router(home.router)
 app.include_router(evals.router)
 app.include_router(assets.router)
+app.include_router(metrics.router)
+app.include_router(video.router)
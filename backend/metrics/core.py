@@ -0,0 +1,209 @@
+import bisect
+import math
+import threading
+from typing import Dict, Generic, List, Literal, Sequence, Tuple, TypeVar
+
+MetricType = Literal["counter", "gauge", "histogram"]
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    20.0,
+    30.0,
+    60.0,
+    120.0,
+)
+
+T = TypeVar("T")
+
+
+class Metric(Generic[T]):
+    """Base class for a labelled metric family"""
+
+    type: MetricType
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, T] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(
+                f"Metric {self.name} expects labels {self.label_names}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _format_labels(
+        self, values: LabelValues, extra: Dict[str, str] | None = None
+    ) -> str:
+        pairs = list(zip(self.label_names, values)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = list(self._values.items())
+        for values, value in items:
+            lines.extend(self._render_value(values, value))
+        return lines
+
+    def _render_value(self, values: LabelValues, value: T) -> List[str]:
+        return [f"{self.name}{self._format_labels(values)} {_format_number(value)}"]  # type: ignore
+
+
+class Counter(Metric[float]):
+    type: MetricType = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric[float]):
+    type: MetricType = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class _HistogramValue:
+    def __init__(self, bucket_count: int):
+        self.bucket_counts = [0] * bucket_count
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram(Metric[_HistogramValue]):
+    type: MetricType = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = _HistogramValue(len(self.buckets))
+                self._values[key] = entry
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry.bucket_counts[index] += 1
+            entry.count += 1
+            entry.sum += value
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry.count if entry else 0
+
+    def sum(self, **labels: str) -> float:
+        entry = self._values.get(self._key(labels))
+        return entry.sum if entry else 0.0
+
+    def _render_value(self, values: LabelValues, value: _HistogramValue) -> List[str]:
+        lines: List[str] = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, value.bucket_counts):
+            cumulative += bucket_count
+            labels = self._format_labels(values, {"le": _format_number(bound)})
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = self._format_labels(values, {"le": "+Inf"})
+        lines.append(f"{self.name}_bucket{labels} {value.count}")
+        lines.append(f"{self.name}_sum{self._format_labels(values)} {value.sum}")
+        lines.append(f"{self.name}_count{self._format_labels(values)} {value.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric family and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}  # type: ignore
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:  # type: ignore
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Metric {metric.name} already registered")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))  # type: ignore
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))  # type: ignore
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))  # type: ignore
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(label_value: str) -> str:
+    return (
+        label_value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    )
+
+
+def _format_number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+# Process-wide registry exposed at GET /metrics
+registry = MetricsRegistry()
@@ -0,0 +1,210 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Tuple,
+    cast,
+)
+
+import anthropic
+import httpx
+import openai
+from anthropic import AsyncAnthropic
+from google import genai
+from google.genai import types
+from openai import AsyncOpenAI
+
+from config import (
+    PROVIDER_CLIENT_IDLE_TIMEOUT,
+    PROVIDER_CLIENT_KEEPALIVE_EXPIRY,
+    PROVIDER_CLIENT_MAX_CLIENTS,
+    PROVIDER_CLIENT_MAX_CONNECTIONS,
+    PROVIDER_CLIENT_MAX_KEEPALIVE,
+)
+
+Provider = Literal["openai", "anthropic", "gemini", "replicate"]
+ClientKey = Tuple[Provider, str, str | None]
+# A client and the coroutine function that releases its connection pool
+ClientWithCloser = Tuple[Any, Callable[[], Awaitable[None]]]
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=PROVIDER_CLIENT_MAX_CONNECTIONS,
+        max_keepalive_connections=PROVIDER_CLIENT_MAX_KEEPALIVE,
+        keepalive_expiry=PROVIDER_CLIENT_KEEPALIVE_EXPIRY,
+    )
+
+
+def _create_openai(api_key: str, base_url: str | None) -> ClientWithCloser:
+    client = AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=openai.DefaultAsyncHttpxClient(limits=_pool_limits()),
+    )
+    return client, client.close
+
+
+def _create_anthropic(api_key: str, base_url: str | None) -> ClientWithCloser:
+    client = AsyncAnthropic(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=anthropic.DefaultAsyncHttpxClient(limits=_pool_limits()),
+    )
+    return client, client.close
+
+
+def _create_gemini(api_key: str, base_url: str | None) -> ClientWithCloser:
+    # The SDK leaves a client it was given open, so the registry closes it.
+    # Timeouts are set per request by the SDK.
+    http_client = httpx.AsyncClient(limits=_pool_limits(), timeout=None)
+    http_options = types.HttpOptions(
+        base_url=base_url,
+        httpx_async_client=http_client,
+    )
+    client = genai.Client(api_key=api_key, http_options=http_options)
+    return client, http_client.aclose
+
+
+def _create_replicate(api_key: str, base_url: str | None) -> ClientWithCloser:
+    # Authorization headers are sent per request, the key only partitions the pool
+    client = httpx.AsyncClient(base_url=base_url or "", limits=_pool_limits())
+    return client, client.aclose
+
+
+CLIENT_FACTORIES: Dict[Provider, Callable[[str, str | None], ClientWithCloser]] = {
+    "openai": _create_openai,
+    "anthropic": _create_anthropic,
+    "gemini": _create_gemini,
+    "replicate": _create_replicate,
+}
+
+
+@dataclass
+class _ClientEntry:
+    client: Any
+    close: Callable[[], Awaitable[None]]
+    last_used: float
+    active: int = 0
+
+
+class ClientRegistry:
+    """
+    Process-wide pool of provider SDK clients.
+
+    Each client owns an httpx connection pool with keep-alive, so reusing it
+    across requests avoids a TCP/TLS handshake before every stream. Clients
+    are keyed by (provider, api_key, base_url) and kept in LRU order; idle
+    clients are closed when the registry is over capacity or when they have
+    not been used for `idle_timeout` seconds. Clients that are currently
+    leased are never closed.
+    """
+
+    def __init__(
+        self,
+        max_clients: int = PROVIDER_CLIENT_MAX_CLIENTS,
+        idle_timeout: float = PROVIDER_CLIENT_IDLE_TIMEOUT,
+    ):
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self._entries: "OrderedDict[ClientKey, _ClientEntry]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @asynccontextmanager
+    async def lease(
+        self, provider: Provider, api_key: str, base_url: str | None = None
+    ) -> AsyncIterator[Any]:
+        """Borrow the shared client for the given provider and credentials"""
+        entry = self._get_or_create((provider, api_key, base_url))
+        entry.active += 1
+        try:
+            yield entry.client
+        finally:
+            entry.active -= 1
+            entry.last_used = time.monotonic()
+            await self._evict_idle()
+
+    def _get_or_create(self, key: ClientKey) -> _ClientEntry:
+        entry = self._entries.get(key)
+        if entry is None:
+            provider, api_key, base_url = key
+            client, close = CLIENT_FACTORIES[provider](api_key, base_url)
+            entry = _ClientEntry(client=client, close=close, last_used=time.monotonic())
+            self._entries[key] = entry
+        else:
+            self._entries.move_to_end(key)
+        return entry
+
+    async def _evict_idle(self) -> None:
+        now = time.monotonic()
+        evicted: List[_ClientEntry] = []
+        over_capacity = len(self._entries) - self.max_clients
+
+        # Least recently used first
+        for key, entry in list(self._entries.items()):
+            if entry.active > 0:
+                continue
+            if over_capacity > 0 or now - entry.last_used > self.idle_timeout:
+                del self._entries[key]
+                evicted.append(entry)
+                over_capacity -= 1
+
+        for entry in evicted:
+            await self._close_entry(entry)
+
+    async def _close_entry(self, entry: _ClientEntry) -> None:
+        try:
+            await entry.close()
+        except Exception as e:
+            print(f"[PROVIDER CLIENTS] Failed to close client: {e}")
+
+    async def aclose(self) -> None:
+        """Close every pooled client (called on application shutdown)"""
+        entries = list(self._entries.values())
+        self._entries.clear()
+        await asyncio.gather(*(self._close_entry(entry) for entry in entries))
+
+
+client_registry = ClientRegistry()
+
+
+def openai_client(
+    api_key: str, base_url: str | None = None
+) -> AsyncContextManager[AsyncOpenAI]:
+    return cast(
+        AsyncContextManager[AsyncOpenAI],
+        client_registry.lease("openai", api_key, base_url),
+    )
+
+
+def anthropic_client(api_key: str) -> AsyncContextManager[AsyncAnthropic]:
+    return cast(
+        AsyncContextManager[AsyncAnthropic],
+        client_registry.lease("anthropic", api_key),
+    )
+
+
+def gemini_client(api_key: str) -> AsyncContextManager[genai.Client]:
+    return cast(
+        AsyncContextManager[genai.Client],
+        client_registry.lease("gemini", api_key),
+    )
+
+
+def replicate_client(api_key: str) -> AsyncContextManager[httpx.AsyncClient]:
+    return cast(
+        AsyncContextManager[httpx.AsyncClient],
+        client_registry.lease("replicate", api_key),
+    )
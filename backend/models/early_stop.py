@@ -0,0 +1,68 @@
+import random
+
+from codegen.utils import HtmlStreamExtractor
+from config import STREAM_EARLY_STOP_HOLDOUT
+from metrics.core import registry
+
+# Rough output characters per token, used to estimate tokens from streamed text
+CHARS_PER_TOKEN = 4
+
+EARLY_STOPS = registry.counter(
+    "llm_stream_early_stops_total",
+    "Provider streams cancelled once the HTML document was complete",
+    ["provider", "model"],
+)
+TRAILING_TOKENS = registry.histogram(
+    "llm_stream_trailing_tokens",
+    "Estimated output tokens streamed after the HTML document was complete",
+    ["provider", "model"],
+    buckets=(0, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+TOKENS_SAVED = registry.counter(
+    "llm_stream_tokens_saved_total",
+    "Estimated output tokens not generated thanks to early stops",
+    ["provider", "model"],
+)
+
+
+class DocumentEndDetector:
+    """
+    Decides when a provider stream can be cancelled.
+
+    Feed it every streamed chunk; `should_stop` turns true once the chunks
+    contain a complete HTML document (see HtmlStreamExtractor.closed).
+
+    Tokens saved by stopping can't be measured directly, so streams that run
+    to the end record how much followed the document, and each early stop
+    counts the average of that as saved. A share of streams
+    (STREAM_EARLY_STOP_HOLDOUT) always runs to the end to keep the average
+    current.
+    """
+
+    def __init__(self, provider: str, model: str, enabled: bool):
+        self.labels = {"provider": provider, "model": model}
+        self.enabled = enabled and random.random() >= STREAM_EARLY_STOP_HOLDOUT
+        self.extractor = HtmlStreamExtractor()
+        self.trailing_chars = 0
+        self.stopped = False
+
+    def should_stop(self, content: str) -> bool:
+        if self.extractor.closed:
+            self.trailing_chars += len(content)
+            return False
+        if self.extractor.feed(content) and self.enabled:
+            self.stopped = True
+        return self.stopped
+
+    def finish(self) -> None:
+        if self.stopped:
+            EARLY_STOPS.inc(**self.labels)
+            samples = TRAILING_TOKENS.count(**self.labels)
+            if samples:
+                TOKENS_SAVED.inc(TRAILING_TOKENS.sum(**self.labels) / samples, **self.labels)
+            print(
+                f"[EARLY STOP] {self.labels['provider']} {self.labels['model']}: "
+                f"stopped after {len(self.extractor.text)} characters"
+            )
+        elif self.extractor.closed:
+            TRAILING_TOKENS.observe(self.trailing_chars / CHARS_PER_TOKEN, **self.labels)
@@ -0,0 +1,285 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, List
+
+import anthropic
+import httpx
+import openai
+from google.genai import errors as genai_errors
+
+from config import (
+    CIRCUIT_BREAKER_FAILURES,
+    CIRCUIT_BREAKER_RESET_SECONDS,
+    FAILOVER_BACKOFF_BASE,
+    FAILOVER_BACKOFF_MAX,
+    FAILOVER_MAX_RETRIES,
+)
+from llm import Completion, Llm
+from metrics.core import registry
+from models.hedging import ChunkCallback, StreamFactory
+
+RETRIES = registry.counter(
+    "llm_retries_total",
+    "Provider requests retried after a transient error",
+    ["provider", "model"],
+)
+FAILOVERS = registry.counter(
+    "llm_failovers_total",
+    "Requests moved to another provider after transient errors",
+    ["from_provider", "to_provider"],
+)
+CIRCUIT_OPEN = registry.gauge(
+    "llm_circuit_open",
+    "Whether requests to the provider are currently being skipped",
+    ["provider"],
+)
+CIRCUIT_REJECTIONS = registry.counter(
+    "llm_circuit_rejections_total",
+    "Requests not sent to a provider because its circuit was open",
+    ["provider"],
+)
+
+# Anthropic reports errors that happen once a stream has started as an
+# "error" event on a 200 response; these types are worth retrying
+RETRYABLE_ERROR_TYPES = {"overloaded_error", "rate_limit_error", "api_error"}
+
+CONNECTION_ERRORS = (
+    openai.APIConnectionError,
+    anthropic.APIConnectionError,
+    httpx.TransportError,
+    ConnectionError,
+    asyncio.TimeoutError,
+)
+
+
+class ProvidersUnavailableError(Exception):
+    """Every provider that could serve a request has its circuit open"""
+
+
+def status_code(error: Exception) -> int | None:
+    if isinstance(error, (openai.APIStatusError, anthropic.APIStatusError)):
+        return error.status_code
+    if isinstance(error, genai_errors.APIError):
+        return error.code
+    return None
+
+
+def error_type(error: Exception) -> str | None:
+    """Type of an Anthropic error from its body, like overloaded_error"""
+    if isinstance(error, anthropic.APIStatusError) and isinstance(error.body, dict):
+        details = error.body.get("error")
+        if isinstance(details, dict):
+            return details.get("type")
+    return None
+
+
+def is_rate_limit(error: Exception) -> bool:
+    return status_code(error) == 429 or error_type(error) == "rate_limit_error"
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether the error is a rate limit, server or connection error"""
+    if isinstance(error, CONNECTION_ERRORS):
+        return True
+    if error_type(error) in RETRYABLE_ERROR_TYPES:
+        return True
+    status = status_code(error)
+    # 529 is Anthropic's "overloaded"
+    return status is not None and (status == 429 or status >= 500)
+
+
+def is_provider_failure(error: Exception) -> bool:
+    """
+    Whether the error suggests the provider itself is down. Rate limits are
+    per API key, so they don't count against the provider's circuit.
+    """
+    return is_retryable(error) and not is_rate_limit(error)
+
+
+def is_quota_exhausted(error: Exception) -> bool:
+    """A 429 that retrying won't fix (OpenAI reports billing limits as 429)"""
+    return isinstance(error, openai.RateLimitError) and error.code == "insufficient_quota"
+
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """
+    Seconds to wait before retry number `attempt` (from 0): the provider's
+    Retry-After if it sent one, exponential backoff with jitter otherwise
+    """
+    response = getattr(error, "response", None)
+    if isinstance(response, httpx.Response):
+        try:
+            return float(response.headers["retry-after"])
+        except (KeyError, ValueError):
+            pass
+    backoff = min(FAILOVER_BACKOFF_MAX, FAILOVER_BACKOFF_BASE * 2**attempt)
+    return backoff * random.uniform(0.5, 1)
+
+
+class CircuitBreaker:
+    """
+    Skips a provider after CIRCUIT_BREAKER_FAILURES consecutive failures.
+
+    Once CIRCUIT_BREAKER_RESET_SECONDS have passed, a single request is let
+    through to probe the provider: the circuit closes again if it succeeds
+    and stays open for another period if it fails.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        failure_threshold: int = CIRCUIT_BREAKER_FAILURES,
+        reset_seconds: float = CIRCUIT_BREAKER_RESET_SECONDS,
+    ):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        """Whether a request may be sent, claiming the probe when half-open"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.probing:
+            print(f"[CIRCUIT] Probing {self.provider}")
+            self.probing = True
+            return True
+        CIRCUIT_REJECTIONS.inc(provider=self.provider)
+        return False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            print(f"[CIRCUIT] {self.provider} recovered, closing circuit")
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        CIRCUIT_OPEN.set(0, provider=self.provider)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                print(
+                    f"[CIRCUIT] {self.provider} failed {self.failures} times, "
+                    f"skipping it for {self.reset_seconds:.0f}s"
+                )
+            self.opened_at = time.monotonic()
+            CIRCUIT_OPEN.set(1, provider=self.provider)
+        self.probing = False
+
+    def release(self) -> None:
+        """Give up the probe without an outcome, e.g. when it was cancelled"""
+        self.probing = False
+
+
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def circuit_breaker(provider: str) -> CircuitBreaker:
+    if provider not in circuit_breakers:
+        circuit_breakers[provider] = CircuitBreaker(provider)
+    return circuit_breakers[provider]
+
+
+@dataclass
+class FailoverCandidate:
+    provider: str
+    model: Llm
+    stream: StreamFactory
+
+
+async def stream_with_failover(
+    candidates: List[FailoverCandidate], callback: ChunkCallback
+) -> Completion:
+    """
+    Stream from the first candidate, retrying it with backoff on rate limit,
+    server and connection errors and then moving on to the next one.
+
+    Only requests that fail before streaming anything are retried, since the
+    client has already received the chunks of a request that fails midway.
+    Candidates whose provider circuit is open are skipped.
+    """
+    last_error: Exception | None = None
+    previous: FailoverCandidate | None = None
+
+    for candidate in candidates:
+        breaker = circuit_breaker(candidate.provider)
+        if not breaker.allow():
+            print(f"[FAILOVER] Skipping {candidate.model.value}, circuit is open")
+            continue
+        if previous is not None:
+            print(
+                f"[FAILOVER] {previous.model.value} unavailable, "
+                f"failing over to {candidate.model.value}"
+            )
+            FAILOVERS.inc(
+                from_provider=previous.provider, to_provider=candidate.provider
+            )
+        previous = candidate
+
+        attempt = 0
+        while True:
+            streamed = False
+
+            async def attempt_callback(content: str) -> None:
+                nonlocal streamed
+                streamed = True
+                await callback(content)
+
+            try:
+                completion = await candidate.stream(attempt_callback)
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                if streamed or not is_retryable(e):
+                    breaker.release()
+                    raise
+                if is_provider_failure(e):
+                    breaker.record_failure()
+                else:
+                    breaker.release()
+                last_error = e
+
+                if (
+                    attempt >= FAILOVER_MAX_RETRIES
+                    or is_quota_exhausted(e)
+                    or breaker.state != "closed"
+                ):
+                    break
+                delay = retry_delay(e, attempt)
+                if delay > FAILOVER_BACKOFF_MAX:
+                    break
+                attempt += 1
+                print(
+                    f"[FAILOVER] {candidate.model.value} failed ({e}), "
+                    f"retry {attempt} in {delay:.1f}s"
+                )
+                RETRIES.inc(provider=candidate.provider, model=candidate.model.value)
+                await asyncio.sleep(delay)
+                # A failure elsewhere may have opened the circuit meanwhile
+                if not breaker.allow():
+                    break
+                continue
+
+            breaker.record_success()
+            return completion
+
+    if last_error is not None:
+        raise last_error
+    raise ProvidersUnavailableError(
+        "All AI providers are currently unavailable, please try again shortly."
+    )
@@ -2,9 +2,11 @@ import base64
 import time
 from typing import Awaitable, Callable, Dict, List
 from openai.types.chat import ChatCompletionMessageParam
-from google import genai
 from google.genai import types
 from llm import Completion, Llm
+from models.clients import gemini_client
+from models.early_stop import DocumentEndDetector
+from models.timing import StreamTimer
 
 
 def extract_image_from_messages(
@@ -41,13 +43,16 @@ async def stream_gemini_response(
     api_key: str,
     callback: Callable[[str], Awaitable[None]],
     model_name: str,
+    stop_at_document_end: bool = False,
 ) -> Completion:
     start_time = time.time()
+    timer = StreamTimer("gemini", model_name)
+    callback = timer.wrap(callback)
+    detector = DocumentEndDetector("gemini", model_name, stop_at_document_end)
 
     # Get image data from messages
     image_data = extract_image_from_messages(messages)
 
-    client = genai.Client(api_key=api_key)
     full_response = ""
 
     if model_name == Llm.GEMINI_2_5_FLASH_PREVIEW_05_20.value:
@@ -66,29 +71,42 @@ async def stream_gemini_response(
             max_output_tokens=8000,
         )
 
-    async for chunk in await client.aio.models.generate_content_stream(
-        model=model_name,
-        contents={
-            "parts": [
-                {"text": messages[0]["content"]},  # type: ignore
-                types.Part.from_bytes(
-                    data=base64.b64decode(image_data["data"]),
-                    mime_type=image_data["mime_type"],
-                ),
-            ]
-        },
-        config=config,
-    ):
-        if chunk.candidates and len(chunk.candidates) > 0:
-            for part in chunk.candidates[0].content.parts:
-                if not part.text:
-                    continue
-                elif part.thought:
-                    print("Thought summary:")
-                    print(part.text)
-                else:
-                    full_response += part.text
-                    await callback(part.text)
+    with timer:
+        async with gemini_client(api_key) as client:
+            stream = await client.aio.models.generate_content_stream(
+                model=model_name,
+                contents={
+                    "parts": [
+                        {"text": messages[0]["content"]},  # type: ignore
+                        types.Part.from_bytes(
+                            data=base64.b64decode(image_data["data"]),
+                            mime_type=image_data["mime_type"],
+                        ),
+                    ]
+                },
+                config=config,
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.candidates and len(chunk.candidates) > 0:
+                        for part in chunk.candidates[0].content.parts:
+                            if not part.text:
+                                continue
+                            elif part.thought:
+                                print("Thought summary:")
+                                print(part.text)
+                            else:
+                                full_response += part.text
+                                await callback(part.text)
+                                if detector.should_stop(part.text):
+                                    break
+                    if detector.stopped:
+                        break
+            finally:
+                # Closes the connection, so the provider stops generating, also
+                # when stopped early or cancelled
+                await stream.aclose()  # type: ignore
 
+    detector.finish()
     completion_time = time.time() - start_time
     return {"duration": completion_time, "code": full_response}
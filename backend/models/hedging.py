@@ -0,0 +1,150 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List
+
+from config import HEDGE_DEFAULT_DELAY, HEDGE_DELAY_PERCENTILE, HEDGE_MIN_DELAY
+from llm import Completion
+from metrics.core import registry
+
+ChunkCallback = Callable[[str], Awaitable[None]]
+# Starts one provider request that streams its chunks into the callback
+StreamFactory = Callable[[ChunkCallback], Awaitable[Completion]]
+
+# Recent first-chunk latencies kept per model, and how many are needed before
+# their percentile replaces HEDGE_DEFAULT_DELAY
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+HEDGES_FIRED = registry.counter(
+    "llm_hedges_fired_total",
+    "Backup requests started because a stream was slow to start",
+    ["model"],
+)
+HEDGES_WON = registry.counter(
+    "llm_hedges_won_total",
+    "Backup requests that streamed before the original request",
+    ["model"],
+)
+
+
+class FirstChunkLatencies:
+    """Rolling window of time-to-first-chunk per model"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, model: str, seconds: float) -> None:
+        self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model: str, percentile: float) -> float | None:
+        samples = self._samples.get(model)
+        if not samples or len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        rank = math.ceil(percentile / 100 * len(ordered)) - 1
+        return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+
+first_chunk_latencies = FirstChunkLatencies()
+
+
+def hedge_delay(model: str) -> float:
+    """Seconds to wait for a first chunk before starting a backup request"""
+    delay = first_chunk_latencies.percentile(model, HEDGE_DELAY_PERCENTILE)
+    if delay is None:
+        return HEDGE_DEFAULT_DELAY
+    return max(delay, HEDGE_MIN_DELAY)
+
+
+async def hedged_stream(
+    model: str,
+    primary: StreamFactory,
+    backup: StreamFactory | None,
+    callback: ChunkCallback,
+) -> Completion:
+    """
+    Stream from `primary`, starting `backup` as well if no chunk has arrived
+    after hedge_delay(model).
+
+    Whichever request streams a chunk first is kept and the other one is
+    cancelled, so only one of them ever reaches `callback`. If a request
+    fails before streaming, the other one (if any) can still take over.
+
+    Only the primary request's time to first chunk is recorded for `model`,
+    since the backup starts later and may use another model. When the
+    primary is cancelled before streaming, the time it had waited so far is
+    recorded as a lower bound, so slow requests still count when hedges win.
+    """
+    tasks: List[asyncio.Task[Completion]] = []
+    winner: int | None = None
+    streaming = asyncio.Event()
+    primary_start = time.perf_counter()
+    primary_recorded = False
+
+    def record_primary_latency() -> None:
+        nonlocal primary_recorded
+        if not primary_recorded:
+            primary_recorded = True
+            first_chunk_latencies.record(model, time.perf_counter() - primary_start)
+
+    def attempt(number: int, stream: StreamFactory) -> asyncio.Task[Completion]:
+        async def attempt_callback(content: str) -> None:
+            nonlocal winner
+            if winner is None:
+                winner = number
+                # The primary's own latency, or how long it had waited when
+                # the backup beat it (unless it had already failed)
+                if number == 0 or not tasks[0].done():
+                    record_primary_latency()
+                streaming.set()
+                for other, task in enumerate(tasks):
+                    if other != number:
+                        task.cancel()
+            if winner == number:
+                await callback(content)
+
+        task = asyncio.create_task(stream(attempt_callback))
+        # Failures are handled below; don't log them as never retrieved
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    streaming_waiter = asyncio.create_task(streaming.wait())
+    try:
+        tasks.append(attempt(0, primary))
+        await asyncio.wait(
+            [tasks[0], streaming_waiter],
+            timeout=hedge_delay(model),
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        if winner is None and not tasks[0].done() and backup is not None:
+            print(f"[HEDGE] No chunk from {model} yet, starting a backup request")
+            HEDGES_FIRED.inc(model=model)
+            tasks.append(attempt(1, backup))
+
+        while winner is None:
+            pending = [task for task in tasks if not task.done()]
+            if not pending:
+                break
+            await asyncio.wait(
+                pending + [streaming_waiter], return_when=asyncio.FIRST_COMPLETED
+            )
+
+        if winner is not None:
+            if winner == 1:
+                HEDGES_WON.inc(model=model)
+            return await tasks[winner]
+
+        # Nothing was streamed: use the first request that succeeded anyway
+        for task in tasks:
+            if task.exception() is None:
+                return task.result()
+        raise tasks[0].exception()  # type: ignore
+    finally:
+        streaming_waiter.cancel()
+        if tasks and not tasks[0].done():
+            record_primary_latency()
+        for task in tasks:
+            task.cancel()
@@ -1,8 +1,10 @@
 import time
 from typing import Awaitable, Callable, List
-from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletionMessageParam, ChatCompletionChunk
 from llm import Completion
+from models.clients import openai_client
+from models.early_stop import DocumentEndDetector
+from models.timing import StreamTimer
 
 
 async def stream_openai_response(
@@ -11,10 +13,12 @@ async def stream_openai_response(
     base_url: str | None,
     callback: Callable[[str], Awaitable[None]],
     model_name: str,
+    stop_at_document_end: bool = False,
 ) -> Completion:
     start_time = time.time()
-    client = AsyncOpenAI(api_key=api_key, base_url=base_url)
-
+    timer = StreamTimer("openai", model_name)
+    callback = timer.wrap(callback)
+    detector = DocumentEndDetector("openai", model_name, stop_at_document_end)
     # Base parameters
     params = {
         "model": model_name,
@@ -51,26 +55,32 @@ async def stream_openai_response(
         params["stream"] = True
         params["reasoning_effort"] = "high"
 
-    # O1 doesn't support streaming
-    if model_name == "o1-2024-12-17":
-        response = await client.chat.completions.create(**params)  # type: ignore
-        full_response = response.choices[0].message.content  # type: ignore
-    else:
-        stream = await client.chat.completions.create(**params)  # type: ignore
-        full_response = ""
-        async for chunk in stream:  # type: ignore
-            assert isinstance(chunk, ChatCompletionChunk)
-            if (
-                chunk.choices
-                and len(chunk.choices) > 0
-                and chunk.choices[0].delta
-                and chunk.choices[0].delta.content
-            ):
-                content = chunk.choices[0].delta.content or ""
-                full_response += content
-                await callback(content)
-
-    await client.close()
+    with timer:
+        async with openai_client(api_key, base_url) as client:
+            # O1 doesn't support streaming
+            if model_name == "o1-2024-12-17":
+                response = await client.chat.completions.create(**params)  # type: ignore
+                full_response = response.choices[0].message.content  # type: ignore
+            else:
+                stream = await client.chat.completions.create(**params)  # type: ignore
+                full_response = ""
+                # Leaving the stream closes the connection, so the provider stops
+                # generating, also when stopped early or cancelled
+                async with stream:  # type: ignore
+                    async for chunk in stream:  # type: ignore
+                        assert isinstance(chunk, ChatCompletionChunk)
+                        if (
+                            chunk.choices
+                            and len(chunk.choices) > 0
+                            and chunk.choices[0].delta
+                            and chunk.choices[0].delta.content
+                        ):
+                            content = chunk.choices[0].delta.content or ""
+                            full_response += content
+                            await callback(content)
+                            if detector.should_stop(content):
+                                break
 
+    detector.finish()
     completion_time = time.time() - start_time
     return {"duration": completion_time, "code": full_response}
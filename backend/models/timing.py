@@ -0,0 +1,156 @@
+import asyncio
+import json
+import time
+from dataclasses import asdict, dataclass
+from types import TracebackType
+from typing import Awaitable, Callable, Literal
+
+StreamOutcome = Literal["ok", "error", "cancelled"]
+
+from metrics.core import registry
+
+STREAM_FIRST_CHUNK_SECONDS = registry.histogram(
+    "llm_stream_first_chunk_seconds",
+    "Time from request start to the first streamed chunk",
+    ["provider", "model"],
+)
+STREAM_INTER_CHUNK_GAP_SECONDS = registry.histogram(
+    "llm_stream_inter_chunk_gap_seconds",
+    "Gap between consecutive streamed chunks",
+    ["provider", "model"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+STREAM_DURATION_SECONDS = registry.histogram(
+    "llm_stream_duration_seconds",
+    "Total duration of a provider stream, by how it ended",
+    ["provider", "model", "outcome"],
+)
+STREAM_CHARS_PER_SECOND = registry.histogram(
+    "llm_stream_chars_per_second",
+    "Streaming throughput measured after the first chunk",
+    ["provider", "model"],
+    buckets=(10, 25, 50, 100, 200, 400, 800, 1600, 3200),
+)
+STREAM_CHARS_TOTAL = registry.counter(
+    "llm_stream_chars_total",
+    "Characters streamed back to clients",
+    ["provider", "model"],
+)
+STREAMS_TOTAL = registry.counter(
+    "llm_streams_total",
+    "Provider streams, by how they ended",
+    ["provider", "model", "outcome"],
+)
+
+
+@dataclass
+class StreamTiming:
+    provider: str
+    model: str
+    outcome: StreamOutcome
+    first_chunk_latency: float | None
+    max_inter_chunk_gap: float
+    mean_inter_chunk_gap: float
+    duration: float
+    chunks: int
+    chars: int
+    chars_per_second: float
+
+
+class StreamTimer:
+    """
+    Measures a single provider stream through its chunk callback.
+
+    Wrap the callback passed into a `stream_*_response` function and run
+    the stream inside `with timer:`, which calls `finish()` when the stream
+    ends to record metrics and log one structured `[STREAM TIMING]` line.
+    Streams that fail or are cancelled (e.g. race and hedge losers) are
+    recorded too, with their outcome.
+    """
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self.start_time = time.perf_counter()
+        self.first_chunk_time: float | None = None
+        self.last_chunk_time: float | None = None
+        self.max_gap = 0.0
+        self.total_gap = 0.0
+        self.chunks = 0
+        self.chars = 0
+
+    def wrap(
+        self, callback: Callable[[str], Awaitable[None]]
+    ) -> Callable[[str], Awaitable[None]]:
+        async def timed_callback(content: str) -> None:
+            self.record_chunk(content)
+            await callback(content)
+
+        return timed_callback
+
+    def record_chunk(self, content: str) -> None:
+        now = time.perf_counter()
+        labels = {"provider": self.provider, "model": self.model}
+        if self.first_chunk_time is None:
+            self.first_chunk_time = now
+            STREAM_FIRST_CHUNK_SECONDS.observe(now - self.start_time, **labels)
+        elif self.last_chunk_time is not None:
+            gap = now - self.last_chunk_time
+            self.max_gap = max(self.max_gap, gap)
+            self.total_gap += gap
+            STREAM_INTER_CHUNK_GAP_SECONDS.observe(gap, **labels)
+        self.last_chunk_time = now
+        self.chunks += 1
+        self.chars += len(content)
+
+    def __enter__(self) -> "StreamTimer":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if exc_type is None:
+            self.finish("ok")
+        elif issubclass(exc_type, asyncio.CancelledError):
+            self.finish("cancelled")
+        else:
+            self.finish("error")
+
+    def finish(self, outcome: StreamOutcome = "ok") -> StreamTiming:
+        end_time = time.perf_counter()
+        labels = {"provider": self.provider, "model": self.model}
+
+        first_chunk_latency = None
+        chars_per_second = 0.0
+        if self.first_chunk_time is not None:
+            first_chunk_latency = self.first_chunk_time - self.start_time
+            streaming_time = end_time - self.first_chunk_time
+            if streaming_time > 0:
+                chars_per_second = self.chars / streaming_time
+
+        timing = StreamTiming(
+            provider=self.provider,
+            model=self.model,
+            outcome=outcome,
+            first_chunk_latency=first_chunk_latency,
+            max_inter_chunk_gap=self.max_gap,
+            mean_inter_chunk_gap=(
+                self.total_gap / (self.chunks - 1) if self.chunks > 1 else 0.0
+            ),
+            duration=end_time - self.start_time,
+            chunks=self.chunks,
+            chars=self.chars,
+            chars_per_second=chars_per_second,
+        )
+
+        STREAMS_TOTAL.inc(**labels, outcome=outcome)
+        STREAM_CHARS_TOTAL.inc(self.chars, **labels)
+        STREAM_DURATION_SECONDS.observe(timing.duration, **labels, outcome=outcome)
+        if chars_per_second > 0:
+            STREAM_CHARS_PER_SECOND.observe(chars_per_second, **labels)
+
+        print("[STREAM TIMING] " + json.dumps(asdict(timing)))
+        return timing
@@ -8,7 +8,11 @@ from prompts.imported_code_prompts import IMPORTED_CODE_SYSTEM_PROMPTS
 from prompts.screenshot_system_prompts import SYSTEM_PROMPTS
 from prompts.text_prompts import SYSTEM_PROMPTS as TEXT_SYSTEM_PROMPTS
 from prompts.types import Stack, PromptContent
-from video.utils import assemble_claude_prompt_video
+from video.uploads import remove_video_upload, resolve_video_upload
+from video.utils import (
+    assemble_claude_prompt_video,
+    assemble_claude_prompt_video_from_file,
+)
 
 
 USER_PROMPT = """
@@ -221,6 +225,10 @@ async def create_prompt(
 
     image_cache: dict[str, str] = {}
 
+    # Video prompts are built from the video frames alone
+    if input_mode == "video":
+        return await assemble_video_prompt(prompt), image_cache
+
     # If this generation started off with imported code, we need to assemble the prompt differently
     if is_imported_from_code:
         original_imported_code = history[0]["text"]
@@ -252,13 +260,26 @@ async def create_prompt(
 
             image_cache = create_alt_url_mapping(history[-2]["text"])
 
-    if input_mode == "video":
-        video_data_url = prompt["images"][0]
-        prompt_messages = await assemble_claude_prompt_video(video_data_url)
-
     return prompt_messages, image_cache
 
 
+async def assemble_video_prompt(prompt: PromptContent) -> list[ChatCompletionMessageParam]:
+    """
+    Build the video prompt from an uploaded video file (see POST /video/upload)
+    or, for older clients, from a base64 data URL in the prompt images.
+    """
+    video_upload_id = prompt.get("videoUploadId")
+    if not video_upload_id:
+        return await assemble_claude_prompt_video(prompt["images"][0])
+
+    try:
+        return await assemble_claude_prompt_video_from_file(
+            resolve_video_upload(video_upload_id)
+        )
+    finally:
+        remove_video_upload(video_upload_id)
+
+
 def create_message_from_history_item(
     item: dict[str, Any], role: str
 ) -> ChatCompletionMessageParam:
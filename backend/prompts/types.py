@@ -1,4 +1,5 @@
 from typing import Literal, TypedDict, List, Optional, Any
+from typing_extensions import NotRequired
 
 
 class SystemPrompts(TypedDict):
@@ -17,6 +18,9 @@ class PromptContent(TypedDict):
     text: str
     images: List[str]
     additionalFiles: Optional[List[Any]]
+    # Set instead of a video data URL in images when the video was uploaded
+    # separately via POST /video/upload
+    videoUploadId: NotRequired[str]
 
 
 Stack = Literal[
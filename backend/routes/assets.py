@@ -1,22 +1,79 @@
-import base64
-import uuid
-from typing import Dict, Any
-from fastapi import APIRouter, HTTPException, Response
-from fastapi.responses import Response
-import tempfile
-import os
-from pathlib import Path
+import asyncio
+import re
+from typing import Iterator, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+from assets.multipart import MultipartAssetParser
+from assets.store import asset_store
+from assets.types import AssetData
 
 router = APIRouter()
 
-# In-memory store for assets (in production, use Redis or database)
-asset_store: Dict[str, Dict[str, Any]] = {}
+# Spilled assets are streamed from their memory map in chunks of this size
+ASSET_CHUNK_SIZE = 256 * 1024
+
+
+# Asset IDs are content hashes, so a URL always serves the same bytes
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+BYTE_RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def iter_chunks(data: AssetData, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+    end = len(data) if end is None else end
+    for chunk_start in range(start, end, ASSET_CHUNK_SIZE):
+        yield bytes(data[chunk_start : min(chunk_start + ASSET_CHUNK_SIZE, end)])
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Whether an If-None-Match header matches the ETag (weak comparison)"""
+    if header.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def parse_byte_range(header: str, size: int) -> Tuple[int, int] | None:
+    """
+    Start and end (exclusive) of a single-range Range header.
+
+    Returns None for headers that should be ignored (malformed, with the last
+    byte before the first, or asking for several ranges), in which case the
+    full content is served. Raises ValueError if the range starts past the
+    end of the content.
+    """
+    match = BYTE_RANGE_PATTERN.fullmatch(header.strip())
+    if match is None or match.group() == "bytes=-":
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size
+
+    start = int(first)
+    if last and int(last) < start:
+        # Syntactically invalid, so RFC 7233 says to ignore it
+        return None
+    if start >= size:
+        raise ValueError(f"Range {header} not satisfiable")
+    end = min(int(last) + 1, size) if last else size
+    return start, end
 
 @router.post("/assets/upload")
-async def upload_assets(assets: list[dict]):
+def upload_assets(assets: list[dict]):
     """
     Upload assets and return URLs for use in generated code.
     
+    Identical files are stored once and always get the same ID.
+    The asset routes are synchronous so that FastAPI runs the (possibly
+    blocking) store backend in its threadpool.
+    
     Args:
         assets: List of asset files with dataUrl, fileName, etc.
         
@@ -26,104 +83,165 @@ async def upload_assets(assets: list[dict]):
     asset_urls = []
     
     for asset in assets:
-        # Generate unique asset ID
-        asset_id = str(uuid.uuid4())
-        
-        # Store asset data
-        asset_store[asset_id] = {
-            'dataUrl': asset.get('dataUrl'),
-            'fileName': asset.get('fileName', f'asset-{asset_id}'),
-            'fileType': asset.get('fileType', 'application/octet-stream'),
-            'category': asset.get('category')
-        }
+        try:
+            stored = asset_store.put_data_url(
+                asset.get('dataUrl', ''),
+                file_name=asset.get('fileName'),
+                file_type=asset.get('fileType'),
+                category=asset.get('category'),
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         # Create accessible URL
-        asset_url = f"/assets/{asset_id}"
+        asset_url = f"/assets/{stored.id}"
         asset_urls.append({
-            'id': asset_id,
+            'id': stored.id,
             'url': asset_url,
             'fileName': asset.get('fileName'),
             'category': asset.get('category')
         })
         
-        print(f"[ASSET] Stored asset {asset_id}: {asset.get('fileName')}")
+        print(f"[ASSET] Stored asset {stored.id}: {asset.get('fileName')}")
     
     return asset_urls
 
+@router.post("/assets/upload/multipart")
+async def upload_asset_files(request: Request, category: str | None = None):
+    """
+    Upload files as multipart/form-data and return their URLs.
+    
+    Unlike /assets/upload, files are sent as raw bytes rather than base64
+    data URLs, and each file is written into the store while the body is
+    received instead of after parsing it as a whole. Any number of file
+    fields may be sent; plain form fields are ignored.
+    
+    Args:
+        category: Category recorded for every uploaded file
+        
+    Returns:
+        List of asset URLs that can be used in HTML, in upload order
+    """
+    try:
+        parser = MultipartAssetParser(
+            asset_store, request.headers.get("content-type", ""), category
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        # Parsing writes to the store backend, keep it off the event loop
+        async for chunk in request.stream():
+            await asyncio.to_thread(parser.feed, chunk)
+        stored = await asyncio.to_thread(parser.finish)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        parser.abort()
+
+    for asset in stored:
+        print(f"[ASSET] Stored asset {asset.id}: {asset.file_name}")
+
+    return [
+        {
+            "id": asset.id,
+            "url": f"/assets/{asset.id}",
+            "fileName": asset.file_name,
+            "category": asset.category,
+        }
+        for asset in stored
+    ]
+
 @router.get("/assets/{asset_id}")
-async def serve_asset(asset_id: str):
+def serve_asset(asset_id: str, request: Request):
     """
     Serve an asset by ID.
     
+    Assets are immutable, so responses can be cached indefinitely. The
+    content hash is the ETag, which makes revalidation (If-None-Match) a
+    304 without a body, and single byte ranges are supported for large files.
+    
     Args:
         asset_id: The unique asset identifier
         
     Returns:
         The asset file content with appropriate headers
     """
-    if asset_id not in asset_store:
+    asset = asset_store.get(asset_id)
+    if asset is None:
         raise HTTPException(status_code=404, detail="Asset not found")
     
-    asset = asset_store[asset_id]
-    data_url = asset['dataUrl']
-    file_type = asset['fileType']
-    
-    # Extract data from data URL
-    if not data_url.startswith('data:'):
-        raise HTTPException(status_code=400, detail="Invalid data URL")
-    
-    try:
-        # Parse data URL: data:image/png;base64,iVBORw0KGgoAAAANS...
-        header, data = data_url.split(',', 1)
-        decoded_data = base64.b64decode(data)
-        
-        # Extract MIME type from header
-        if ';' in header:
-            mime_type = header.split(':')[1].split(';')[0]
-        else:
-            mime_type = file_type
-            
+    etag = f'"{asset.id}"'
+    headers = {"ETag": etag, "Cache-Control": ASSET_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    headers["Accept-Ranges"] = "bytes"
+    headers["Content-Disposition"] = f'inline; filename="{asset.file_name}"'
+
+    status_code = 200
+    start, end = 0, asset.size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header is not None and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = parse_byte_range(range_header, asset.size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{asset.size}"},
+            )
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{asset.size}"
+
+    if isinstance(asset.data, bytes):
         return Response(
-            content=decoded_data,
-            media_type=mime_type,
-            headers={
-                "Cache-Control": "public, max-age=3600",  # Cache for 1 hour
-                "Content-Disposition": f'inline; filename="{asset["fileName"]}"'
-            }
+            content=asset.data[start:end],
+            status_code=status_code,
+            media_type=asset.media_type,
+            headers=headers,
         )
-        
-    except Exception as e:
-        print(f"[ASSET ERROR] Failed to serve asset {asset_id}: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to serve asset")
+
+    # Spilled to disk: stream from the memory map instead of reading it all in
+    headers["Content-Length"] = str(end - start)
+    return StreamingResponse(
+        iter_chunks(asset.data, start, end),
+        status_code=status_code,
+        media_type=asset.media_type,
+        headers=headers,
+    )
 
 @router.delete("/assets/{asset_id}")
-async def delete_asset(asset_id: str):
+def delete_asset(asset_id: str):
     """
     Delete an asset by ID.
     
     Args:
         asset_id: The unique asset identifier
     """
-    if asset_id in asset_store:
-        del asset_store[asset_id]
+    if asset_store.delete(asset_id):
         return {"message": "Asset deleted"}
     else:
         raise HTTPException(status_code=404, detail="Asset not found")
 
 @router.get("/assets")
-async def list_assets():
+def list_assets():
     """
     List all stored assets.
     """
+    assets = asset_store.list()
     return {
-        "count": len(asset_store),
+        "count": len(assets),
         "assets": [
             {
-                "id": asset_id,
-                "fileName": asset["fileName"],
-                "category": asset["category"],
-                "url": f"/assets/{asset_id}"
+                "id": asset.id,
+                "fileName": asset.file_name,
+                "category": asset.category,
+                "url": f"/assets/{asset.id}"
             }
-            for asset_id, asset in asset_store.items()
+            for asset in assets
         ]
-    }
\ No newline at end of file
+    }
@@ -1,20 +1,28 @@
 import asyncio
+import json
 from dataclasses import dataclass, field
 from abc import ABC, abstractmethod
 import traceback
+import uuid
 from typing import Callable, Awaitable
 from fastapi import APIRouter, WebSocket
 import openai
-from codegen.utils import extract_html_content
+from codegen.utils import HtmlStreamExtractor, extract_html_content
 from config import (
     ANTHROPIC_API_KEY,
     GEMINI_API_KEY,
+    HEDGE_BACKUP_MODEL,
+    HEDGE_REQUESTS,
     IS_PROD,
     NUM_VARIANTS,
     OPENAI_API_KEY,
     OPENAI_BASE_URL,
+    PROVIDER_FAILOVER,
     REPLICATE_API_KEY,
     SHOULD_MOCK_AI_RESPONSE,
+    STREAM_STOP_AT_DOCUMENT_END,
+    WS_CHUNK_FLUSH_INTERVAL_MS,
+    WS_CHUNK_FLUSH_MAX_CHARS,
 )
 from custom_types import InputMode
 from llm import (
@@ -23,6 +31,8 @@ from llm import (
     OPENAI_MODELS,
     ANTHROPIC_MODELS,
     GEMINI_MODELS,
+    MODEL_PROVIDER,
+    alternate_models,
 )
 from models import (
     stream_claude_response,
@@ -30,6 +40,8 @@ from models import (
     stream_openai_response,
     stream_gemini_response,
 )
+from models.failover import FailoverCandidate, stream_with_failover
+from models.hedging import ChunkCallback, StreamFactory, hedged_stream
 from fs_logging.core import write_logs
 from mock_llm import mock_completion
 from typing import (
@@ -39,6 +51,7 @@ from typing import (
     Dict,
     List,
     Literal,
+    Tuple,
     cast,
     get_args,
 )
@@ -55,13 +68,21 @@ MessageType = Literal[
     "variantComplete",
     "variantError",
     "variantCount",
+    "imageReady",
 ]
-from image_generation.core import generate_images
+from image_generation.core import (
+    ImageReadyCallback,
+    generate_images,
+    replace_placeholder_images,
+)
+from image_generation.prefetch import ImagePrefetcher
+from image_generation.scheduler import DEFAULT_SESSION
 from prompts import create_prompt
 from prompts.claude_prompts import VIDEO_PROMPT
 from prompts.types import Stack, PromptContent
 
 # from utils import pprint_prompt
+from ws.coalescing import ChunkCoalescer
 from ws.constants import APP_ERROR_WEB_SOCKET_CODE  # type: ignore
 
 
@@ -81,6 +102,8 @@ class PipelineContext:
     """Context object that carries state through the pipeline"""
 
     websocket: WebSocket
+    # Identifies the connection to the image generation scheduler
+    session_id: str = field(default_factory=lambda: uuid.uuid4().hex)
     ws_comm: "WebSocketCommunicator | None" = None
     params: Dict[str, str] = field(default_factory=dict)
     extracted_params: "ExtractedParams | None" = None
@@ -157,6 +180,11 @@ class WebSocketCommunicator:
     def __init__(self, websocket: WebSocket):
         self.websocket = websocket
         self.is_closed = False
+        self.chunk_coalescer = ChunkCoalescer(
+            self._send_chunk,
+            flush_interval=WS_CHUNK_FLUSH_INTERVAL_MS / 1000,
+            max_buffer_size=WS_CHUNK_FLUSH_MAX_CHARS,
+        )
 
     async def accept(self) -> None:
         """Accept the WebSocket connection"""
@@ -170,6 +198,13 @@ class WebSocketCommunicator:
         variantIndex: int,
     ) -> None:
         """Send a message to the client with debug logging"""
+        # Chunks are coalesced; everything else flushes the variant's pending
+        # chunks first so the client sees them in order
+        if type == "chunk":
+            await self.chunk_coalescer.add(value, variantIndex)
+            return
+        await self.chunk_coalescer.flush(variantIndex)
+
         # Print for debugging on the backend
         if type == "error":
             print(f"Error (variant {variantIndex + 1}): {value}")
@@ -184,9 +219,15 @@ class WebSocketCommunicator:
             {"type": type, "value": value, "variantIndex": variantIndex}
         )
 
+    async def _send_chunk(self, value: str, variantIndex: int) -> None:
+        await self.websocket.send_json(
+            {"type": "chunk", "value": value, "variantIndex": variantIndex}
+        )
+
     async def throw_error(self, message: str) -> None:
         """Send an error message and close the connection"""
         print(message)
+        self.chunk_coalescer.cancel()
         if not self.is_closed:
             await self.websocket.send_json({"type": "error", "value": message})
             await self.websocket.close(APP_ERROR_WEB_SOCKET_CODE)
@@ -200,6 +241,7 @@ class WebSocketCommunicator:
 
     async def close(self) -> None:
         """Close the WebSocket connection"""
+        self.chunk_coalescer.cancel()
         if not self.is_closed:
             await self.websocket.close()
             self.is_closed = True
@@ -219,6 +261,8 @@ class ExtractedParams:
     is_imported_from_code: bool
     is_extraction_mode: bool
     asset_urls: List[Dict[str, Any]] = field(default_factory=list)
+    # Only keep the first variant that produces a complete HTML document
+    is_race_mode: bool = False
 
 
 class ParameterExtractionStage:
@@ -291,34 +335,41 @@ class ParameterExtractionStage:
         # Process assets and create accessible URLs
         asset_urls = []
         if prompt.get("additionalFiles"):
-            from routes.assets import asset_store
-            import uuid
+            from assets.store import asset_store
             
             asset_files = [f for f in prompt["additionalFiles"] if f.get('category') == 'asset']
             for asset in asset_files:
-                # Generate unique asset ID and store
-                asset_id = str(uuid.uuid4())
-                asset_store[asset_id] = {
-                    'dataUrl': asset.get('dataUrl'),
-                    'fileName': asset.get('fileName', f'asset-{asset_id}'),
-                    'fileType': asset.get('fileType', 'application/octet-stream'),
-                    'category': asset.get('category')
-                }
+                # Store by content hash, so resending the same asset reuses its ID
+                try:
+                    # The backend may do blocking I/O, keep it off the event loop
+                    stored = await asyncio.to_thread(
+                        asset_store.put_data_url,
+                        asset.get('dataUrl', ''),
+                        file_name=asset.get('fileName'),
+                        file_type=asset.get('fileType'),
+                        category=asset.get('category'),
+                    )
+                except ValueError as e:
+                    print(f"[CODEGEN] Skipping asset {asset.get('fileName')}: {e}")
+                    continue
                 
                 # Create accessible URL (assuming backend runs on same host)
-                asset_url = f"/assets/{asset_id}"
+                asset_url = f"/assets/{stored.id}"
                 asset_urls.append({
-                    'id': asset_id,
+                    'id': stored.id,
                     'url': asset_url,
                     'fileName': asset.get('fileName'),
                     'category': asset.get('category')
                 })
                 
-                print(f"[CODEGEN] Stored asset {asset_id}: {asset.get('fileName')} -> {asset_url}")
+                print(f"[CODEGEN] Stored asset {stored.id}: {asset.get('fileName')} -> {asset_url}")
         
         # Extract extraction mode flag
         is_extraction_mode = params.get("isExtractionMode", False)
 
+        # Extract race mode flag
+        is_race_mode = bool(params.get("isRaceMode", False))
+
         return ExtractedParams(
             stack=validated_stack,
             input_mode=validated_input_mode,
@@ -332,6 +383,7 @@ class ParameterExtractionStage:
             is_imported_from_code=is_imported_from_code,
             is_extraction_mode=is_extraction_mode,
             asset_urls=asset_urls,
+            is_race_mode=is_race_mode,
         )
 
     def _get_from_settings_dialog_or_env(
@@ -628,6 +680,8 @@ class ParallelGenerationStage:
         anthropic_api_key: str | None,
         should_generate_images: bool,
         is_extraction_mode: bool = False,
+        session_id: str = DEFAULT_SESSION,
+        is_race_mode: bool = False,
     ):
         self.send_message = send_message
         self.openai_api_key = openai_api_key
@@ -635,6 +689,25 @@ class ParallelGenerationStage:
         self.anthropic_api_key = anthropic_api_key
         self.should_generate_images = should_generate_images
         self.is_extraction_mode = is_extraction_mode
+        self.session_id = session_id
+        self.image_generation_settings = self._get_image_generation_settings()
+        # Per-variant image generation that starts while the code is streaming
+        self.image_prefetchers: Dict[int, ImagePrefetcher] = {}
+        # Per-variant tracking of the HTML document in the streamed output
+        self.html_extractors: Dict[int, HtmlStreamExtractor] = {}
+        # Cancel provider streams once the HTML document is complete. Extraction
+        # mode streams JSON rather than HTML, so it always runs to the end.
+        self.stop_at_document_end = (
+            STREAM_STOP_AT_DOCUMENT_END and not is_extraction_mode
+        )
+        # In race mode, the first variant with a complete HTML document wins and
+        # the others are cancelled
+        self.is_race_mode = is_race_mode and not is_extraction_mode
+        self.race_winner: int | None = None
+        self.variant_tasks: Dict[int, asyncio.Task[Completion]] = {}
+        # Model that produced each variant's code, which hedging or failover
+        # may have moved away from the selected one
+        self.completion_models: Dict[int, Llm] = {}
 
     async def process_variants(
         self,
@@ -646,8 +719,19 @@ class ParallelGenerationStage:
         """Process all variants in parallel and return completions"""
         tasks = self._create_generation_tasks(variant_models, prompt_messages, params)
 
+        if self.image_generation_settings:
+            image_generation_model, image_api_key = self.image_generation_settings
+            for index in range(len(tasks)):
+                self.image_prefetchers[index] = ImagePrefetcher(
+                    api_key=image_api_key,
+                    base_url=self.openai_base_url,
+                    model=image_generation_model,
+                    image_cache=image_cache,
+                    session_id=self.session_id,
+                )
+
         # Dictionary to track variant tasks and their status
-        variant_tasks: Dict[int, asyncio.Task[Completion]] = {}
+        variant_tasks = self.variant_tasks
         variant_completions: Dict[int, str] = {}
 
         # Create tasks for each variant
@@ -678,68 +762,190 @@ class ParallelGenerationStage:
         tasks: List[Coroutine[Any, Any, Completion]] = []
 
         for index, model in enumerate(variant_models):
-            if model in OPENAI_MODELS:
-                if self.openai_api_key is None:
-                    raise Exception("OpenAI API key is missing.")
-
+            stream = self._stream_factory(model, prompt_messages, params, index)
+            if stream is not None:
                 tasks.append(
-                    self._stream_openai_with_error_handling(
-                        prompt_messages,
-                        model_name=model.value,
-                        index=index,
-                    )
-                )
-            elif GEMINI_API_KEY and model in GEMINI_MODELS:
-                tasks.append(
-                    stream_gemini_response(
-                        prompt_messages,
-                        api_key=GEMINI_API_KEY,
-                        callback=lambda x, i=index: self._process_chunk(x, i),
-                        model_name=model.value,
-                    )
-                )
-            elif model in ANTHROPIC_MODELS:
-                if self.anthropic_api_key is None:
-                    raise Exception("Anthropic API key is missing.")
-
-                # For creation, use Claude Sonnet 3.7
-                # For updates, we use Claude Sonnet 3.5 until we have tested Claude Sonnet 3.7
-                if params["generationType"] == "create":
-                    claude_model = Llm.CLAUDE_3_7_SONNET_2025_02_19
-                else:
-                    claude_model = Llm.CLAUDE_3_5_SONNET_2024_06_20
-
-                tasks.append(
-                    stream_claude_response(
-                        prompt_messages,
-                        api_key=self.anthropic_api_key,
-                        callback=lambda x, i=index: self._process_chunk(x, i),
-                        model_name=claude_model.value,
-                    )
+                    self._generate_variant(index, model, stream, prompt_messages, params)
                 )
 
         return tasks
 
-    async def _process_chunk(self, content: str, variant_index: int):
-        """Process streaming chunks"""
-        await self.send_message("chunk", content, variant_index)
-
-    async def _stream_openai_with_error_handling(
+    def _stream_factory(
         self,
+        model: Llm,
         prompt_messages: List[ChatCompletionMessageParam],
-        model_name: str,
+        params: Dict[str, str],
         index: int,
-    ) -> Completion:
-        """Wrap OpenAI streaming with specific error handling"""
-        try:
-            assert self.openai_api_key is not None
-            return await stream_openai_response(
+    ) -> StreamFactory | None:
+        """Function starting a request to the model for a variant, or None if unavailable"""
+        if model in OPENAI_MODELS:
+            if self.openai_api_key is None:
+                raise Exception("OpenAI API key is missing.")
+
+            openai_api_key = self.openai_api_key
+            return lambda callback: stream_openai_response(
                 prompt_messages,
-                api_key=self.openai_api_key,
+                api_key=openai_api_key,
                 base_url=self.openai_base_url,
-                callback=lambda x: self._process_chunk(x, index),
-                model_name=model_name,
+                callback=callback,
+                model_name=model.value,
+                stop_at_document_end=self.stop_at_document_end,
+            )
+        elif GEMINI_API_KEY and model in GEMINI_MODELS:
+            gemini_api_key = GEMINI_API_KEY
+            return lambda callback: stream_gemini_response(
+                prompt_messages,
+                api_key=gemini_api_key,
+                callback=callback,
+                model_name=model.value,
+                stop_at_document_end=self.stop_at_document_end,
+            )
+        elif model in ANTHROPIC_MODELS:
+            if self.anthropic_api_key is None:
+                raise Exception("Anthropic API key is missing.")
+            anthropic_api_key = self.anthropic_api_key
+            claude_model = self._requested_model(model, params)
+
+            return lambda callback: stream_claude_response(
+                prompt_messages,
+                api_key=anthropic_api_key,
+                callback=callback,
+                model_name=claude_model.value,
+                stop_at_document_end=self.stop_at_document_end,
+            )
+        return None
+
+    def _requested_model(self, model: Llm, params: Dict[str, str]) -> Llm:
+        """The model actually requested from the provider for a variant model"""
+        if model in ANTHROPIC_MODELS:
+            # For creation, use Claude Sonnet 3.7
+            # For updates, we use Claude Sonnet 3.5 until we have tested Claude Sonnet 3.7
+            if params["generationType"] == "create":
+                return Llm.CLAUDE_3_7_SONNET_2025_02_19
+            return Llm.CLAUDE_3_5_SONNET_2024_06_20
+        return model
+
+    def _available_providers(self, params: Dict[str, str]) -> List[str]:
+        """Providers whose API key is set, in order of preference"""
+        providers: List[str] = []
+        if self.anthropic_api_key:
+            providers.append("anthropic")
+        if self.openai_api_key:
+            providers.append("openai")
+        # Gemini needs an image and only works for create right now
+        if (
+            GEMINI_API_KEY
+            and params.get("generationType") == "create"
+            and params.get("inputMode") != "text"
+        ):
+            providers.append("gemini")
+        return providers
+
+    async def _generate_variant(
+        self,
+        index: int,
+        model: Llm,
+        stream: StreamFactory,
+        prompt_messages: List[ChatCompletionMessageParam],
+        params: Dict[str, str],
+    ) -> Completion:
+        """
+        Stream a variant, hedging with a backup request if it is slow to start
+        and failing over to another provider if the model's one is unavailable
+        """
+        callback = lambda x: self._process_chunk(x, index)
+
+        def candidate(model: Llm, stream: StreamFactory) -> FailoverCandidate:
+            async def stream_and_record(on_chunk: ChunkCallback) -> Completion:
+                completion = await stream(on_chunk)
+                self.completion_models[index] = self._requested_model(model, params)
+                return completion
+
+            return FailoverCandidate(MODEL_PROVIDER[model], model, stream_and_record)
+
+        candidates = [candidate(model, stream)]
+        for alternate in alternate_models(model, self._available_providers(params)):
+            alternate_stream = self._stream_factory(
+                alternate, prompt_messages, params, index
             )
+            if alternate_stream is not None:
+                candidates.append(candidate(alternate, alternate_stream))
+
+        # The backup request starts with the alternate model, if there is one
+        backup_candidates = candidates
+        if HEDGE_BACKUP_MODEL == "alternate" and len(candidates) > 1:
+            backup_candidates = candidates[1:] + candidates[:1]
+
+        primary: StreamFactory = candidates[0].stream
+        backup: StreamFactory = backup_candidates[0].stream
+        if PROVIDER_FAILOVER:
+            primary = lambda on_chunk: stream_with_failover(candidates, on_chunk)
+            backup = lambda on_chunk: stream_with_failover(backup_candidates, on_chunk)
+
+        if not HEDGE_REQUESTS:
+            completion = primary(callback)
+        else:
+            # First-chunk latencies are tracked for the model the primary requests
+            requested_model = self._requested_model(model, params)
+            completion = hedged_stream(requested_model.value, primary, backup, callback)
+        return await self._with_openai_error_handling(completion, index)
+
+    async def _process_chunk(self, content: str, variant_index: int):
+        """Process streaming chunks"""
+        prefetcher = self.image_prefetchers.get(variant_index)
+        if prefetcher:
+            prefetcher.feed(content)
+        extractor = self.html_extractors.setdefault(
+            variant_index, HtmlStreamExtractor()
+        )
+        if not extractor.closed and extractor.feed(content):
+            print(
+                f"[VARIANT {variant_index + 1}] HTML document closed after "
+                f"{len(extractor.text)} characters"
+            )
+            if self.is_race_mode:
+                self._finish_race(variant_index)
+        await self.send_message("chunk", content, variant_index)
+
+    def _finish_race(self, winner: int) -> None:
+        """Make the variant the race winner and cancel the others' streams"""
+        if self.race_winner is not None:
+            return
+        self.race_winner = winner
+        losers = [
+            index
+            for index, task in self.variant_tasks.items()
+            if index != winner and not task.done()
+        ]
+        print(
+            f"[RACE] Variant {winner + 1} won, cancelling variants "
+            f"{[index + 1 for index in losers]}"
+        )
+        for index in losers:
+            self.variant_tasks[index].cancel()
+
+    def _lost_race(self, index: int) -> bool:
+        return self.race_winner is not None and self.race_winner != index
+
+    async def _send_race_lost(self, index: int) -> None:
+        if index in self.image_prefetchers:
+            self.image_prefetchers[index].cancel()
+        assert self.race_winner is not None
+        await self.send_message(
+            "variantError",
+            f"Cancelled: variant {self.race_winner + 1} finished first",
+            index,
+        )
+
+    async def _with_openai_error_handling(
+        self, completion: Awaitable[Completion], index: int
+    ) -> Completion:
+        """
+        Wrap a variant's streaming with specific handling of OpenAI errors,
+        after any retries and failover have been given up on
+        """
+        try:
+            return await completion
         except openai.AuthenticationError as e:
             print(f"[VARIANT {index + 1}] OpenAI Authentication failed", e)
             error_message = (
@@ -781,36 +987,76 @@ class ParallelGenerationStage:
             await self.send_message("variantError", error_message, index)
             raise VariantErrorAlreadySent(e)
 
+    def _get_image_generation_settings(
+        self,
+    ) -> Tuple[Literal["dalle3", "flux"], str] | None:
+        """Image generation model and API key, or None if images are not generated"""
+        if not self.should_generate_images:
+            return None
+
+        replicate_api_key = REPLICATE_API_KEY
+        if replicate_api_key:
+            return "flux", replicate_api_key
+
+        if not self.openai_api_key:
+            print("No OpenAI API key and Replicate key found. Skipping image generation.")
+            return None
+        return "dalle3", self.openai_api_key
+
     async def _perform_image_generation(
         self,
         completion: str,
         image_cache: dict[str, str],
+        index: int,
+        on_image_ready: ImageReadyCallback | None = None,
     ):
         """Generate images for the completion if needed"""
-        if not self.should_generate_images:
+        if not self.image_generation_settings:
             return completion
-
-        replicate_api_key = REPLICATE_API_KEY
-        if replicate_api_key:
-            image_generation_model = "flux"
-            api_key = replicate_api_key
-        else:
-            if not self.openai_api_key:
-                print(
-                    "No OpenAI API key and Replicate key found. Skipping image generation."
-                )
-                return completion
-            image_generation_model = "dalle3"
-            api_key = self.openai_api_key
+        image_generation_model, api_key = self.image_generation_settings
 
         print("Generating images with model: ", image_generation_model)
 
-        return await generate_images(
-            completion,
-            api_key=api_key,
-            base_url=self.openai_base_url,
-            image_cache=image_cache,
-            model=image_generation_model,
+        prefetcher = self.image_prefetchers.get(index)
+        try:
+            return await generate_images(
+                completion,
+                api_key=api_key,
+                base_url=self.openai_base_url,
+                image_cache=image_cache,
+                model=image_generation_model,
+                session_id=self.session_id,
+                prefetched=dict(prefetcher.tasks) if prefetcher else None,
+                on_image_ready=on_image_ready,
+            )
+        finally:
+            # Prefetched images the final code uses are done by now; the rest
+            # were for placeholders it no longer has
+            if prefetcher:
+                prefetcher.cancel()
+
+    async def _send_code_with_progressive_images(
+        self,
+        code: str,
+        image_cache: Dict[str, str],
+        index: int,
+    ) -> None:
+        """
+        Send the code right away with placeholder images, then an imageReady
+        message for each image as soon as it has been generated, so one slow
+        image doesn't hold back the whole variant.
+        """
+        # Images already generated earlier in this project can be filled in now
+        code = replace_placeholder_images(code, {**image_cache})
+        await self.send_message("setCode", extract_html_content(code), index)
+
+        async def send_image_ready(alt: str, url: str) -> None:
+            await self.send_message(
+                "imageReady", json.dumps({"alt": alt, "url": url}), index
+            )
+
+        await self._perform_image_generation(
+            code, image_cache, index, on_image_ready=send_image_ready
         )
 
     async def _process_variant_completion(
@@ -825,24 +1071,46 @@ class ParallelGenerationStage:
         try:
             completion = await task
 
-            print(f"{model.value} completion took {completion['duration']:.2f} seconds")
+            completion_model = self.completion_models.get(index, model)
+            print(
+                f"{completion_model.value} completion took "
+                f"{completion['duration']:.2f} seconds"
+            )
+            if MODEL_PROVIDER[completion_model] != MODEL_PROVIDER[model]:
+                await self.send_message(
+                    "status",
+                    f"{model.value} was unavailable, generated with "
+                    f"{completion_model.value} instead",
+                    index,
+                )
+            if self.is_race_mode:
+                # A variant may finish without its document closing mid-stream
+                extractor = self.html_extractors.get(index)
+                if extractor and extractor.document is not None:
+                    self._finish_race(index)
+                if self._lost_race(index):
+                    await self._send_race_lost(index)
+                    return
             variant_completions[index] = completion["code"]
 
             try:
-                # Process images for this variant
-                processed_html = await self._perform_image_generation(
-                    completion["code"],
-                    image_cache,
-                )
+                if not self.is_extraction_mode:
+                    await self._send_code_with_progressive_images(
+                        completion["code"], image_cache, index
+                    )
+                else:
+                    # Process images for this variant
+                    processed_html = await self._perform_image_generation(
+                        completion["code"],
+                        image_cache,
+                        index,
+                    )
 
-                # Log raw result before processing  
-                if self.is_extraction_mode:
+                    # Log raw result before processing
                     print(f"=== EXTRACTION RESULT: {len(processed_html)} chars ===")
                     print(f"Preview: {processed_html[:200]}...")
                     print("=" * 50)
 
-                # For extraction mode, extract JSON from markdown blocks
-                if self.is_extraction_mode:
                     # Extract JSON from markdown code blocks
                     import re
                     json_match = re.search(r"```json\s*(.*?)\s*```", processed_html, re.DOTALL)
@@ -851,17 +1119,14 @@ class ParallelGenerationStage:
                     else:
                         # If no markdown blocks, use raw response
                         final_result = processed_html.strip()
-                else:
-                    # Extract HTML content for normal code generation
-                    final_result = extract_html_content(processed_html)
 
-                # Log final result
-                if self.is_extraction_mode:
+                    # Log final result
                     print(f"✅ Extraction complete: {len(final_result)} chars")
                     print(f"Status: {'Valid JSON' if final_result.startswith('{') else 'Raw text'}")
 
-                # Send the complete variant back to the client
-                await self.send_message("setCode", final_result, index)
+                    # Send the complete variant back to the client
+                    await self.send_message("setCode", final_result, index)
+
                 await self.send_message(
                     "variantComplete",
                     "Variant generation complete",
@@ -872,9 +1137,16 @@ class ParallelGenerationStage:
                 print(f"Post-processing error for variant {index + 1}: {inner_e}")
                 # We still keep the completion in variant_completions
 
+        except asyncio.CancelledError:
+            if not self._lost_race(index):
+                raise
+            await self._send_race_lost(index)
+
         except Exception as e:
             # Handle any errors that occurred during generation
             print(f"Error in variant {index + 1}: {e}")
+            if index in self.image_prefetchers:
+                self.image_prefetchers[index].cancel()
             traceback.print_exception(type(e), e, e.__traceback__)
 
             # Only send error message if it hasn't been sent already
@@ -1002,6 +1274,8 @@ class CodeGenerationMiddleware(Middleware):
                         anthropic_api_key=context.extracted_params.anthropic_api_key,
                         should_generate_images=context.extracted_params.should_generate_images,
                         is_extraction_mode=context.extracted_params.is_extraction_mode,
+                        session_id=context.session_id,
+                        is_race_mode=context.extracted_params.is_race_mode,
                     )
 
                     context.variant_completions = (
@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from metrics.core import registry
+
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Expose process metrics in the Prometheus text format"""
+    return PlainTextResponse(
+        content=registry.render(),
+        media_type="text/plain; version=0.0.4",
+    )
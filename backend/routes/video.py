@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException, Request
+
+from video.uploads import VideoUploadTooLarge, save_video_upload
+
+
+router = APIRouter()
+
+
+@router.post("/video/upload")
+async def upload_video(request: Request):
+    """
+    Stream a raw video request body to disk for use in video mode.
+
+    The body is the video file itself (not base64) with its MIME type as the
+    Content-Type. Pass the returned ID as `prompt.videoUploadId` in the
+    /generate-code WebSocket request instead of a video data URL.
+    """
+    mime_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if not mime_type.startswith("video/"):
+        raise HTTPException(status_code=415, detail="Expected a video content type")
+
+    try:
+        upload_id = await save_video_upload(request.stream(), mime_type)
+    except VideoUploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    return {"videoUploadId": upload_id}
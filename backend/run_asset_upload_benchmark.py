@@ -0,0 +1,146 @@
+# Compares uploading assets as JSON data URLs (POST /assets/upload) against
+# streaming them as multipart/form-data (POST /assets/upload/multipart).
+#
+# Both endpoints run in-process against a filesystem asset backend in a
+# temporary directory, so stored assets don't count towards memory. Peak
+# memory is the tracemalloc peak above the baseline while a request is
+# handled, measured in separate runs since tracing slows allocations down;
+# the request bodies are built beforehand.
+#
+# Usage: poetry run python run_asset_upload_benchmark.py [files] [size_kb]
+
+import asyncio
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+
+import httpx
+from fastapi import FastAPI
+
+from assets.backends import FilesystemAssetBackend
+from assets.store import AssetStore
+from routes import assets as asset_routes
+
+RUNS = 3
+# Request body chunk size, similar to what a server receives from a socket
+STREAM_CHUNK_SIZE = 64 * 1024
+BOUNDARY = "benchmark-boundary"
+
+
+def make_files(count: int, size: int) -> List[Tuple[str, bytes]]:
+    return [(f"image-{i}.png", os.urandom(size)) for i in range(count)]
+
+
+def json_body(files: List[Tuple[str, bytes]]) -> bytes:
+    return json.dumps(
+        [
+            {
+                "dataUrl": "data:image/png;base64," + base64.b64encode(data).decode(),
+                "fileName": name,
+                "fileType": "image/png",
+                "category": "asset",
+            }
+            for name, data in files
+        ]
+    ).encode()
+
+
+def multipart_body(files: List[Tuple[str, bytes]]) -> bytes:
+    parts = [
+        (
+            f"--{BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="files"; filename="{name}"\r\n'
+            "Content-Type: image/png\r\n\r\n"
+        ).encode()
+        + data
+        + b"\r\n"
+        for name, data in files
+    ]
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+async def chunked(body: bytes) -> AsyncIterator[bytes]:
+    view = memoryview(body)
+    for start in range(0, len(body), STREAM_CHUNK_SIZE):
+        yield bytes(view[start : start + STREAM_CHUNK_SIZE])
+
+
+Sender = Callable[[httpx.AsyncClient], Awaitable[httpx.Response]]
+
+
+async def measure(client: httpx.AsyncClient, send: Sender, trace: bool) -> float:
+    """Seconds for the request, or peak bytes allocated above the baseline when tracing"""
+    # A fresh store each time, so content is never deduplicated
+    with tempfile.TemporaryDirectory() as root:
+        asset_routes.asset_store = AssetStore(
+            FilesystemAssetBackend(root, max_bytes=10**12, ttl=3600)
+        )
+        if trace:
+            tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        response = await send(client)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        response.raise_for_status()
+    return peak - baseline if trace else elapsed
+
+
+async def benchmark(files: List[Tuple[str, bytes]]) -> Dict[str, Tuple[float, int]]:
+    app = FastAPI()
+    app.include_router(asset_routes.router)
+    transport = httpx.ASGITransport(app=app)
+
+    bodies = {"json": json_body(files), "multipart": multipart_body(files)}
+    senders: Dict[str, Sender] = {
+        "json": lambda client: client.post(
+            "/assets/upload",
+            content=chunked(bodies["json"]),
+            headers={"Content-Type": "application/json"},
+        ),
+        "multipart": lambda client: client.post(
+            "/assets/upload/multipart?category=asset",
+            content=chunked(bodies["multipart"]),
+            headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"},
+        ),
+    }
+
+    results: Dict[str, Tuple[float, int]] = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        for name, send in senders.items():
+            timings = [await measure(client, send, trace=False) for _ in range(RUNS)]
+            peak = await measure(client, send, trace=True)
+            results[name] = (min(timings), int(peak))
+
+    print(
+        f"Body size: JSON {len(bodies['json']) / 2**20:.1f} MB, "
+        f"multipart {len(bodies['multipart']) / 2**20:.1f} MB"
+    )
+    return results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    size = int(sys.argv[2]) * 1024 if len(sys.argv) > 2 else 2 * 1024 * 1024
+    files = make_files(count, size)
+    total_mb = count * size / 2**20
+    print(f"Uploading {count} files of {size // 1024} KB ({total_mb:.1f} MB), best of {RUNS}")
+
+    results = asyncio.run(benchmark(files))
+
+    print(f"{'endpoint':>10} {'time':>10} {'throughput':>12} {'peak memory':>12}")
+    for name, (elapsed, peak) in results.items():
+        print(
+            f"{name:>10} {elapsed * 1000:>8.0f}ms {total_mb / elapsed:>8.1f} MB/s "
+            f"{peak / 2**20:>9.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
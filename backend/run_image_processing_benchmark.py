@@ -0,0 +1,98 @@
+# Compares the JPEG quality search in process_image against the previous
+# linear loop (start at 95, step down by 5) on a corpus of large screenshots.
+#
+# Usage: poetry run python run_image_processing_benchmark.py [screenshot_dir]
+# Without a directory, a synthetic corpus of large full-page screenshots is used.
+
+import base64
+import io
+import os
+import sys
+import time
+from typing import List, Tuple
+
+from PIL import Image, ImageDraw
+
+from image_processing.utils import (
+    CLAUDE_IMAGE_MAX_SIZE,
+    compress_jpeg_to_size_limit,
+)
+
+
+def legacy_compress(img: Image.Image, max_base64_size: int) -> Tuple[bytes, int]:
+    """The quality loop process_image used before the binary search"""
+    num_encodes = 0
+    quality = 95
+    output = io.BytesIO()
+    img.save(output, format="JPEG", quality=quality)
+    num_encodes += 1
+
+    while len(base64.b64encode(output.getvalue())) > max_base64_size and quality > 10:
+        output = io.BytesIO()
+        img.save(output, format="JPEG", quality=quality)
+        num_encodes += 1
+        quality -= 5
+
+    return output.getvalue(), num_encodes
+
+
+def synthetic_screenshot(width: int, height: int, noise: int) -> Image.Image:
+    """A page of text-like blocks over noise, which JPEG compresses poorly"""
+    img = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    overlay = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(overlay)
+    for y in range(0, height, 48):
+        for x in range(40, width - 200, 220):
+            draw.rectangle([x, y + 10, x + 180, y + 30], fill=(40, 40, 60))
+    return Image.blend(overlay, img, noise / 100)
+
+
+def load_corpus(directory: str | None) -> List[Tuple[str, Image.Image]]:
+    if directory:
+        return [
+            (name, Image.open(os.path.join(directory, name)).convert("RGB"))
+            for name in sorted(os.listdir(directory))
+            if name.lower().endswith((".png", ".jpg", ".jpeg", ".webp"))
+        ]
+
+    return [
+        (f"synthetic_{width}x{height}_noise{noise}", synthetic_screenshot(width, height, noise))
+        for width, height, noise in [
+            (1920, 6000, 15),
+            (1920, 7900, 30),
+            (2560, 7000, 45),
+            (3840, 4000, 60),
+            (3000, 7900, 90),
+        ]
+    ]
+
+
+def main() -> None:
+    corpus = load_corpus(sys.argv[1] if len(sys.argv) > 1 else None)
+    totals = {"legacy": [0, 0.0], "search": [0, 0.0]}
+
+    print(f"{'image':40} {'legacy encodes':>15} {'legacy s':>9} {'search encodes':>15} {'search s':>9}")
+    for name, img in corpus:
+        row: List[str] = []
+        for label, compress in [
+            ("legacy", legacy_compress),
+            ("search", compress_jpeg_to_size_limit),
+        ]:
+            start = time.perf_counter()
+            data, num_encodes = compress(img, CLAUDE_IMAGE_MAX_SIZE)
+            elapsed = time.perf_counter() - start
+            totals[label][0] += num_encodes
+            totals[label][1] += elapsed
+            fits = "" if len(base64.b64encode(data)) <= CLAUDE_IMAGE_MAX_SIZE else "!"
+            row.append(f"{num_encodes:>14}{fits:1} {elapsed:>9.2f}")
+        print(f"{name:40} {' '.join(row)}")
+
+    print(
+        f"{'total':40} {totals['legacy'][0]:>15} {totals['legacy'][1]:>9.2f} "
+        f"{totals['search'][0]:>15} {totals['search'][1]:>9.2f}"
+    )
+    print("(! = result still over the size limit)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# Compares rewriting image placeholders with find_img_tags/rewrite_img_tags
+# against the previous BeautifulSoup parse + prettify on large generated pages.
+#
+# Usage: poetry run python run_image_rewrite_benchmark.py [html_file ...]
+# Without files, synthetic pages of increasing size are used.
+
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from bs4 import BeautifulSoup
+
+from image_generation.core import extract_dimensions
+from image_generation.img_tags import ImgTag, find_img_tags, rewrite_img_tags
+
+RUNS = 5
+
+
+def legacy_rewrite(code: str, urls: Dict[str, str]) -> str:
+    """The BeautifulSoup path generate_images used before"""
+    soup = BeautifulSoup(code, "html.parser")
+    images = soup.find_all("img")
+    # Prompt collection reads every alt text before generation
+    [img.get("alt") for img in images]
+    for img in images:
+        if not img["src"].startswith("https://placehold.co"):
+            continue
+        width, height = extract_dimensions(img["src"])
+        img["width"] = width
+        img["height"] = height
+        img["src"] = urls[img.get("alt")]
+    return soup.prettify()
+
+
+def single_pass_rewrite(code: str, urls: Dict[str, str]) -> str:
+    images = find_img_tags(code)
+    # Prompt collection reads every alt text before generation
+    [img.get("alt") for img in images]
+
+    def replace(img: ImgTag) -> Dict[str, str] | None:
+        src = img.get("src") or ""
+        if not src.startswith("https://placehold.co"):
+            return None
+        width, height = extract_dimensions(src)
+        return {"src": urls[img.get("alt") or ""], "width": str(width), "height": str(height)}
+
+    return rewrite_img_tags(code, images, replace)
+
+
+def synthetic_page(sections: int) -> str:
+    """A Tailwind-style landing page with one placeholder image per card"""
+    cards = "\n".join(
+        f"""      <div class="rounded-lg shadow-md p-6 bg-white">
+        <img src="https://placehold.co/{300 + i % 7}x{200 + i % 5}" alt="Product photo {i % 40}" class="w-full h-48 object-cover rounded">
+        <h3 class="mt-4 text-xl font-semibold text-gray-800">Feature {i}</h3>
+        <p class="mt-2 text-gray-600">Lorem ipsum dolor sit amet, consectetur adipiscing elit. Integer nec odio &amp; praesent libero.</p>
+        <a href="#" class="mt-4 inline-block text-blue-600 hover:underline">Learn more &rarr;</a>
+      </div>"""
+        for i in range(sections)
+    )
+    return f"""<html>
+  <head>
+    <script src="https://cdn.tailwindcss.com"></script>
+  </head>
+  <body class="bg-gray-100">
+    <section class="grid grid-cols-3 gap-6 p-8">
+{cards}
+    </section>
+  </body>
+</html>"""
+
+
+def load_pages(paths: List[str]) -> List[Tuple[str, str]]:
+    if paths:
+        pages: List[Tuple[str, str]] = []
+        for path in paths:
+            with open(path) as file:
+                pages.append((path, file.read()))
+        return pages
+    return [(f"synthetic_{n}_cards", synthetic_page(n)) for n in (10, 100, 1000)]
+
+
+def best_time(rewrite: Callable[[str, Dict[str, str]], str], code: str, urls: Dict[str, str]) -> float:
+    times: List[float] = []
+    for _ in range(RUNS):
+        start_time = time.perf_counter()
+        rewrite(code, urls)
+        times.append(time.perf_counter() - start_time)
+    return min(times)
+
+
+def main():
+    pages = load_pages(sys.argv[1:])
+    print(f"{'page':<28}{'size':>10}{'images':>8}{'bs4 + prettify':>17}{'single pass':>13}{'speedup':>9}")
+
+    for name, code in pages:
+        images = find_img_tags(code)
+        urls = {
+            img.get("alt") or "": f"https://example.com/{i}.png"
+            for i, img in enumerate(images)
+        }
+        legacy_time = best_time(legacy_rewrite, code, urls)
+        new_time = best_time(single_pass_rewrite, code, urls)
+        print(
+            f"{name:<28}{len(code):>10}{len(images):>8}"
+            f"{legacy_time * 1000:>15.1f}ms{new_time * 1000:>11.1f}ms"
+            f"{legacy_time / new_time:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
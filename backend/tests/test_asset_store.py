@@ -0,0 +1,432 @@
+import base64
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from assets.backends import (
+    FilesystemAssetBackend,
+    MemoryAssetBackend,
+    RedisAssetBackend,
+)
+from assets.store import AssetStore, content_id
+from routes import assets as asset_routes
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\nfake image"
+PNG_DATA_URL = "data:image/png;base64," + base64.b64encode(PNG_BYTES).decode()
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    store = make_store(tmp_path, max_memory_bytes=1024 * 1024, max_disk_bytes=1024 * 1024)
+    monkeypatch.setattr(asset_routes, "asset_store", store)
+    return store
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(asset_routes.router)
+    return TestClient(app)
+
+
+class TestAssetStore:
+    """Test the content-addressed asset store."""
+
+    def test_identical_content_is_stored_once(self, store):
+        first = store.put_data_url(PNG_DATA_URL, file_name="logo.png")
+        second = store.put_data_url(PNG_DATA_URL, file_name="copy.png")
+
+        assert first.id == second.id == content_id(PNG_BYTES)
+        assert len(store.list()) == 1
+        assert store.get(first.id).data == PNG_BYTES
+
+    def test_media_type_comes_from_data_url(self, store):
+        asset = store.put_data_url(PNG_DATA_URL, file_type="application/pdf")
+        assert asset.media_type == "image/png"
+
+    @pytest.mark.parametrize("data_url", ["", "https://example.com/a.png", "data:image/png;base64,@@@"])
+    def test_rejects_invalid_data_urls(self, store, data_url):
+        with pytest.raises(ValueError):
+            store.put_data_url(data_url)
+
+
+class TestAssetRoutes:
+    """Test uploading and serving assets."""
+
+    def test_upload_and_serve(self, store, client):
+        response = client.post(
+            "/assets/upload",
+            json=[{"dataUrl": PNG_DATA_URL, "fileName": "logo.png", "category": "asset"}],
+        )
+        assert response.status_code == 200
+        [entry] = response.json()
+        assert entry["url"] == f"/assets/{content_id(PNG_BYTES)}"
+
+        served = client.get(entry["url"])
+        assert served.status_code == 200
+        assert served.content == PNG_BYTES
+        assert served.headers["content-type"] == "image/png"
+
+    def test_invalid_upload_is_rejected(self, store, client):
+        response = client.post("/assets/upload", json=[{"dataUrl": "not a data url"}])
+        assert response.status_code == 400
+        assert store.list() == []
+
+    def test_missing_asset(self, store, client):
+        assert client.get("/assets/unknown").status_code == 404
+
+
+def make_store(tmp_path, **limits) -> AssetStore:
+    return AssetStore(
+        MemoryAssetBackend(
+            max_memory_bytes=limits.get("max_memory_bytes", 100),
+            max_disk_bytes=limits.get("max_disk_bytes", 1000),
+            ttl=limits.get("ttl", 60),
+            spill_dir=str(tmp_path),
+        )
+    )
+
+
+class TestBoundedAssetStore:
+    """Test spilling and evicting assets."""
+
+    def test_cold_assets_spill_to_disk(self, tmp_path):
+        store = make_store(tmp_path)
+        first = store.put(b"a" * 60)
+        store.put(b"b" * 60)
+
+        assert store.backend.memory_bytes == 60
+        assert store.backend.disk_bytes == 60
+
+        spilled = store.get(first.id)
+        assert isinstance(spilled.data, memoryview)
+        assert bytes(spilled.data) == b"a" * 60
+
+    def test_least_recently_used_assets_are_evicted_from_disk(self, tmp_path):
+        store = make_store(tmp_path, max_memory_bytes=0, max_disk_bytes=100)
+        first = store.put(b"a" * 40)
+        second = store.put(b"b" * 40)
+        store.get(first.id)
+        store.put(b"c" * 40)
+
+        assert first.id in store.backend
+        assert second.id not in store.backend
+        assert store.backend.disk_bytes == 80
+
+    def test_unused_assets_expire(self, tmp_path, monkeypatch):
+        store = make_store(tmp_path, ttl=10)
+        monkeypatch.setattr("assets.backends.time.monotonic", lambda: 1000)
+        asset = store.put(b"a")
+        monkeypatch.setattr("assets.backends.time.monotonic", lambda: 1011)
+
+        assert store.get(asset.id) is None
+        assert store.backend.memory_bytes == 0
+
+    def test_close_removes_spill_directory(self, tmp_path):
+        store = make_store(tmp_path, max_memory_bytes=0)
+        store.put(b"a" * 10)
+        assert len(list(tmp_path.iterdir())) == 1
+
+        store.close()
+        assert list(tmp_path.iterdir()) == []
+
+    def test_spilled_assets_are_streamed(self, tmp_path, monkeypatch, client):
+        store = make_store(tmp_path, max_memory_bytes=0, max_disk_bytes=10000)
+        monkeypatch.setattr(asset_routes, "asset_store", store)
+        monkeypatch.setattr(asset_routes, "ASSET_CHUNK_SIZE", 1000)
+        data = bytes(range(256)) * 20
+        asset = store.put(data, "image/png")
+
+        response = client.get(f"/assets/{asset.id}")
+
+        assert response.content == data
+        assert response.headers["content-length"] == str(len(data))
+
+
+class FakeRedis:
+    """The subset of the redis-py client used by RedisAssetBackend"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.ttls = {}
+        self.transactions = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self, transaction)
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(
+            {
+                field: value if isinstance(value, bytes) else str(value).encode()
+                for field, value in mapping.items()
+            }
+        )
+
+    def hmget(self, key, fields):
+        values = self.hashes.get(key, {})
+        return [values.get(field) for field in fields]
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    def delete(self, key):
+        return 1 if self.hashes.pop(key, None) is not None else 0
+
+    def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        return [key.encode() for key in self.hashes if key.startswith(prefix)]
+
+    def close(self):
+        pass
+
+
+class FakePipeline:
+    """Queues commands for a FakeRedis until they are executed"""
+
+    def __init__(self, client, transaction):
+        self.client = client
+        self.transaction = transaction
+        self.commands = []
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+        return lambda *args, **kwargs: self.commands.append(
+            (name, command, args, kwargs)
+        )
+
+    def execute(self):
+        self.client.transactions.append(
+            (self.transaction, [name for name, *_ in self.commands])
+        )
+        return [command(*args, **kwargs) for _, command, args, kwargs in self.commands]
+
+
+class TestAssetBackends:
+    """Test the shared asset backends."""
+
+    def test_filesystem_backend_is_shared_between_stores(self, tmp_path):
+        writer = AssetStore(FilesystemAssetBackend(str(tmp_path), max_bytes=1000, ttl=60))
+        reader = AssetStore(FilesystemAssetBackend(str(tmp_path), max_bytes=1000, ttl=60))
+
+        asset = writer.put_data_url(PNG_DATA_URL, file_name="logo.png", category="asset")
+
+        served = reader.get(asset.id)
+        assert bytes(served.data) == PNG_BYTES
+        assert served.media_type == "image/png"
+        assert served.file_name == "logo.png"
+        assert [info.id for info in reader.list()] == [asset.id]
+
+        assert reader.delete(asset.id)
+        assert writer.get(asset.id) is None
+
+    def test_filesystem_backend_evicts_least_recently_used(self, tmp_path):
+        store = AssetStore(FilesystemAssetBackend(str(tmp_path), max_bytes=100, ttl=60))
+        first = store.put(b"a" * 40)
+        second = store.put(b"b" * 40)
+        # Make the first asset the most recently used one
+        os.utime(tmp_path / second.id, (0, 0))
+        store.put(b"c" * 40)
+
+        assert store.get(first.id) is not None
+        assert store.get(second.id) is None
+
+    def test_filesystem_backend_scans_directory_only_when_needed(
+        self, tmp_path, monkeypatch
+    ):
+        backend = FilesystemAssetBackend(str(tmp_path), max_bytes=100, ttl=60)
+        store = AssetStore(backend)
+        scans = []
+        prune = backend._prune
+        monkeypatch.setattr(backend, "_prune", lambda: scans.append(1) or prune())
+
+        store.put(b"a" * 10)
+        store.put(b"b" * 10)
+        store.put(b"c" * 10)
+        assert len(scans) == 1
+
+        # Going over the limit scans right away
+        store.put(b"d" * 80)
+        assert len(scans) == 2
+        assert len(store.list()) < 4
+
+    def test_filesystem_backend_serves_empty_assets(self, tmp_path, monkeypatch, client):
+        store = AssetStore(FilesystemAssetBackend(str(tmp_path), max_bytes=100, ttl=60))
+        monkeypatch.setattr(asset_routes, "asset_store", store)
+        asset = store.put(b"")
+
+        assert bytes(store.get(asset.id).data) == b""
+        response = client.get(f"/assets/{asset.id}")
+        assert response.status_code == 200
+        assert response.content == b""
+
+    def test_filesystem_backend_rejects_path_like_ids(self, tmp_path):
+        store = AssetStore(FilesystemAssetBackend(str(tmp_path), max_bytes=100, ttl=60))
+        assert store.get("../secret") is None
+
+    def test_redis_backend(self):
+        client = FakeRedis()
+        store = AssetStore(RedisAssetBackend(client, ttl=60))
+
+        asset = store.put_data_url(PNG_DATA_URL, file_name="logo.png")
+        again = store.put_data_url(PNG_DATA_URL, file_name="copy.png")
+
+        assert again.file_name == "logo.png"
+        assert client.ttls == {f"asset:{asset.id}": 60}
+        assert client.transactions == [(True, ["hset", "expire"])]
+        served = store.get(asset.id)
+        assert served.data == PNG_BYTES
+        assert served.category is None
+        assert served.size == len(PNG_BYTES)
+        assert [info.id for info in store.list()] == [asset.id]
+
+        assert store.delete(asset.id)
+        assert store.get(asset.id) is None
+
+
+class TestAssetCaching:
+    """Test conditional and range requests for assets."""
+
+    def test_revalidation_returns_not_modified(self, store, client):
+        asset = store.put(PNG_BYTES, "image/png")
+
+        response = client.get(f"/assets/{asset.id}")
+        assert response.headers["etag"] == f'"{asset.id}"'
+        assert "immutable" in response.headers["cache-control"]
+
+        revalidated = client.get(
+            f"/assets/{asset.id}", headers={"If-None-Match": response.headers["etag"]}
+        )
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+        assert revalidated.headers["etag"] == f'"{asset.id}"'
+
+        other = client.get(f"/assets/{asset.id}", headers={"If-None-Match": '"other"'})
+        assert other.status_code == 200
+
+    @pytest.mark.parametrize(
+        "range_header, start, end",
+        [("bytes=2-5", 2, 6), ("bytes=10-", 10, len(PNG_BYTES)), ("bytes=-3", len(PNG_BYTES) - 3, len(PNG_BYTES))],
+    )
+    def test_range_requests(self, store, client, range_header, start, end):
+        asset = store.put(PNG_BYTES, "image/png")
+
+        response = client.get(f"/assets/{asset.id}", headers={"Range": range_header})
+
+        assert response.status_code == 206
+        assert response.content == PNG_BYTES[start:end]
+        assert response.headers["content-range"] == f"bytes {start}-{end - 1}/{len(PNG_BYTES)}"
+
+    def test_range_is_ignored_for_stale_if_range(self, store, client):
+        asset = store.put(PNG_BYTES, "image/png")
+
+        response = client.get(
+            f"/assets/{asset.id}", headers={"Range": "bytes=2-5", "If-Range": '"other"'}
+        )
+
+        assert response.status_code == 200
+        assert response.content == PNG_BYTES
+
+    def test_unsatisfiable_range(self, store, client):
+        asset = store.put(PNG_BYTES, "image/png")
+
+        response = client.get(f"/assets/{asset.id}", headers={"Range": "bytes=1000-"})
+
+        assert response.status_code == 416
+        assert response.headers["content-range"] == f"bytes */{len(PNG_BYTES)}"
+
+    def test_reversed_range_is_ignored(self, store, client):
+        asset = store.put(PNG_BYTES, "image/png")
+
+        response = client.get(f"/assets/{asset.id}", headers={"Range": "bytes=5-3"})
+
+        assert response.status_code == 200
+        assert response.content == PNG_BYTES
+        assert "content-range" not in response.headers
+
+    def test_range_of_spilled_asset_is_streamed(self, tmp_path, monkeypatch, client):
+        store = make_store(tmp_path, max_memory_bytes=0, max_disk_bytes=10000)
+        monkeypatch.setattr(asset_routes, "asset_store", store)
+        monkeypatch.setattr(asset_routes, "ASSET_CHUNK_SIZE", 1000)
+        data = bytes(range(256)) * 20
+        asset = store.put(data, "image/png")
+
+        response = client.get(f"/assets/{asset.id}", headers={"Range": "bytes=900-3099"})
+
+        assert response.status_code == 206
+        assert response.content == data[900:3100]
+        assert response.headers["content-length"] == "2200"
+
+
+class TestMultipartUpload:
+    """Test streaming multipart uploads."""
+
+    def test_uploads_many_files(self, store, client):
+        response = client.post(
+            "/assets/upload/multipart?category=asset",
+            files=[
+                ("files", ("logo.png", PNG_BYTES, "image/png")),
+                ("files", ("notes.txt", b"hello", "text/plain")),
+            ],
+            data={"ignored": "field"},
+        )
+
+        assert response.status_code == 200
+        assert response.json() == [
+            {
+                "id": content_id(PNG_BYTES),
+                "url": f"/assets/{content_id(PNG_BYTES)}",
+                "fileName": "logo.png",
+                "category": "asset",
+            },
+            {
+                "id": content_id(b"hello"),
+                "url": f"/assets/{content_id(b'hello')}",
+                "fileName": "notes.txt",
+                "category": "asset",
+            },
+        ]
+        served = client.get(f"/assets/{content_id(PNG_BYTES)}")
+        assert served.content == PNG_BYTES
+        assert served.headers["content-type"] == "image/png"
+
+    def test_files_are_streamed_into_filesystem_backend(self, tmp_path, monkeypatch, client):
+        store = AssetStore(FilesystemAssetBackend(str(tmp_path), max_bytes=10**6, ttl=60))
+        monkeypatch.setattr(asset_routes, "asset_store", store)
+        data = os.urandom(300 * 1024)
+
+        response = client.post(
+            "/assets/upload/multipart", files=[("file", ("photo.jpg", data, "image/jpeg"))]
+        )
+
+        [entry] = response.json()
+        assert entry["id"] == content_id(data)
+        assert bytes(store.get(entry["id"]).data) == data
+        # No temporary upload files are left behind
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            entry["id"],
+            entry["id"] + ".json",
+        ]
+
+    def test_rejects_non_multipart_body(self, store, client):
+        response = client.post("/assets/upload/multipart", json=[])
+        assert response.status_code == 400
+
+    def test_rejects_truncated_body(self, tmp_path, monkeypatch, client):
+        store = AssetStore(FilesystemAssetBackend(str(tmp_path), max_bytes=10**6, ttl=60))
+        monkeypatch.setattr(asset_routes, "asset_store", store)
+        body = (
+            b"--boundary\r\n"
+            b'Content-Disposition: form-data; name="file"; filename="a.png"\r\n'
+            b"Content-Type: image/png\r\n\r\n" + PNG_BYTES
+        )
+
+        response = client.post(
+            "/assets/upload/multipart",
+            content=body,
+            headers={"Content-Type": "multipart/form-data; boundary=boundary"},
+        )
+
+        assert response.status_code == 400
+        assert list(tmp_path.iterdir()) == []
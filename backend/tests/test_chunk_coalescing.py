@@ -0,0 +1,82 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+from routes.generate_code import WebSocketCommunicator
+from ws.coalescing import ChunkCoalescer
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent: List[Dict[str, Any]] = []
+
+    async def send_json(self, data: Dict[str, Any]) -> None:
+        self.sent.append(data)
+
+
+class TestChunkCoalescer:
+    """Test buffering of streamed chunks into fewer frames."""
+
+    @pytest.mark.asyncio
+    async def test_chunks_within_interval_are_merged(self):
+        sent: List[tuple[str, int]] = []
+
+        async def send(content: str, index: int) -> None:
+            sent.append((content, index))
+
+        coalescer = ChunkCoalescer(send, flush_interval=0.02, max_buffer_size=1000)
+        for chunk in ["<ht", "ml>", "<body>"]:
+            await coalescer.add(chunk, 0)
+        await coalescer.add("x", 1)
+
+        assert sent == []
+        await asyncio.sleep(0.05)
+        assert sorted(sent) == [("<html><body>", 0), ("x", 1)]
+
+    @pytest.mark.asyncio
+    async def test_flushes_when_buffer_is_full(self):
+        sent: List[str] = []
+
+        async def send(content: str, index: int) -> None:
+            sent.append(content)
+
+        coalescer = ChunkCoalescer(send, flush_interval=10, max_buffer_size=4)
+        await coalescer.add("ab", 0)
+        await coalescer.add("cd", 0)
+        await coalescer.add("e", 0)
+
+        assert sent == ["abcd"]
+        coalescer.cancel()
+
+    @pytest.mark.asyncio
+    async def test_zero_interval_sends_immediately(self):
+        sent: List[str] = []
+
+        async def send(content: str, index: int) -> None:
+            sent.append(content)
+
+        coalescer = ChunkCoalescer(send, flush_interval=0, max_buffer_size=4096)
+        await coalescer.add("a", 0)
+        await coalescer.add("b", 0)
+        assert sent == ["a", "b"]
+
+
+class TestWebSocketCommunicatorCoalescing:
+    """Non-chunk messages flush pending chunks first."""
+
+    @pytest.mark.asyncio
+    async def test_set_code_flushes_pending_chunks(self):
+        websocket = FakeWebSocket()
+        communicator = WebSocketCommunicator(websocket)  # type: ignore
+
+        await communicator.send_message("chunk", "<html>", 0)
+        await communicator.send_message("chunk", "</html>", 0)
+        await communicator.send_message("setCode", "<html></html>", 0)
+        await communicator.send_message("variantComplete", "done", 0)
+
+        assert [message["type"] for message in websocket.sent] == [
+            "chunk",
+            "setCode",
+            "variantComplete",
+        ]
+        assert websocket.sent[0]["value"] == "<html></html>"
@@ -0,0 +1,167 @@
+from contextlib import asynccontextmanager
+from typing import List
+
+import pytest
+from openai.types.chat import ChatCompletionChunk
+from openai.types.chat.chat_completion_chunk import Choice, ChoiceDelta
+
+import models.early_stop
+from models.early_stop import (
+    EARLY_STOPS,
+    TOKENS_SAVED,
+    TRAILING_TOKENS,
+    DocumentEndDetector,
+)
+from models.openai_client import stream_openai_response
+
+CHUNKS = [
+    "Here you go:\n```html\n<html><body>",
+    "<p>Hi</p></body></html>",
+    "\n```",
+    "\n\nThis page uses a flex layout ",
+    "and Tailwind colors.",
+]
+
+
+@pytest.fixture(autouse=True)
+def no_holdout(monkeypatch):
+    monkeypatch.setattr(models.early_stop, "STREAM_EARLY_STOP_HOLDOUT", 0)
+
+
+class FakeStream:
+    def __init__(self, chunks: List[str]):
+        self.chunks = chunks
+        self.sent = 0
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.closed = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> ChatCompletionChunk:
+        if self.closed or self.sent == len(self.chunks):
+            raise StopAsyncIteration
+        content = self.chunks[self.sent]
+        self.sent += 1
+        return ChatCompletionChunk(
+            id="chunk",
+            choices=[Choice(index=0, delta=ChoiceDelta(content=content))],
+            created=0,
+            model="test-model",
+            object="chat.completion.chunk",
+        )
+
+
+def fake_openai_client(stream: FakeStream):
+    class Completions:
+        async def create(self, **params):
+            return stream
+
+    class Client:
+        class chat:
+            completions = Completions()
+
+    @asynccontextmanager
+    async def openai_client(api_key, base_url):
+        yield Client()
+
+    return openai_client
+
+
+class TestDocumentEndDetector:
+    """Test deciding when a stream can be cancelled."""
+
+    def test_stops_once_document_is_complete(self):
+        detector = DocumentEndDetector("openai", "stop-model", enabled=True)
+        assert [detector.should_stop(chunk) for chunk in CHUNKS[:3]] == [
+            False,
+            False,
+            True,
+        ]
+
+    def test_disabled_detector_measures_trailing_tokens(self):
+        labels = {"provider": "openai", "model": "trailing-model"}
+        detector = DocumentEndDetector(**labels, enabled=False)
+        assert not any(detector.should_stop(chunk) for chunk in CHUNKS)
+        detector.finish()
+
+        trailing_chars = len(CHUNKS[3]) + len(CHUNKS[4])
+        assert TRAILING_TOKENS.count(**labels) == 1
+        assert TRAILING_TOKENS.sum(**labels) == trailing_chars / 4
+
+        stopped = DocumentEndDetector(**labels, enabled=True)
+        for chunk in CHUNKS[:3]:
+            stopped.should_stop(chunk)
+        stopped.finish()
+
+        assert EARLY_STOPS.value(**labels) == 1
+        assert TOKENS_SAVED.value(**labels) == trailing_chars / 4
+
+    def test_html_tags_in_prose_do_not_stop_the_stream(self):
+        detector = DocumentEndDetector("openai", "prose-model", enabled=True)
+        chunks = [
+            "I'll wrap everything in <html>...</html> as usual.\n",
+            "```html\n<!DOCTYPE html><html><body>Real</body></html>",
+            "\n```",
+        ]
+        assert [detector.should_stop(chunk) for chunk in chunks] == [False, False, True]
+
+    def test_holdout_streams_run_to_the_end(self, monkeypatch):
+        monkeypatch.setattr(models.early_stop, "STREAM_EARLY_STOP_HOLDOUT", 1)
+        detector = DocumentEndDetector("openai", "holdout-model", enabled=True)
+        assert not any(detector.should_stop(chunk) for chunk in CHUNKS)
+
+
+class TestOpenAIEarlyStop:
+    """Test cancelling an OpenAI stream after the document."""
+
+    @pytest.mark.asyncio
+    async def test_stream_is_closed_after_document(self, monkeypatch):
+        stream = FakeStream(CHUNKS)
+        monkeypatch.setattr(
+            "models.openai_client.openai_client", fake_openai_client(stream)
+        )
+        received: List[str] = []
+
+        async def callback(content: str) -> None:
+            received.append(content)
+
+        completion = await stream_openai_response(
+            [],
+            api_key="key",
+            base_url=None,
+            callback=callback,
+            model_name="gpt-4o-2024-11-20",
+            stop_at_document_end=True,
+        )
+
+        assert stream.closed
+        assert stream.sent == 3
+        assert received == CHUNKS[:3]
+        assert completion["code"] == "".join(CHUNKS[:3])
+
+    @pytest.mark.asyncio
+    async def test_stream_runs_to_the_end_by_default(self, monkeypatch):
+        stream = FakeStream(CHUNKS)
+        monkeypatch.setattr(
+            "models.openai_client.openai_client", fake_openai_client(stream)
+        )
+
+        async def callback(content: str) -> None:
+            pass
+
+        completion = await stream_openai_response(
+            [],
+            api_key="key",
+            base_url=None,
+            callback=callback,
+            model_name="gpt-4o-2024-11-20",
+        )
+
+        assert stream.sent == len(CHUNKS)
+        assert completion["code"] == "".join(CHUNKS)
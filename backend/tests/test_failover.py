@@ -0,0 +1,285 @@
+from typing import List
+
+import anthropic
+import httpx
+import openai
+import pytest
+
+import models.failover
+import routes.generate_code
+from llm import MODEL_PROVIDER, Completion, Llm
+from models.failover import (
+    FAILOVERS,
+    CircuitBreaker,
+    FailoverCandidate,
+    ProvidersUnavailableError,
+    circuit_breaker,
+    is_provider_failure,
+    is_retryable,
+    stream_with_failover,
+)
+from models.hedging import ChunkCallback
+from routes.generate_code import ParallelGenerationStage
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(models.failover, "circuit_breakers", {})
+    monkeypatch.setattr(models.failover, "FAILOVER_BACKOFF_BASE", 0.001)
+
+
+def status_error(status: int, code: str | None = None) -> openai.APIStatusError:
+    response = httpx.Response(status, request=REQUEST)
+    body = {"code": code} if code else None
+    if status == 429:
+        return openai.RateLimitError("rate limited", response=response, body=body)
+    return openai.InternalServerError("server error", response=response, body=body)
+
+
+def fake_stream(name: str, errors: List[Exception], calls: List[str]):
+    """Stream that raises the given errors on its first calls, then succeeds"""
+
+    async def stream(callback: ChunkCallback) -> Completion:
+        calls.append(name)
+        if errors:
+            raise errors.pop(0)
+        await callback(name)
+        return {"duration": 0.0, "code": name}
+
+    return stream
+
+
+def candidate(provider: str, stream) -> FailoverCandidate:
+    model = {"openai": Llm.GPT_4_1_2025_04_14, "anthropic": Llm.CLAUDE_3_7_SONNET_2025_02_19}
+    return FailoverCandidate(provider, model[provider], stream)
+
+
+async def ignore(content: str) -> None:
+    pass
+
+
+class TestStreamWithFailover:
+    """Test retrying and failing over provider requests."""
+
+    @pytest.mark.asyncio
+    async def test_transient_error_is_retried(self):
+        calls: List[str] = []
+        completion = await stream_with_failover(
+            [candidate("openai", fake_stream("openai", [status_error(500)], calls))],
+            ignore,
+        )
+        assert completion["code"] == "openai"
+        assert calls == ["openai", "openai"]
+
+    @pytest.mark.asyncio
+    async def test_fails_over_after_retries(self):
+        calls: List[str] = []
+        errors: List[Exception] = [status_error(429), status_error(429)]
+        completion = await stream_with_failover(
+            [
+                candidate("openai", fake_stream("openai", errors, calls)),
+                candidate("anthropic", fake_stream("anthropic", [], calls)),
+            ],
+            ignore,
+        )
+        assert completion["code"] == "anthropic"
+        assert calls == ["openai", "openai", "anthropic"]
+        assert FAILOVERS.value(from_provider="openai", to_provider="anthropic") >= 1
+
+    @pytest.mark.asyncio
+    async def test_exhausted_quota_fails_over_without_retrying(self):
+        calls: List[str] = []
+        errors: List[Exception] = [status_error(429, code="insufficient_quota")]
+        completion = await stream_with_failover(
+            [
+                candidate("openai", fake_stream("openai", errors, calls)),
+                candidate("anthropic", fake_stream("anthropic", [], calls)),
+            ],
+            ignore,
+        )
+        assert completion["code"] == "anthropic"
+        assert calls == ["openai", "anthropic"]
+
+    @pytest.mark.asyncio
+    async def test_other_errors_are_raised(self):
+        calls: List[str] = []
+        with pytest.raises(ValueError):
+            await stream_with_failover(
+                [
+                    candidate("openai", fake_stream("openai", [ValueError()], calls)),
+                    candidate("anthropic", fake_stream("anthropic", [], calls)),
+                ],
+                ignore,
+            )
+        assert calls == ["openai"]
+
+    @pytest.mark.asyncio
+    async def test_error_after_streaming_is_raised(self):
+        calls: List[str] = []
+
+        async def stream(callback: ChunkCallback) -> Completion:
+            calls.append("openai")
+            await callback("<html>")
+            raise status_error(500)
+
+        with pytest.raises(openai.InternalServerError):
+            await stream_with_failover(
+                [
+                    candidate("openai", stream),
+                    candidate("anthropic", fake_stream("anthropic", [], calls)),
+                ],
+                ignore,
+            )
+        assert calls == ["openai"]
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_is_skipped(self):
+        breaker = circuit_breaker("openai")
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+
+        calls: List[str] = []
+        completion = await stream_with_failover(
+            [
+                candidate("openai", fake_stream("openai", [], calls)),
+                candidate("anthropic", fake_stream("anthropic", [], calls)),
+            ],
+            ignore,
+        )
+        assert completion["code"] == "anthropic"
+        assert calls == ["anthropic"]
+
+        with pytest.raises(ProvidersUnavailableError):
+            await stream_with_failover(
+                [candidate("openai", fake_stream("openai", [], calls))], ignore
+            )
+
+
+class TestCircuitBreaker:
+    """Test opening and closing a provider's circuit."""
+
+    def test_opens_after_consecutive_failures_and_probes(self, monkeypatch):
+        now = 100.0
+        monkeypatch.setattr(models.failover.time, "monotonic", lambda: now)
+        breaker = CircuitBreaker("gemini", failure_threshold=2, reset_seconds=30)
+
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert not breaker.allow()
+
+        now += 30
+        assert breaker.state == "half-open"
+        assert breaker.allow()
+        # Only one probe at a time
+        assert not breaker.allow()
+
+        breaker.record_failure()
+        assert breaker.state == "open"
+
+        now += 30
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed"
+        assert breaker.allow()
+
+    def test_anthropic_stream_error_events_are_retryable(self):
+        response = httpx.Response(
+            200, request=httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+        )
+
+        def stream_error(error_type: str) -> anthropic.APIStatusError:
+            return anthropic.AsyncAnthropic(api_key="key")._make_status_error(
+                error_type,
+                body={"type": "error", "error": {"type": error_type}},
+                response=response,
+            )
+
+        overloaded = stream_error("overloaded_error")
+        assert overloaded.status_code == 200
+        assert is_retryable(overloaded)
+        assert is_provider_failure(overloaded)
+
+        rate_limited = stream_error("rate_limit_error")
+        assert is_retryable(rate_limited)
+        assert not is_provider_failure(rate_limited)
+
+        assert not is_retryable(stream_error("invalid_request_error"))
+
+    @pytest.mark.asyncio
+    async def test_overloaded_claude_stream_fails_over(self):
+        response = httpx.Response(
+            200, request=httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+        )
+        overloaded = anthropic.AsyncAnthropic(api_key="key")._make_status_error(
+            "Overloaded",
+            body={"type": "error", "error": {"type": "overloaded_error"}},
+            response=response,
+        )
+        calls: List[str] = []
+        completion = await stream_with_failover(
+            [
+                candidate("anthropic", fake_stream("anthropic", [overloaded] * 2, calls)),
+                candidate("openai", fake_stream("openai", [], calls)),
+            ],
+            ignore,
+        )
+        assert completion["code"] == "openai"
+        assert calls == ["anthropic", "anthropic", "openai"]
+
+    def test_retryable_errors(self):
+        assert is_retryable(status_error(429))
+        assert is_retryable(status_error(503))
+        assert is_retryable(httpx.ConnectError("refused"))
+        assert not is_retryable(
+            openai.BadRequestError(
+                "bad request", response=httpx.Response(400, request=REQUEST), body=None
+            )
+        )
+
+
+class TestVariantFailover:
+    """Test failing over the stream of a generated variant."""
+
+    @pytest.mark.asyncio
+    async def test_variant_reports_the_model_that_produced_it(self, monkeypatch):
+        monkeypatch.setattr(routes.generate_code, "PROVIDER_FAILOVER", True)
+        monkeypatch.setattr(routes.generate_code, "HEDGE_REQUESTS", False)
+        messages: List[tuple] = []
+
+        async def send_message(type: str, value: str, index: int):
+            messages.append((type, value, index))
+
+        stage = ParallelGenerationStage(
+            send_message=send_message,
+            openai_api_key="key",
+            openai_base_url=None,
+            anthropic_api_key="key",
+            should_generate_images=False,
+        )
+        calls: List[str] = []
+        streams = {
+            "openai": fake_stream("openai", [status_error(500)] * 2, calls),
+            "anthropic": fake_stream("anthropic", [], calls),
+        }
+        monkeypatch.setattr(
+            stage,
+            "_stream_factory",
+            lambda model, *args: streams[MODEL_PROVIDER[model]],
+        )
+
+        completions = await stage.process_variants(
+            [Llm.GPT_4_1_2025_04_14], [], {}, {"generationType": "create"}
+        )
+
+        assert completions == {0: "anthropic"}
+        assert stage.completion_models[0] == Llm.CLAUDE_3_7_SONNET_2025_02_19
+        assert (
+            "status",
+            "gpt-4.1-2025-04-14 was unavailable, generated with "
+            "claude-3-7-sonnet-20250219 instead",
+            0,
+        ) in messages
@@ -0,0 +1,246 @@
+import asyncio
+from typing import List
+
+import pytest
+
+import models.hedging
+import routes.generate_code
+from llm import Completion, Llm
+from models.hedging import (
+    HEDGES_FIRED,
+    HEDGES_WON,
+    ChunkCallback,
+    FirstChunkLatencies,
+    hedged_stream,
+)
+from routes.generate_code import ParallelGenerationStage
+
+
+def latencies(model: str) -> List[float]:
+    return list(models.hedging.first_chunk_latencies._samples.get(model, []))
+
+
+@pytest.fixture(autouse=True)
+def short_hedge_delay(monkeypatch):
+    monkeypatch.setattr(models.hedging, "HEDGE_DEFAULT_DELAY", 0.05)
+    monkeypatch.setattr(models.hedging, "first_chunk_latencies", FirstChunkLatencies())
+
+
+def fake_stream(name: str, start_delay: float, cancelled: List[str], fail: bool = False):
+    async def stream(callback: ChunkCallback) -> Completion:
+        try:
+            await asyncio.sleep(start_delay)
+            if fail:
+                raise ConnectionError(f"{name} failed")
+            for chunk in [f"{name}-1", f"{name}-2"]:
+                await callback(chunk)
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            cancelled.append(name)
+            raise
+        return {"duration": start_delay, "code": f"{name}-1{name}-2"}
+
+    return stream
+
+
+class TestHedgedStream:
+    """Test starting a backup request when a stream is slow to start."""
+
+    @pytest.mark.asyncio
+    async def test_fast_stream_is_not_hedged(self):
+        received: List[str] = []
+        cancelled: List[str] = []
+
+        async def callback(content: str) -> None:
+            received.append(content)
+
+        completion = await hedged_stream(
+            "fast-model",
+            fake_stream("primary", 0, cancelled),
+            fake_stream("backup", 0, cancelled),
+            callback,
+        )
+
+        assert completion["code"] == "primary-1primary-2"
+        assert received == ["primary-1", "primary-2"]
+        assert HEDGES_FIRED.value(model="fast-model") == 0
+
+    @pytest.mark.asyncio
+    async def test_backup_that_streams_first_wins(self):
+        received: List[str] = []
+        cancelled: List[str] = []
+
+        async def callback(content: str) -> None:
+            received.append(content)
+
+        completion = await hedged_stream(
+            "slow-model",
+            fake_stream("primary", 1, cancelled),
+            fake_stream("backup", 0, cancelled),
+            callback,
+        )
+
+        assert completion["code"] == "backup-1backup-2"
+        assert received == ["backup-1", "backup-2"]
+        assert cancelled == ["primary"]
+        assert HEDGES_FIRED.value(model="slow-model") == 1
+        assert HEDGES_WON.value(model="slow-model") == 1
+
+    @pytest.mark.asyncio
+    async def test_original_request_can_still_win(self):
+        cancelled: List[str] = []
+
+        async def callback(content: str) -> None:
+            pass
+
+        completion = await hedged_stream(
+            "tail-model",
+            fake_stream("primary", 0.1, cancelled),
+            fake_stream("backup", 1, cancelled),
+            callback,
+        )
+
+        assert completion["code"] == "primary-1primary-2"
+        assert cancelled == ["backup"]
+        assert HEDGES_FIRED.value(model="tail-model") == 1
+        assert HEDGES_WON.value(model="tail-model") == 0
+
+    @pytest.mark.asyncio
+    async def test_backup_takes_over_after_failure(self):
+        cancelled: List[str] = []
+
+        async def callback(content: str) -> None:
+            pass
+
+        completion = await hedged_stream(
+            "flaky-model",
+            fake_stream("primary", 0.1, cancelled, fail=True),
+            fake_stream("backup", 0.2, cancelled),
+            callback,
+        )
+
+        assert completion["code"] == "backup-1backup-2"
+
+    @pytest.mark.asyncio
+    async def test_failure_without_backup_is_raised(self):
+        async def callback(content: str) -> None:
+            pass
+
+        with pytest.raises(ConnectionError):
+            await hedged_stream(
+                "broken-model", fake_stream("primary", 0, [], fail=True), None, callback
+            )
+
+
+class TestHedgeLatencySamples:
+    """Test which first-chunk latencies are recorded for a model."""
+
+    @pytest.mark.asyncio
+    async def test_primary_latency_is_recorded(self):
+        async def callback(content: str) -> None:
+            pass
+
+        await hedged_stream(
+            "sampled-model",
+            fake_stream("primary", 0.01, []),
+            fake_stream("backup", 0, []),
+            callback,
+        )
+
+        assert len(latencies("sampled-model")) == 1
+        assert 0.01 <= latencies("sampled-model")[0] < 0.05
+
+    @pytest.mark.asyncio
+    async def test_losing_primary_records_its_wait_not_the_backup_latency(self):
+        async def callback(content: str) -> None:
+            pass
+
+        await hedged_stream(
+            "lost-model",
+            fake_stream("primary", 1, []),
+            fake_stream("backup", 0, []),
+            callback,
+        )
+
+        # Hedge delay (0.05s) plus the backup's start, not the backup's ~0s
+        assert len(latencies("lost-model")) == 1
+        assert 0.05 <= latencies("lost-model")[0] < 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_primary_records_its_wait(self):
+        async def callback(content: str) -> None:
+            pass
+
+        task = asyncio.create_task(
+            hedged_stream("cancelled-model", fake_stream("primary", 1, []), None, callback)
+        )
+        await asyncio.sleep(0.02)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert len(latencies("cancelled-model")) == 1
+        assert 0.02 <= latencies("cancelled-model")[0] < 1
+
+    @pytest.mark.asyncio
+    async def test_failed_primary_is_not_recorded(self):
+        async def callback(content: str) -> None:
+            pass
+
+        await hedged_stream(
+            "failed-model",
+            fake_stream("primary", 0.1, [], fail=True),
+            fake_stream("backup", 0.2, []),
+            callback,
+        )
+
+        assert latencies("failed-model") == []
+
+
+class TestFirstChunkLatencies:
+    """Test the percentile used as hedge delay."""
+
+    def test_percentile_needs_enough_samples(self):
+        latencies = FirstChunkLatencies()
+        for seconds in range(1, 11):
+            latencies.record("model", seconds)
+        assert latencies.percentile("model", 95) is None
+
+        for seconds in range(11, 101):
+            latencies.record("model", seconds)
+        assert latencies.percentile("model", 95) == 95
+        assert latencies.percentile("model", 50) == 50
+
+
+class TestVariantHedging:
+    """Test hedging the stream of a generated variant."""
+
+    @pytest.mark.asyncio
+    async def test_latency_is_recorded_for_the_requested_claude_model(
+        self, monkeypatch
+    ):
+        monkeypatch.setattr(routes.generate_code, "HEDGE_REQUESTS", True)
+        monkeypatch.setattr(routes.generate_code, "PROVIDER_FAILOVER", False)
+
+        async def send_message(type: str, value: str, index: int):
+            pass
+
+        stage = ParallelGenerationStage(
+            send_message=send_message,
+            openai_api_key=None,
+            openai_base_url=None,
+            anthropic_api_key="key",
+            should_generate_images=False,
+        )
+
+        await stage._generate_variant(
+            0,
+            Llm.CLAUDE_4_SONNET_2025_05_14,
+            fake_stream("primary", 0, []),
+            [],
+            {"generationType": "update"},
+        )
+
+        # Updates are sent to Claude 3.5 whichever Claude model was selected
+        assert len(latencies(Llm.CLAUDE_3_5_SONNET_2024_06_20.value)) == 1
+        assert latencies(Llm.CLAUDE_4_SONNET_2025_05_14.value) == []
@@ -0,0 +1,95 @@
+import random
+from typing import List
+
+import pytest
+
+from codegen.utils import HtmlStreamExtractor, extract_html_content
+
+FENCED = """Here's the page:
+
+```html
+<!DOCTYPE html>
+<html lang="en"><head></head><body><p>Hi</p></body></html>
+```
+
+I used Tailwind for the layout and kept the colors from the screenshot."""
+
+
+def extracted(extractor: HtmlStreamExtractor, text: str) -> str:
+    return text if extractor.document is None else extractor.document
+
+
+def feed_in_chunks(text: str, size: int) -> HtmlStreamExtractor:
+    extractor = HtmlStreamExtractor()
+    for i in range(0, len(text), size):
+        extractor.feed(text[i : i + size])
+    return extractor
+
+
+class TestHtmlStreamExtractor:
+    """Test extracting HTML while the model output streams."""
+
+    @pytest.mark.parametrize(
+        "text",
+        [
+            FENCED,
+            '<!DOCTYPE html><html lang="en"><head></head><body></body></html>',
+            "<html><body>First</body></html> Some text <html><body>Second</body></html>",
+            "```html\n<head></head>\n``` and <html><body></body></html>",
+            "```html\n<div>No html tag</div>\n```",
+            "<html><body><p>Unfinished",
+            "No HTML here.",
+        ],
+    )
+    @pytest.mark.parametrize("chunk_size", [1, 2, 5, 100000])
+    def test_matches_extract_html_content_for_any_chunking(self, text, chunk_size):
+        extractor = feed_in_chunks(text, chunk_size)
+        assert extracted(extractor, text) == extract_html_content(text)
+
+    def test_document_closes_when_fence_closes(self):
+        extractor = HtmlStreamExtractor()
+        closed_at: List[int] = []
+        for i, char in enumerate(FENCED):
+            if extractor.feed(char) and not closed_at:
+                closed_at.append(i)
+
+        # Not at </html>, since the fence content (with the doctype) wins
+        assert FENCED[: closed_at[0] + 1].endswith("</html>\n```")
+        assert extractor.document.startswith("<!DOCTYPE html>")
+
+    def test_document_closes_at_closing_html_tag(self):
+        extractor = HtmlStreamExtractor()
+        assert not extractor.feed("Sure!\n<html><body></body></ht")
+        assert extractor.feed("ml>\nThis page uses")
+        assert extractor.document == "<html><body></body></html>"
+
+    def test_document_after_doctype_closes_at_closing_html_tag(self):
+        extractor = HtmlStreamExtractor()
+        assert extractor.feed("<!DOCTYPE html> <html><body></body></html>")
+
+    def test_html_tags_in_prose_do_not_close_the_document(self):
+        text = (
+            "I'll wrap everything in <html>...</html> as usual.\n"
+            "```html\n<!DOCTYPE html><html><body>Real</body></html>\n```"
+        )
+        extractor = HtmlStreamExtractor()
+        closed_at = next(i for i in range(len(text)) if extractor.feed(text[i]))
+
+        assert closed_at == len(text) - 1
+        assert extractor.document == extract_html_content(text)
+        assert "Real" in extractor.document
+
+    def test_partial_html_while_streaming(self):
+        extractor = HtmlStreamExtractor()
+        extractor.feed("Intro\n```html\n<html><body><p>Hel")
+        assert not extractor.closed
+        assert extractor.document is None
+        assert extractor.html == "<html><body><p>Hel"
+
+    def test_random_chunking(self):
+        rng = random.Random(0)
+        pieces = ["```html", "```", "<html", ">", "</html>", " ", "\n", "x", "`", "<"]
+        for _ in range(2000):
+            text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 12)))
+            extractor = feed_in_chunks(text, rng.randint(1, 4))
+            assert extracted(extractor, text) == extract_html_content(text)
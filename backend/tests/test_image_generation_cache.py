@@ -0,0 +1,134 @@
+import threading
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+import image_generation.cache
+from image_generation.cache import IMAGE_CACHE_HITS, SqliteImageCache
+from image_generation.core import generate_images
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SqliteImageCache(str(tmp_path / "images.sqlite3"), ttl=60, max_entries=3)
+    yield cache
+    cache.close()
+
+
+class TestSqliteImageCache:
+    """Test the persistent generated image cache."""
+
+    def test_prompts_are_normalized(self, cache):
+        cache.put("dalle3", "Hero image of a  mountain\nlandscape ", "1024x1024", "url1")
+
+        assert (
+            cache.get("dalle3", "hero image of a mountain landscape", "1024x1024")
+            == "url1"
+        )
+
+    def test_key_includes_model_and_size(self, cache):
+        cache.put("dalle3", "a cat", "1024x1024", "url1")
+
+        assert cache.get("flux", "a cat", "1024x1024") is None
+        assert cache.get("dalle3", "a cat", "1:1") is None
+
+    def test_entries_expire(self, cache):
+        with patch("image_generation.cache.time.time", return_value=1000):
+            cache.put("dalle3", "a cat", "1024x1024", "url1")
+        with patch("image_generation.cache.time.time", return_value=1061):
+            assert cache.get("dalle3", "a cat", "1024x1024") is None
+
+    def test_least_recently_used_entries_are_evicted(self, cache):
+        for i, prompt in enumerate(["a", "b", "c"]):
+            with patch("image_generation.cache.time.time", return_value=1000 + i):
+                cache.put("dalle3", prompt, "1024x1024", f"url-{prompt}")
+        with patch("image_generation.cache.time.time", return_value=1010):
+            cache.get("dalle3", "a", "1024x1024")
+        with patch("image_generation.cache.time.time", return_value=1020):
+            cache.put("dalle3", "d", "1024x1024", "url-d")
+            assert len(cache) == 3
+            assert cache.get("dalle3", "a", "1024x1024") == "url-a"
+            assert cache.get("dalle3", "b", "1024x1024") is None
+
+    def test_batched_lookup_is_keyed_by_the_given_prompts(self, cache):
+        cache.put_many("dalle3", "1024x1024", {"A cat": "url-cat", "a dog": "url-dog"})
+
+        assert cache.get_many(
+            "dalle3", ["a  CAT", "a dog", "a bird"], "1024x1024"
+        ) == {"a  CAT": "url-cat", "a dog": "url-dog"}
+
+    def test_persists_across_instances(self, tmp_path):
+        path = str(tmp_path / "images.sqlite3")
+        first = SqliteImageCache(path, ttl=60, max_entries=10)
+        first.put("flux", "a cat", "1:1", "url1")
+        first.close()
+
+        second = SqliteImageCache(path, ttl=60, max_entries=10)
+        assert second.get("flux", "a cat", "1:1") == "url1"
+        second.close()
+
+
+class TestGenerateImagesWithPersistentCache:
+    """Test that generate_images consults the persistent cache."""
+
+    @pytest.mark.asyncio
+    async def test_only_uncached_prompts_are_generated(self, cache, monkeypatch):
+        monkeypatch.setattr(image_generation.cache, "_image_cache", cache)
+        cache.put("dalle3", "a dog", "1024x1024", "https://cached/dog.png")
+        hits_before = IMAGE_CACHE_HITS.value(model="dalle3")
+        code = (
+            '<img src="https://placehold.co/300x200" alt="a dog">'
+            '<img src="https://placehold.co/300x200" alt="a cat">'
+        )
+
+        with patch(
+            "image_generation.core.generate_image_dalle",
+            AsyncMock(return_value="https://new/cat.png"),
+        ) as mock_generate:
+            result = await generate_images(code, "key", None, {}, "dalle3")
+
+        mock_generate.assert_awaited_once()
+        assert mock_generate.await_args.args[0] == "a cat"
+        assert "https://cached/dog.png" in result
+        assert "https://new/cat.png" in result
+        assert cache.get("dalle3", "a cat", "1024x1024") == "https://new/cat.png"
+        assert IMAGE_CACHE_HITS.value(model="dalle3") == hits_before + 2
+
+    @pytest.mark.asyncio
+    async def test_failed_generations_are_not_cached(self, cache, monkeypatch):
+        monkeypatch.setattr(image_generation.cache, "_image_cache", cache)
+        code = '<img src="https://placehold.co/300x200" alt="a cat">'
+
+        with patch(
+            "image_generation.core.generate_image_dalle", AsyncMock(return_value=None)
+        ):
+            await generate_images(code, "key", None, {}, "dalle3")
+
+        assert cache.get("dalle3", "a cat", "1024x1024") is None
+
+    @pytest.mark.asyncio
+    async def test_cache_is_used_off_the_event_loop(self, cache, monkeypatch):
+        monkeypatch.setattr(image_generation.cache, "_image_cache", cache)
+        threads = []
+        for name in ["get_many", "put_many"]:
+            method = getattr(cache, name)
+
+            def record(*args, method=method):
+                threads.append(threading.get_ident())
+                return method(*args)
+
+            monkeypatch.setattr(cache, name, record)
+        code = (
+            '<img src="https://placehold.co/300x200" alt="a dog">'
+            '<img src="https://placehold.co/300x200" alt="a cat">'
+        )
+
+        with patch(
+            "image_generation.core.generate_image_dalle",
+            AsyncMock(return_value="https://new/image.png"),
+        ):
+            await generate_images(code, "key", None, {}, "dalle3")
+
+        # One lookup and one write for the whole page, both in worker threads
+        assert len(threads) == 2
+        assert threading.get_ident() not in threads
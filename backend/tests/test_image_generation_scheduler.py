@@ -0,0 +1,92 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from image_generation.scheduler import QUEUE_DEPTH, ImageGenerationScheduler
+
+
+async def run_requests(
+    scheduler: ImageGenerationScheduler,
+    session_id: str,
+    count: int,
+    order: List[str],
+    duration: float = 0.01,
+):
+    async def request(i: int):
+        async with scheduler.slot(session_id):
+            order.append(f"{session_id}{i}")
+            await asyncio.sleep(duration)
+
+    await asyncio.gather(*[request(i) for i in range(count)])
+
+
+class TestImageGenerationScheduler:
+    """Test the per-provider image generation scheduler."""
+
+    @pytest.mark.asyncio
+    async def test_limits_in_flight_requests(self):
+        scheduler = ImageGenerationScheduler("openai", max_in_flight=3, requests_per_minute=0)
+        running = 0
+        peak = 0
+
+        async def request():
+            nonlocal running, peak
+            async with scheduler.slot("a"):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*[request() for _ in range(10)])
+
+        assert peak == 3
+        assert scheduler.in_flight == 0
+        assert scheduler.queue_depth == 0
+
+    @pytest.mark.asyncio
+    async def test_sessions_are_served_round_robin(self):
+        scheduler = ImageGenerationScheduler("openai", max_in_flight=1, requests_per_minute=0)
+        order: List[str] = []
+
+        # Session "a" queues a whole page of images before "b" asks for two
+        big_page = asyncio.create_task(run_requests(scheduler, "a", 6, order))
+        await asyncio.sleep(0)
+        await run_requests(scheduler, "b", 2, order)
+        await big_page
+
+        assert order.index("b1") < order.index("a3")
+
+    @pytest.mark.asyncio
+    async def test_token_bucket_limits_request_rate(self):
+        # 1200 requests/minute = one every 50ms after a burst of 2
+        scheduler = ImageGenerationScheduler(
+            "replicate", max_in_flight=10, requests_per_minute=1200, burst=2
+        )
+        order: List[str] = []
+
+        start = asyncio.get_running_loop().time()
+        await run_requests(scheduler, "a", 5, order, duration=0)
+        elapsed = asyncio.get_running_loop().time() - start
+
+        assert len(order) == 5
+        assert 0.13 <= elapsed < 0.5
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiters_leave_the_queue(self):
+        scheduler = ImageGenerationScheduler("openai", max_in_flight=1, requests_per_minute=0)
+        await scheduler.acquire("a")
+        waiter = asyncio.create_task(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+
+        assert scheduler.queue_depth == 1
+        assert QUEUE_DEPTH.value(provider="openai") == 1
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        scheduler.release()
+
+        assert scheduler.queue_depth == 0
+        assert scheduler.in_flight == 0
+        assert QUEUE_DEPTH.value(provider="openai") == 0
@@ -0,0 +1,147 @@
+import asyncio
+from typing import List
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from image_generation.core import generate_images
+from image_generation.prefetch import ImagePrefetcher, PlaceholderDetector
+from routes.generate_code import ParallelGenerationStage
+
+CODE = (
+    "<html><body>\n"
+    '<img src="https://placehold.co/300x200" alt="a red car">\n'
+    '<img src="https://example.com/logo.png" alt="logo">\n'
+    "<img alt='a blue > green sky' src=https://placehold.co/100x100 />\n"
+    '<img src="https://placehold.co/300x200" alt="a red car">\n'
+    "</body></html>"
+)
+
+
+def feed_in_chunks(detector: PlaceholderDetector, code: str, size: int) -> List[str]:
+    alts: List[str] = []
+    for i in range(0, len(code), size):
+        alts.extend(detector.feed(code[i : i + size]))
+    return alts
+
+
+class TestPlaceholderDetector:
+    """Test detecting placeholder images in streamed code."""
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 7, 64, 10000])
+    def test_finds_each_placeholder_once_regardless_of_chunking(self, chunk_size):
+        alts = feed_in_chunks(PlaceholderDetector(), CODE, chunk_size)
+        assert alts == ["a red car", "a blue > green sky"]
+
+    def test_reports_tag_as_soon_as_it_is_complete(self):
+        detector = PlaceholderDetector()
+
+        assert detector.feed('<div><img src="https://placehold.co/1x1" alt="cat"') == []
+        assert detector.feed(">") == ["cat"]
+
+    @pytest.mark.parametrize("chunk_size", [1, 5, 10000])
+    def test_skips_images_in_scripts_styles_and_comments(self, chunk_size):
+        code = (
+            "<html><body>\n"
+            '<script type="text/babel">\n'
+            '  const Hero = () => <img src="https://placehold.co/1x1" alt="hero mountain" />;\n'
+            "</script >\n"
+            "<style>.x { content: '<img src=\"https://placehold.co/1x1\" alt=\"css\">' }</style>\n"
+            '<!-- <img src="https://placehold.co/1x1" alt="commented out"> -->\n'
+            '<img src="https://placehold.co/1x1" alt="real image">\n'
+            "</body></html>"
+        )
+        alts = feed_in_chunks(PlaceholderDetector(), code, chunk_size)
+        assert alts == ["real image"]
+
+    def test_keeps_little_of_an_open_script_in_memory(self):
+        detector = PlaceholderDetector()
+        detector.feed("<script>" + "const x = 1;" * 1000)
+        assert len(detector._buffer) <= 32
+        assert detector.feed('</script><img src="https://placehold.co/1x1" alt="a">') == [
+            "a"
+        ]
+
+    def test_only_keeps_unfinished_tag_in_memory(self):
+        detector = PlaceholderDetector()
+        detector.feed("<p>" + "x" * 10000 + "</p><im")
+        assert len(detector._buffer) <= 3
+
+
+class TestImagePrefetcher:
+    """Test starting image generation while code streams."""
+
+    @pytest.mark.asyncio
+    async def test_prefetched_images_are_used_by_generate_images(self):
+        generated: List[List[str]] = []
+
+        async def fake_generate(prompts, api_key, base_url, model, session_id, *args):
+            generated.append(prompts)
+            return {p: f"https://img/{p.replace(' ', '-')}.png" for p in prompts}
+
+        with patch(
+            "image_generation.prefetch.generate_image_urls", side_effect=fake_generate
+        ), patch(
+            "image_generation.core.generate_image_urls", side_effect=fake_generate
+        ):
+            prefetcher = ImagePrefetcher("key", None, "dalle3", image_cache={})
+            for i in range(0, len(CODE), 5):
+                prefetcher.feed(CODE[i : i + 5])
+            await asyncio.sleep(0)
+
+            # Both images started before the code finished streaming
+            assert generated == [["a red car"], ["a blue > green sky"]]
+
+            result = await generate_images(
+                CODE, "key", None, {}, "dalle3", prefetched=prefetcher.tasks
+            )
+
+        assert generated[2:] == [[]]
+        assert 'src="https://img/a-red-car.png"' in result
+        assert 'src="https://img/a-blue-&gt;-green-sky.png"' in result
+
+    @pytest.mark.asyncio
+    async def test_images_missing_from_final_code_are_cancelled(self):
+        started = asyncio.Event()
+
+        async def fake_generate(prompts, api_key, base_url, model, session_id, *args):
+            if prompts == ["draft image"]:
+                started.set()
+                await asyncio.sleep(10)
+            return {p: f"https://img/{p.replace(' ', '-')}.png" for p in prompts}
+
+        stage = ParallelGenerationStage(
+            send_message=AsyncMock(),
+            openai_api_key="key",
+            openai_base_url=None,
+            anthropic_api_key=None,
+            should_generate_images=True,
+        )
+        with patch(
+            "image_generation.prefetch.generate_image_urls", side_effect=fake_generate
+        ), patch(
+            "image_generation.core.generate_image_urls", side_effect=fake_generate
+        ):
+            prefetcher = ImagePrefetcher("key", None, "dalle3", image_cache={})
+            stage.image_prefetchers[0] = prefetcher
+            prefetcher.feed('<img src="https://placehold.co/1x1" alt="draft image">')
+            prefetcher.feed(CODE)
+            await started.wait()
+
+            result = await stage._perform_image_generation(CODE, {}, 0)
+
+        await asyncio.sleep(0)
+        assert 'src="https://img/a-red-car.png"' in result
+        assert prefetcher.tasks["draft image"].cancelled()
+        assert not prefetcher.tasks["a red car"].cancelled()
+
+    @pytest.mark.asyncio
+    async def test_skips_images_known_from_history(self):
+        with patch("image_generation.prefetch.generate_image_urls", AsyncMock()):
+            prefetcher = ImagePrefetcher(
+                "key", None, "dalle3", image_cache={"a red car": "https://img/car.png"}
+            )
+            prefetcher.feed(CODE)
+            prefetcher.cancel()
+
+        assert list(prefetcher.tasks) == ["a blue > green sky"]
@@ -0,0 +1,144 @@
+import base64
+import io
+import os
+
+import pytest
+from PIL import Image
+from image_processing.utils import (
+    ProcessedImageCache,
+    base64_length,
+    compress_jpeg_to_size_limit,
+    encode_jpeg,
+    process_image,
+    process_image_async,
+    processed_image_cache,
+)
+from models.claude import convert_openai_messages_to_claude
+
+
+def make_data_url(width: int, height: int, color: str = "red") -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+class TestProcessedImageCache:
+    """Test the size-bounded LRU cache of processed images."""
+
+    def test_hit_and_miss_counters(self):
+        cache = ProcessedImageCache(max_bytes=1000)
+        assert cache.get("a") is None
+        cache.put("a", ("image/png", "abc"))
+        assert cache.get("a") == ("image/png", "abc")
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_evicts_least_recently_used_by_size(self):
+        cache = ProcessedImageCache(max_bytes=40)
+        cache.put("a", ("image/png", "x" * 10))
+        cache.put("b", ("image/png", "y" * 10))
+        cache.get("a")
+        cache.put("c", ("image/png", "z" * 10))
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        assert cache.current_bytes <= 40
+
+    def test_oversized_entries_are_not_cached(self):
+        cache = ProcessedImageCache(max_bytes=5)
+        cache.put("a", ("image/png", "x" * 10))
+        assert len(cache) == 0
+
+
+class TestProcessImage:
+    """Test processing of images for Claude."""
+
+    def test_repeated_image_is_served_from_cache(self):
+        processed_image_cache.clear()
+        data_url = make_data_url(20, 10)
+        hits_before = processed_image_cache.hits
+
+        first = process_image(data_url)
+        second = process_image(data_url)
+
+        assert first == second == ("image/png", data_url.split(",")[1])
+        assert processed_image_cache.hits == hits_before + 1
+
+
+class TestProcessImageAsync:
+    """Test image processing dispatched to the worker pool."""
+
+    @pytest.mark.asyncio
+    async def test_matches_sync_result(self):
+        data_url = make_data_url(30, 30, "blue")
+        assert await process_image_async(data_url) == process_image(data_url)
+
+    @pytest.mark.asyncio
+    async def test_convert_messages_processes_every_image(self):
+        first, second = make_data_url(10, 10, "green"), make_data_url(12, 12, "white")
+        messages = [
+            {"role": "system", "content": "system prompt"},
+            {
+                "role": "user",
+                "content": [
+                    {"type": "image_url", "image_url": {"url": first}},
+                    {"type": "text", "text": "Build this"},
+                ],
+            },
+            {"role": "assistant", "content": "<html></html>"},
+            {
+                "role": "user",
+                "content": [{"type": "image_url", "image_url": {"url": second}}],
+            },
+        ]
+
+        system_prompt, claude_messages = await convert_openai_messages_to_claude(
+            messages  # type: ignore
+        )
+
+        assert system_prompt == "system prompt"
+        images = [
+            part
+            for message in claude_messages
+            if isinstance(message["content"], list)
+            for part in message["content"]
+            if part["type"] == "image"
+        ]
+        assert [image["source"]["data"] for image in images] == [
+            first.split(",")[1],
+            second.split(",")[1],
+        ]
+        assert all("image_url" not in image for image in images)
+
+
+class TestCompressJpegToSizeLimit:
+    """Test the quality search used for oversized images."""
+
+    def noisy_image(self, width: int, height: int) -> Image.Image:
+        return Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+
+    def test_fitting_image_needs_one_encode(self):
+        img = Image.new("RGB", (200, 200), "white")
+        data, num_encodes = compress_jpeg_to_size_limit(img, 1024 * 1024)
+        assert num_encodes == 1
+        assert base64_length(len(data)) <= 1024 * 1024
+
+    def test_search_uses_logarithmic_number_of_encodes(self):
+        img = self.noisy_image(400, 400)
+        full_quality_size = base64_length(len(encode_jpeg(img, 95)))
+        limit = full_quality_size // 3
+
+        data, num_encodes = compress_jpeg_to_size_limit(img, limit)
+
+        assert base64_length(len(data)) <= limit
+        # 1 encode at max quality + at most ceil(log2(17)) search steps
+        assert num_encodes <= 6
+
+    def test_downscales_when_min_quality_is_too_large(self):
+        img = self.noisy_image(300, 300)
+        limit = base64_length(len(encode_jpeg(img, 10))) // 4
+
+        data, _ = compress_jpeg_to_size_limit(img, limit)
+
+        assert base64_length(len(data)) <= limit
+        assert Image.open(io.BytesIO(data)).width < 300
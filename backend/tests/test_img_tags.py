@@ -0,0 +1,79 @@
+from image_generation.core import create_alt_url_mapping
+from image_generation.img_tags import find_img_tags, rewrite_img_tags
+
+
+class TestFindImgTags:
+    """Test locating <img> tags without a full HTML parser."""
+
+    def test_reads_quoted_unquoted_and_encoded_attributes(self):
+        tags = find_img_tags(
+            "<IMG SRC=https://placehold.co/300x200 alt='Tom &amp; Jerry' "
+            'data-x="a > b" loading=lazy hidden>'
+        )
+
+        assert len(tags) == 1
+        assert tags[0].attributes == {
+            "src": "https://placehold.co/300x200",
+            "alt": "Tom & Jerry",
+            "data-x": "a > b",
+            "loading": "lazy",
+            "hidden": "",
+        }
+
+    def test_skips_comments_scripts_and_styles(self):
+        code = (
+            '<!-- <img src="a"> -->'
+            "<script>const s = '<img src=\"b\">';</script>"
+            '<style>/* <img src="c"> */</style>'
+            '<img src="d"><imgur></imgur>'
+        )
+
+        assert [tag.get("src") for tag in find_img_tags(code)] == ["d"]
+
+    def test_first_duplicate_attribute_wins(self):
+        assert find_img_tags('<img alt="one" alt="two">')[0].get("alt") == "one"
+
+
+class TestRewriteImgTags:
+    """Test splicing attributes into <img> tags in place."""
+
+    def test_only_rewritten_attributes_change(self):
+        code = (
+            "<div>\n  <img  class='hero'\n       src=\"https://placehold.co/300x200\" "
+            'width=10 />\n  <p>unchanged   spacing</p>\n</div>'
+        )
+        tags = find_img_tags(code)
+
+        result = rewrite_img_tags(
+            code,
+            tags,
+            lambda tag: {"src": "https://img/a.png?x=1&y=2", "width": "300", "height": "200"},
+        )
+
+        assert result == (
+            "<div>\n  <img  class='hero'\n       src=\"https://img/a.png?x=1&amp;y=2\" "
+            'width="300" height="200" />\n  <p>unchanged   spacing</p>\n</div>'
+        )
+
+    def test_returning_none_leaves_tag_alone(self):
+        code = '<img src="a"><img src="b">'
+        tags = find_img_tags(code)
+
+        result = rewrite_img_tags(
+            code, tags, lambda tag: {"src": "c"} if tag.get("src") == "b" else None
+        )
+
+        assert result == '<img src="a"><img src="c">'
+
+
+class TestCreateAltUrlMapping:
+    """Test collecting already generated images from previous code."""
+
+    def test_maps_alt_to_generated_urls_only(self):
+        code = (
+            '<img src="https://img/cat.png" alt="a cat">'
+            '<img src="https://placehold.co/100x100" alt="a dog">'
+            '<img alt="no src">'
+        )
+
+        assert create_alt_url_mapping(code) == {"a cat": "https://img/cat.png"}
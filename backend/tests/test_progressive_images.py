@@ -0,0 +1,66 @@
+import asyncio
+import json
+from typing import List, Tuple
+from unittest.mock import patch
+
+import pytest
+
+import image_generation.cache
+from image_generation.cache import NullImageCache
+from llm import Llm
+from routes.generate_code import ParallelGenerationStage
+
+CODE = """<html><body>
+<img src="https://placehold.co/300x200" alt="slow image">
+<img src="https://placehold.co/100x100" alt="fast image">
+<img src="https://placehold.co/50x50" alt="from history">
+</body></html>"""
+
+
+class TestProgressiveImages:
+    """Test sending code before its images are ready."""
+
+    @pytest.mark.asyncio
+    async def test_code_is_sent_before_images(self, monkeypatch):
+        monkeypatch.setattr(image_generation.cache, "_image_cache", NullImageCache())
+        monkeypatch.setattr("routes.generate_code.REPLICATE_API_KEY", None)
+        messages: List[Tuple[str, str, int]] = []
+
+        async def send_message(type: str, value: str, index: int):
+            messages.append((type, value, index))
+
+        async def fake_dalle(prompt: str, *args):
+            await asyncio.sleep(0.2 if prompt == "slow image" else 0)
+            return f"https://img/{prompt.replace(' ', '-')}.png"
+
+        stage = ParallelGenerationStage(
+            send_message=send_message,
+            openai_api_key="key",
+            openai_base_url=None,
+            anthropic_api_key=None,
+            should_generate_images=True,
+        )
+
+        async def completion():
+            return {"duration": 1.0, "code": CODE}
+
+        with patch("image_generation.core.generate_image_dalle", side_effect=fake_dalle):
+            await stage._process_variant_completion(
+                0,
+                asyncio.create_task(completion()),
+                Llm.GPT_4O_2024_11_20,
+                {"from history": "https://img/history.png"},
+                {},
+            )
+
+        types = [message[0] for message in messages]
+        assert types == ["setCode", "imageReady", "imageReady", "variantComplete"]
+
+        code = messages[0][1]
+        assert 'src="https://placehold.co/300x200"' in code
+        assert 'src="https://img/history.png"' in code
+
+        assert [json.loads(message[1]) for message in messages[1:3]] == [
+            {"alt": "fast image", "url": "https://img/fast-image.png"},
+            {"alt": "slow image", "url": "https://img/slow-image.png"},
+        ]
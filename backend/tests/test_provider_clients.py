@@ -0,0 +1,83 @@
+import pytest
+from models.clients import ClientRegistry
+
+
+class TestClientRegistry:
+    """Test pooling and eviction of shared provider clients."""
+
+    @pytest.mark.asyncio
+    async def test_same_key_reuses_client(self):
+        """Leasing the same credentials twice returns the same client."""
+        registry = ClientRegistry(max_clients=4, idle_timeout=60)
+        async with registry.lease("openai", "key-a") as first:
+            pass
+        async with registry.lease("openai", "key-a") as second:
+            pass
+        assert first is second
+        assert len(registry) == 1
+        await registry.aclose()
+
+    @pytest.mark.asyncio
+    async def test_different_keys_get_different_clients(self):
+        """API key and base URL are both part of the pool key."""
+        registry = ClientRegistry(max_clients=4, idle_timeout=60)
+        async with registry.lease("openai", "key-a") as a:
+            pass
+        async with registry.lease("openai", "key-a", "http://localhost:1234/v1") as b:
+            pass
+        async with registry.lease("anthropic", "key-a") as c:
+            pass
+        assert len({id(a), id(b), id(c)}) == 3
+        await registry.aclose()
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction_over_capacity(self):
+        """The least recently used idle client is evicted first."""
+        registry = ClientRegistry(max_clients=2, idle_timeout=60)
+        async with registry.lease("openai", "key-a") as a:
+            pass
+        async with registry.lease("openai", "key-b"):
+            pass
+        # Touch key-a so key-b becomes least recently used
+        async with registry.lease("openai", "key-a"):
+            pass
+        async with registry.lease("openai", "key-c"):
+            pass
+
+        assert len(registry) == 2
+        async with registry.lease("openai", "key-a") as a_again:
+            pass
+        assert a_again is a
+        await registry.aclose()
+
+    @pytest.mark.asyncio
+    async def test_leased_clients_are_not_evicted(self):
+        """Clients with an in-flight stream survive eviction passes."""
+        registry = ClientRegistry(max_clients=1, idle_timeout=0)
+        async with registry.lease("anthropic", "key-a") as held:
+            async with registry.lease("anthropic", "key-b"):
+                pass
+            assert len(registry) == 1
+            async with registry.lease("anthropic", "key-a") as same:
+                assert same is held
+        await registry.aclose()
+        assert len(registry) == 0
+
+    @pytest.mark.asyncio
+    async def test_gemini_client_connection_pool_is_closed_on_eviction(self):
+        """Gemini clients are pooled and their HTTP client closed when evicted."""
+        registry = ClientRegistry(max_clients=1, idle_timeout=60)
+        async with registry.lease("gemini", "key-a") as first:
+            http_client = first._api_client._async_httpx_client
+        async with registry.lease("gemini", "key-a") as same:
+            assert same is first
+        assert not http_client.is_closed
+
+        async with registry.lease("gemini", "key-b") as other:
+            assert other is not first
+        assert len(registry) == 1
+        assert http_client.is_closed
+
+        other_http_client = other._api_client._async_httpx_client
+        await registry.aclose()
+        assert other_http_client.is_closed
@@ -0,0 +1,135 @@
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from typing import Any, Dict
+
+import pytest
+
+from image_generation.replicate import call_replicate, poll_intervals
+
+
+class StubReplicate:
+    """Local Replicate API stub whose predictions take `run_time` seconds"""
+
+    def __init__(self, run_time: float):
+        self.run_time = run_time
+        self.started: Dict[str, float] = {}
+        self.requests: Counter[str] = Counter()
+        self.canceled: set[str] = set()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def prediction(self, prediction_id: str) -> Dict[str, Any]:
+        done = time.monotonic() - self.started[prediction_id] >= self.run_time
+        if prediction_id in self.canceled:
+            status = "canceled"
+        else:
+            status = "succeeded" if done else "processing"
+        return {
+            "id": prediction_id,
+            "status": status,
+            "output": [f"https://images/{prediction_id}.png"] if done else None,
+            "urls": {
+                "get": f"{self.url}/predictions/{prediction_id}",
+                "cancel": f"{self.url}/predictions/{prediction_id}/cancel",
+            },
+        }
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def _reply(self, body: Dict[str, Any], status: int = 200):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                cancel = re.match(r".*/predictions/(\w+)/cancel$", self.path)
+                if cancel:
+                    stub.requests[cancel.group(1)] += 1
+                    stub.canceled.add(cancel.group(1))
+                    return self._reply(stub.prediction(cancel.group(1)))
+
+                prediction_id = f"p{len(stub.started)}"
+                stub.started[prediction_id] = time.monotonic()
+                stub.requests[prediction_id] += 1
+
+                wait = re.match(r"wait=(\d+)", self.headers.get("Prefer", ""))
+                if wait:
+                    time.sleep(min(stub.run_time, int(wait.group(1))))
+                self._reply(stub.prediction(prediction_id), 201)
+
+            def do_GET(self):
+                prediction_id = self.path.rsplit("/", 1)[-1]
+                stub.requests[prediction_id] += 1
+                self._reply(stub.prediction(prediction_id))
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args: Any):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestPollIntervals:
+    """Test the jittered exponential backoff schedule."""
+
+    def test_grows_to_maximum_with_jitter(self):
+        intervals = list(islice(poll_intervals(0.2, 2.0, 2.0), 8))
+
+        assert 0.1 <= intervals[0] <= 0.2
+        assert 0.2 <= intervals[1] <= 0.4
+        assert all(1.0 <= i <= 2.0 for i in intervals[4:])
+
+
+class TestCallReplicate:
+    """Test Replicate predictions against a local stub server."""
+
+    @pytest.mark.asyncio
+    async def test_prefer_wait_finishes_in_one_request(self):
+        with StubReplicate(run_time=0.3) as stub:
+            url = await call_replicate({"prompt": "a cat"}, "token", api_url=stub.url)
+
+        assert url == "https://images/p0.png"
+        assert stub.requests["p0"] == 1
+
+    @pytest.mark.asyncio
+    async def test_polling_backs_off(self):
+        with StubReplicate(run_time=2.0) as stub:
+            url = await call_replicate(
+                {"prompt": "a cat"}, "token", api_url=stub.url, prefer_wait=0
+            )
+
+        assert url == "https://images/p0.png"
+        # Polling every 0.1s would take ~20 requests
+        assert stub.requests["p0"] <= 10
+
+    @pytest.mark.asyncio
+    async def test_deadline_cancels_prediction(self):
+        with StubReplicate(run_time=10.0) as stub:
+            with pytest.raises(TimeoutError):
+                await call_replicate(
+                    {"prompt": "a cat"},
+                    "token",
+                    api_url=stub.url,
+                    timeout=1.0,
+                    prefer_wait=0,
+                )
+
+        assert stub.canceled == {"p0"}
@@ -0,0 +1,85 @@
+import asyncio
+import contextlib
+
+import pytest
+from metrics.core import MetricsRegistry
+from models.timing import STREAM_CHARS_TOTAL, STREAMS_TOTAL, StreamTimer
+
+
+class TestStreamTimer:
+    """Test per-stream timing collected through the chunk callback."""
+
+    @pytest.mark.asyncio
+    async def test_wrapped_callback_records_chunks(self):
+        """Chunks are forwarded unchanged and counted."""
+        received: list[str] = []
+
+        async def callback(content: str) -> None:
+            received.append(content)
+
+        timer = StreamTimer("openai", "test-model")
+        wrapped = timer.wrap(callback)
+        for chunk in ["<html>", "<body>", "</body></html>"]:
+            await wrapped(chunk)
+
+        timing = timer.finish()
+
+        assert received == ["<html>", "<body>", "</body></html>"]
+        assert timing.chunks == 3
+        assert timing.chars == len("<html><body></body></html>")
+        assert timing.first_chunk_latency is not None
+        assert timing.first_chunk_latency <= timing.duration
+        assert STREAM_CHARS_TOTAL.value(provider="openai", model="test-model") >= 26
+
+    def test_stream_without_chunks(self):
+        """A stream that never produced output has no first-chunk latency."""
+        timing = StreamTimer("anthropic", "empty-model").finish()
+        assert timing.first_chunk_latency is None
+        assert timing.chars_per_second == 0
+
+
+    @pytest.mark.parametrize(
+        "error, outcome",
+        [(None, "ok"), (ConnectionError(), "error"), (asyncio.CancelledError(), "cancelled")],
+    )
+    def test_streams_are_recorded_however_they_end(self, error, outcome):
+        """Failed and cancelled streams are recorded with their outcome."""
+        labels = {"provider": "openai", "model": f"{outcome}-model"}
+        with pytest.raises(BaseException) if error else contextlib.nullcontext():
+            with StreamTimer(**labels):
+                if error:
+                    raise error
+
+        assert STREAMS_TOTAL.value(**labels, outcome=outcome) == 1
+
+
+class TestMetricsRegistry:
+    """Test the Prometheus text exposition."""
+
+    def test_render_counter_and_histogram(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("requests_total", "Requests", ["route"])
+        histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+        counter.inc(route="/a")
+        counter.inc(2, route="/a")
+        histogram.observe(0.05)
+        histogram.observe(5)
+
+        output = registry.render()
+
+        assert "# TYPE requests_total counter" in output
+        assert 'requests_total{route="/a"} 3' in output
+        assert 'latency_seconds_bucket{le="0.1"} 1' in output
+        assert 'latency_seconds_bucket{le="1"} 1' in output
+        assert 'latency_seconds_bucket{le="+Inf"} 2' in output
+        assert "latency_seconds_count 2" in output
+
+    def test_registering_twice_returns_same_metric(self):
+        registry = MetricsRegistry()
+        assert registry.counter("x_total", "X") is registry.counter("x_total", "X")
+
+    def test_wrong_labels_raise(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("y_total", "Y", ["provider"])
+        with pytest.raises(ValueError):
+            counter.inc(model="m")
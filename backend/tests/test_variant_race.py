@@ -0,0 +1,88 @@
+import asyncio
+from typing import List, Tuple
+
+import pytest
+
+from llm import Completion, Llm
+from routes.generate_code import ParallelGenerationStage
+
+DOCUMENT = "<html><body><p>Done</p></body></html>"
+
+
+def make_stage(messages: List[Tuple[str, str, int]], is_race_mode: bool = True):
+    async def send_message(type: str, value: str, index: int):
+        messages.append((type, value, index))
+
+    return ParallelGenerationStage(
+        send_message=send_message,
+        openai_api_key="key",
+        openai_base_url=None,
+        anthropic_api_key=None,
+        should_generate_images=False,
+        is_race_mode=is_race_mode,
+    )
+
+
+class TestVariantRace:
+    """Test keeping only the first variant with a complete document."""
+
+    @pytest.mark.asyncio
+    async def test_first_complete_document_wins_and_others_are_cancelled(
+        self, monkeypatch
+    ):
+        messages: List[Tuple[str, str, int]] = []
+        stage = make_stage(messages)
+        cancelled: List[int] = []
+
+        async def stream(index: int, delay: float) -> Completion:
+            code = ""
+            try:
+                for chunk in ["Sure!\n", DOCUMENT[:10], DOCUMENT[10:], "\nExplanation"]:
+                    await asyncio.sleep(delay)
+                    code += chunk
+                    await stage._process_chunk(chunk, index)
+            except asyncio.CancelledError:
+                cancelled.append(index)
+                raise
+            return {"duration": 0.0, "code": code}
+
+        monkeypatch.setattr(
+            stage,
+            "_create_generation_tasks",
+            lambda *args: [stream(0, 0.05), stream(1, 0.001), stream(2, 0.05)],
+        )
+
+        completions = await stage.process_variants(
+            [Llm.GPT_4O_2024_11_20] * 3, [], {}, {"generationType": "create"}
+        )
+
+        assert stage.race_winner == 1
+        assert sorted(cancelled) == [0, 2]
+        assert list(completions) == [1]
+        assert ("setCode", DOCUMENT, 1) in messages
+        assert ("variantComplete", "Variant generation complete", 1) in messages
+        errors = sorted(index for type, _, index in messages if type == "variantError")
+        assert errors == [0, 2]
+
+    @pytest.mark.asyncio
+    async def test_all_variants_complete_without_race_mode(self, monkeypatch):
+        messages: List[Tuple[str, str, int]] = []
+        stage = make_stage(messages, is_race_mode=False)
+
+        async def stream(index: int, delay: float) -> Completion:
+            await asyncio.sleep(delay)
+            await stage._process_chunk(DOCUMENT, index)
+            return {"duration": 0.0, "code": DOCUMENT}
+
+        monkeypatch.setattr(
+            stage,
+            "_create_generation_tasks",
+            lambda *args: [stream(0, 0.02), stream(1, 0)],
+        )
+
+        completions = await stage.process_variants(
+            [Llm.GPT_4O_2024_11_20] * 2, [], {}, {"generationType": "create"}
+        )
+
+        assert sorted(completions) == [0, 1]
+        assert not any(type == "variantError" for type, _, _ in messages)
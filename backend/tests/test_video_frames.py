@@ -0,0 +1,66 @@
+import numpy as np
+from video.utils import sample_frame_timestamps, select_informative_frames
+
+
+def frame(value: float) -> np.ndarray:
+    return np.full((9, 16), value, dtype=np.float32)
+
+
+class TestSampleFrameTimestamps:
+    """Test uniform sampling of frame timestamps."""
+
+    def test_every_nth_frame(self):
+        assert sample_frame_timestamps(100, 10, 5) == [0.0, 2.0, 4.0, 6.0, 8.0]
+
+    def test_short_video_keeps_every_frame(self):
+        assert sample_frame_timestamps(3, 30, 20) == [0.0, 1 / 30, 2 / 30]
+
+    def test_duration_shorter_than_sample_count(self):
+        # A 0.1s clip at 30 fps has fewer frames than screenshots requested
+        timestamps = sample_frame_timestamps(4, 30, 20, duration=0.1)
+        assert len(timestamps) == 3
+        assert timestamps[:2] == [0.0, 1 / 30]
+        assert timestamps[-1] < 0.1
+
+    def test_last_frame_is_clamped_below_duration(self):
+        # The reader counts one frame more than the 2s clip contains
+        timestamps = sample_frame_timestamps(21, 10, 21, duration=2.0)
+        assert len(timestamps) == 20
+        assert timestamps[-1] == 1.9
+        assert all(t < 2.0 for t in timestamps)
+
+    def test_clip_shorter_than_one_frame(self):
+        assert sample_frame_timestamps(1, 30, 20, duration=0.01) == [0.0]
+
+
+class TestSelectInformativeFrames:
+    """Test scene-change-aware frame selection."""
+
+    def test_static_video_collapses_to_one_frame(self):
+        thumbnails = np.stack([frame(100) for _ in range(40)])
+        assert select_informative_frames(thumbnails, 20, 1.5) == [0]
+
+    def test_picks_frames_at_scene_changes(self):
+        # Three static scenes: 0-9, 10-24, 25-39
+        values = [50] * 10 + [150] * 15 + [250] * 15
+        thumbnails = np.stack([frame(v) for v in values])
+
+        assert select_informative_frames(thumbnails, 20, 1.5) == [0, 10, 25]
+
+    def test_respects_max_frames_and_time_order(self):
+        thumbnails = np.stack([frame(v * 10) for v in range(25)])
+        selected = select_informative_frames(thumbnails, 5, 1.5)
+
+        assert len(selected) == 5
+        assert selected == sorted(selected)
+        assert selected[0] == 0 and selected[-1] == 24
+
+    def test_empty_input(self):
+        assert select_informative_frames(np.zeros((0, 9, 16)), 20, 1.5) == []
+
+    def test_colour_changes_with_equal_brightness_are_detected(self):
+        red = np.zeros((9, 16, 3)) + [255, 0, 0]
+        blue = np.zeros((9, 16, 3)) + [0, 0, 255]
+        thumbnails = np.stack([red] * 5 + [blue] * 5)
+
+        assert select_informative_frames(thumbnails, 20, 1.5) == [0, 5]
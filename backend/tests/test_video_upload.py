@@ -0,0 +1,83 @@
+import os
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import video.uploads
+from prompts import assemble_video_prompt
+from routes import video as video_routes
+from video.uploads import resolve_video_upload
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(video.uploads, "VIDEO_UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(video_routes.router)
+    return TestClient(app)
+
+
+class TestVideoUploadRoute:
+    """Test streaming raw video uploads to disk."""
+
+    def test_upload_writes_body_to_disk(self, upload_dir, client):
+        body = os.urandom(256 * 1024)
+        response = client.post(
+            "/video/upload", content=body, headers={"Content-Type": "video/mp4"}
+        )
+
+        assert response.status_code == 200
+        upload_id = response.json()["videoUploadId"]
+        assert upload_id.endswith(".mp4")
+        with open(resolve_video_upload(upload_id), "rb") as file:
+            assert file.read() == body
+
+    def test_rejects_non_video_content(self, upload_dir, client):
+        response = client.post(
+            "/video/upload", content=b"abc", headers={"Content-Type": "text/plain"}
+        )
+        assert response.status_code == 415
+
+    def test_rejects_oversized_upload(self, upload_dir, client, monkeypatch):
+        monkeypatch.setattr(video.uploads, "VIDEO_UPLOAD_MAX_BYTES", 1024)
+        response = client.post(
+            "/video/upload",
+            content=b"x" * 4096,
+            headers={"Content-Type": "video/webm"},
+        )
+        assert response.status_code == 413
+        assert os.listdir(upload_dir) == []
+
+    def test_invalid_upload_ids_are_rejected(self, upload_dir):
+        with pytest.raises(ValueError):
+            resolve_video_upload("../../etc/passwd")
+
+
+class TestAssembleVideoPrompt:
+    """Test building video prompts from uploaded files."""
+
+    @pytest.mark.asyncio
+    async def test_uses_uploaded_file_and_removes_it(self, upload_dir):
+        upload_id = "a" * 32 + ".mp4"
+        path = upload_dir / upload_id
+        path.write_bytes(b"video")
+        messages = [{"role": "user", "content": []}]
+
+        with patch(
+            "prompts.assemble_claude_prompt_video_from_file",
+            AsyncMock(return_value=messages),
+        ) as mock_assemble:
+            result = await assemble_video_prompt(
+                {"text": "", "images": [], "additionalFiles": [], "videoUploadId": upload_id}
+            )
+
+        assert result == messages
+        mock_assemble.assert_awaited_once_with(str(path))
+        assert not path.exists()
@@ -0,0 +1,89 @@
+import mimetypes
+import os
+import re
+import time
+import uuid
+from typing import AsyncIterator
+
+from config import VIDEO_UPLOAD_DIR, VIDEO_UPLOAD_MAX_BYTES, VIDEO_UPLOAD_TTL
+
+# Upload IDs are file names inside VIDEO_UPLOAD_DIR, so any worker that shares
+# the directory can resolve them. The pattern prevents path traversal.
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}(\.[a-z0-9]{1,8})?$")
+
+
+class VideoUploadTooLarge(Exception):
+    pass
+
+
+def _upload_path(upload_id: str) -> str:
+    if not UPLOAD_ID_PATTERN.match(upload_id):
+        raise ValueError(f"Invalid video upload ID: {upload_id}")
+    return os.path.join(VIDEO_UPLOAD_DIR, upload_id)
+
+
+async def save_video_upload(
+    chunks: AsyncIterator[bytes],
+    mime_type: str,
+    max_bytes: int | None = None,
+) -> str:
+    """
+    Write an uploaded video to disk chunk by chunk and return its upload ID.
+
+    Only one network chunk is held in memory at a time.
+    """
+    if max_bytes is None:
+        max_bytes = VIDEO_UPLOAD_MAX_BYTES
+    os.makedirs(VIDEO_UPLOAD_DIR, exist_ok=True)
+    remove_stale_video_uploads()
+
+    suffix = mimetypes.guess_extension(mime_type) or ""
+    upload_id = uuid.uuid4().hex + suffix
+    path = _upload_path(upload_id)
+
+    size = 0
+    try:
+        with open(path, "wb") as file:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise VideoUploadTooLarge(
+                        f"Video exceeds the maximum upload size of {max_bytes} bytes"
+                    )
+                file.write(chunk)
+    except BaseException:
+        remove_video_upload(upload_id)
+        raise
+
+    print(f"[VIDEO UPLOAD] Stored {upload_id} ({size} bytes)")
+    return upload_id
+
+
+def resolve_video_upload(upload_id: str) -> str:
+    """Return the file path for an upload ID"""
+    path = _upload_path(upload_id)
+    if not os.path.exists(path):
+        raise ValueError(f"Video upload not found: {upload_id}")
+    return path
+
+
+def remove_video_upload(upload_id: str) -> None:
+    try:
+        os.remove(_upload_path(upload_id))
+    except FileNotFoundError:
+        pass
+
+
+def remove_stale_video_uploads(max_age: float | None = None) -> None:
+    """Delete uploads that were never consumed by a generation"""
+    if not os.path.isdir(VIDEO_UPLOAD_DIR):
+        return
+
+    cutoff = time.time() - (VIDEO_UPLOAD_TTL if max_age is None else max_age)
+    for name in os.listdir(VIDEO_UPLOAD_DIR):
+        path = os.path.join(VIDEO_UPLOAD_DIR, name)
+        try:
+            if UPLOAD_ID_PATTERN.match(name) and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
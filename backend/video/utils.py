@@ -1,25 +1,46 @@
 # Extract HTML content from the completion string
+import asyncio
 import base64
 import io
 import mimetypes
 import os
 import tempfile
+import time
 import uuid
 from typing import Any, Union, cast
 from moviepy.editor import VideoFileClip  # type: ignore
+import numpy as np
 from PIL import Image
 import math
 
+from config import VIDEO_FRAME_SELECTION
+
 
 DEBUG = True
 TARGET_NUM_SCREENSHOTS = (
     20  # Should be max that Claude supports (20) - reduce to save tokens on testing
 )
 
+# Scene-change selection: candidates sampled per screenshot, height of the
+# thumbnails they are compared on, and the mean absolute pixel difference
+# (0-255) below which two frames count as duplicates
+SCENE_CANDIDATES_PER_SCREENSHOT = 4
+SCENE_THUMBNAIL_HEIGHT = 90
+SCENE_DUPLICATE_THRESHOLD = 1.5
+
 
 async def assemble_claude_prompt_video(video_data_url: str) -> list[Any]:
-    images = split_video_into_screenshots(video_data_url)
+    images = await asyncio.to_thread(split_video_into_screenshots, video_data_url)
+    return screenshots_to_claude_messages(images)
+
+
+async def assemble_claude_prompt_video_from_file(video_path: str) -> list[Any]:
+    """Same as assemble_claude_prompt_video for a video that is already on disk"""
+    images = await asyncio.to_thread(extract_screenshots_from_file, video_path)
+    return screenshots_to_claude_messages(images)
+
 
+def screenshots_to_claude_messages(images: list[Image.Image]) -> list[Any]:
     # Save images to tmp if we're debugging
     if DEBUG:
         save_images_to_tmp(images)
@@ -63,8 +84,6 @@ async def assemble_claude_prompt_video(video_data_url: str) -> list[Any]:
 
 # Returns a list of images/frame (RGB format)
 def split_video_into_screenshots(video_data_url: str) -> list[Image.Image]:
-    target_num_screenshots = TARGET_NUM_SCREENSHOTS
-
     # Decode the base64 URL to get the video bytes
     video_encoded_data = video_data_url.split(",")[1]
     video_bytes = base64.b64decode(video_encoded_data)
@@ -76,28 +95,155 @@ def split_video_into_screenshots(video_data_url: str) -> list[Image.Image]:
         print(temp_video_file.name)
         temp_video_file.write(video_bytes)
         temp_video_file.flush()
-        clip = VideoFileClip(temp_video_file.name)
-        images: list[Image.Image] = []
-        total_frames = cast(int, clip.reader.nframes)  # type: ignore
+        return extract_screenshots_from_file(temp_video_file.name)
 
-        # Calculate frame skip interval by dividing total frames by the target number of screenshots
-        # Ensuring a minimum skip of 1 frame
-        frame_skip = max(1, math.ceil(total_frames / target_num_screenshots))
 
-        # Iterate over each frame in the clip
-        for i, frame in enumerate(clip.iter_frames()):
-            # Save every nth frame
-            if i % frame_skip == 0:
-                frame_image = Image.fromarray(frame)  # type: ignore
-                images.append(frame_image)
-                # Ensure that we don't capture more than the desired number of frames
-                if len(images) >= target_num_screenshots:
-                    break
+def extract_screenshots_from_file(
+    video_path: str, target_num_screenshots: int = TARGET_NUM_SCREENSHOTS
+) -> list[Image.Image]:
+    if VIDEO_FRAME_SELECTION == "scene":
+        return extract_scene_change_screenshots(video_path, target_num_screenshots)
 
+    clip = VideoFileClip(video_path)
+    try:
+        total_frames = cast(int, clip.reader.nframes)  # type: ignore
+        timestamps = sample_frame_timestamps(
+            total_frames,
+            cast(float, clip.fps),
+            target_num_screenshots,
+            cast(float, clip.duration),
+        )
+        return extract_frames_at(clip, timestamps)
+    finally:
         # Close the video file to release resources
         clip.close()
 
-        return images
+
+def sample_frame_timestamps(
+    total_frames: int,
+    fps: float,
+    target_num_screenshots: int,
+    duration: float | None = None,
+) -> list[float]:
+    """
+    Timestamps of every Nth frame so that at most `target_num_screenshots` are taken.
+
+    The reader's frame count can overestimate the length of the video, so
+    when `duration` is given, timestamps are kept to the start of its last frame.
+    """
+    # Calculate frame skip interval by dividing total frames by the target number of screenshots
+    # Ensuring a minimum skip of 1 frame
+    frame_skip = max(1, math.ceil(total_frames / target_num_screenshots))
+    frame_indices = list(range(0, total_frames, frame_skip)[:target_num_screenshots])
+    if duration is not None:
+        # Tolerate float error in duration * fps when it is a whole number of frames
+        last_index = max(0, math.ceil(duration * fps - 1e-6) - 1)
+        # Several indices past the end would all become the last frame
+        frame_indices = list(dict.fromkeys(min(i, last_index) for i in frame_indices))
+    return [index / fps for index in frame_indices]
+
+
+def extract_frames_at(clip: Any, timestamps: list[float]) -> list[Image.Image]:
+    """
+    Decode only the frames at the given timestamps.
+
+    `get_frame` seeks the ffmpeg reader to far-away timestamps instead of
+    decoding every frame in between, so the cost scales with the number of
+    screenshots rather than the length of the video.
+    """
+    start_time = time.perf_counter()
+    images: list[Image.Image] = []
+    for t in timestamps:
+        frame = clip.get_frame(t)
+        images.append(Image.fromarray(frame))  # type: ignore
+
+    decode_time = time.perf_counter() - start_time
+    print(
+        f"[VIDEO] Decoded {len(images)} frames in {decode_time:.2f} seconds "
+        f"({clip.duration:.1f}s video at {clip.fps} fps)"
+    )
+    return images
+
+
+def extract_scene_change_screenshots(
+    video_path: str, target_num_screenshots: int = TARGET_NUM_SCREENSHOTS
+) -> list[Image.Image]:
+    """
+    Pick up to `target_num_screenshots` frames that capture UI changes.
+
+    Candidates are sampled at SCENE_CANDIDATES_PER_SCREENSHOT times the
+    target rate from a low-resolution decode (ffmpeg does the scaling), and
+    only the selected timestamps are then decoded at full resolution.
+    """
+    start_time = time.perf_counter()
+
+    thumbnail_clip = VideoFileClip(
+        video_path, audio=False, target_resolution=(SCENE_THUMBNAIL_HEIGHT, None)
+    )
+    try:
+        total_frames = cast(int, thumbnail_clip.reader.nframes)  # type: ignore
+        fps = cast(float, thumbnail_clip.fps)
+        candidate_timestamps = sample_frame_timestamps(
+            total_frames,
+            fps,
+            target_num_screenshots * SCENE_CANDIDATES_PER_SCREENSHOT,
+            cast(float, thumbnail_clip.duration),
+        )
+        # Compare in colour: averaging channels to grayscale makes e.g. pure
+        # red and pure blue backgrounds identical
+        thumbnails = np.stack(
+            [thumbnail_clip.get_frame(t) for t in candidate_timestamps]
+        )
+    finally:
+        thumbnail_clip.close()
+
+    selected = select_informative_frames(
+        thumbnails, target_num_screenshots, SCENE_DUPLICATE_THRESHOLD
+    )
+    print(
+        f"[VIDEO] Selected {len(selected)} of {len(candidate_timestamps)} candidate frames "
+        f"in {time.perf_counter() - start_time:.2f} seconds"
+    )
+
+    clip = VideoFileClip(video_path, audio=False)
+    try:
+        return extract_frames_at(clip, [candidate_timestamps[i] for i in selected])
+    finally:
+        clip.close()
+
+
+def select_informative_frames(
+    thumbnails: np.ndarray, max_frames: int, duplicate_threshold: float
+) -> list[int]:
+    """
+    Choose the indices of the most informative frames, in time order.
+
+    Starting from the first frame, repeatedly take the frame whose mean
+    absolute difference to its closest already-selected frame is largest.
+    This picks frames right after UI changes first, spreads picks over
+    gradual changes such as scrolling, and stops once every remaining frame
+    is within `duplicate_threshold` of a selected one.
+
+    :param thumbnails: Array of frames, shape (frames, height, width[, channels]).
+    """
+    num_frames = len(thumbnails)
+    if num_frames == 0:
+        return []
+
+    frames = thumbnails.astype(np.float32)
+    pixel_axes = tuple(range(1, frames.ndim))
+    selected = [0]
+    min_distances = np.abs(frames - frames[0]).mean(axis=pixel_axes)
+
+    while len(selected) < max_frames:
+        index = int(np.argmax(min_distances))
+        if min_distances[index] < duplicate_threshold:
+            break
+        selected.append(index)
+        distances = np.abs(frames - frames[index]).mean(axis=pixel_axes)
+        min_distances = np.minimum(min_distances, distances)
+
+    return sorted(selected)
 
 
 # Save a list of PIL images to a random temporary directory
@@ -0,0 +1,79 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List
+
+
+class ChunkCoalescer:
+    """
+    Buffers streamed `chunk` messages per variant and sends them as one frame.
+
+    Providers often stream deltas of only a few characters, so sending every
+    delta as its own JSON frame costs an encode and a socket write each.
+    Chunks for a variant are held for at most `flush_interval` seconds or
+    until `max_buffer_size` characters are buffered, whichever comes first.
+    Callers must `flush` a variant before sending any other message for it so
+    the client still receives chunks before `setCode`/`variantComplete`.
+    """
+
+    def __init__(
+        self,
+        send_chunk: Callable[[str, int], Awaitable[None]],
+        flush_interval: float,
+        max_buffer_size: int,
+    ):
+        self.send_chunk = send_chunk
+        self.flush_interval = flush_interval
+        self.max_buffer_size = max_buffer_size
+        self._buffers: Dict[int, List[str]] = {}
+        self._buffer_sizes: Dict[int, int] = {}
+        self._timers: Dict[int, asyncio.Task[None]] = {}
+        # Keeps frames in order when a timer flush and an explicit flush overlap
+        self._send_lock = asyncio.Lock()
+
+    async def add(self, content: str, variant_index: int) -> None:
+        """Buffer a chunk, flushing if the buffer is full"""
+        if self.flush_interval <= 0:
+            async with self._send_lock:
+                await self.send_chunk(content, variant_index)
+            return
+
+        self._buffers.setdefault(variant_index, []).append(content)
+        size = self._buffer_sizes.get(variant_index, 0) + len(content)
+        self._buffer_sizes[variant_index] = size
+
+        if size >= self.max_buffer_size:
+            await self.flush(variant_index)
+        elif variant_index not in self._timers:
+            self._timers[variant_index] = asyncio.create_task(
+                self._flush_later(variant_index)
+            )
+
+    async def flush(self, variant_index: int) -> None:
+        """Send everything buffered for a variant immediately"""
+        timer = self._timers.pop(variant_index, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+
+        async with self._send_lock:
+            parts = self._buffers.pop(variant_index, None)
+            self._buffer_sizes.pop(variant_index, None)
+            if parts:
+                await self.send_chunk("".join(parts), variant_index)
+
+    async def flush_all(self) -> None:
+        for variant_index in list(self._buffers):
+            await self.flush(variant_index)
+
+    def cancel(self) -> None:
+        """Drop pending timers without sending (e.g. the socket is closing)"""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._buffers.clear()
+        self._buffer_sizes.clear()
+
+    async def _flush_later(self, variant_index: int) -> None:
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush(variant_index)
+        except Exception as e:
+            print(f"Failed to flush chunks for variant {variant_index + 1}: {e}")
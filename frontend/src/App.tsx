@@ -17,6 +17,7 @@ import useBrowserTabIndicator from "./hooks/useBrowserTabIndicator";
 import { useAppStore, StatusUpdate, ThinkingStep } from "./store/app-store";
 import { extractUIStructure, UIExtractionResult } from "./services/extractionService";
 import { useProjectStore } from "./store/project-store";
+import { replacePlaceholderImage } from "./lib/images";
 import Sidebar from "./components/sidebar/Sidebar";
 import PreviewPane from "./components/preview/PreviewPane";
 import DeprecationMessage from "./components/messages/DeprecationMessage";
@@ -508,6 +509,17 @@ function App() {
         console.log(`Backend is using ${count} variants`);
         resizeVariants(commit.hash, count);
       },
+      onImageReady: (alt, url, variantIndex) => {
+        const variant =
+          useProjectStore.getState().commits[commit.hash]?.variants[variantIndex];
+        if (variant) {
+          setCommitCode(
+            commit.hash,
+            variantIndex,
+            replacePlaceholderImage(variant.code, alt, url)
+          );
+        }
+      },
       onThinking: (content, variantIndex) => {
         console.log(`Thinking step from variant ${variantIndex}:`, content);
         const thinkingStep: ThinkingStep = {
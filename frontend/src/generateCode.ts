@@ -1,5 +1,5 @@
 import toast from "react-hot-toast";
-import { WS_BACKEND_URL } from "./config";
+import { HTTP_BACKEND_URL, WS_BACKEND_URL } from "./config";
 import {
   APP_ERROR_WEB_SOCKET_CODE,
   USER_CLOSE_WEB_SOCKET_CODE,
@@ -20,6 +20,7 @@ type WebSocketResponse = {
     | "variantComplete"
     | "variantError"
     | "variantCount"
+    | "imageReady"
     | "thinking"
     | "reasoning"
     | "phase";
@@ -35,6 +36,7 @@ interface CodeGenerationCallbacks {
   onVariantComplete: (variantIndex: number) => void;
   onVariantError: (variantIndex: number, error: string) => void;
   onVariantCount: (count: number) => void;
+  onImageReady: (alt: string, url: string, variantIndex: number) => void;
   onThinking: (content: string, variantIndex: number) => void;
   onReasoning: (content: string, variantIndex: number) => void;
   onPhase: (phase: string, status: string, variantIndex: number) => void;
@@ -42,11 +44,47 @@ interface CodeGenerationCallbacks {
   onComplete: () => void;
 }
 
-export function generateCode(
+// Upload the video as a raw file and reference it by ID so the WebSocket
+// request doesn't carry a large base64 data URL
+async function uploadVideoFromPrompt(
+  params: FullGenerationSettings
+): Promise<FullGenerationSettings> {
+  const videoDataUrl = params.prompt.images[0];
+  if (params.inputMode !== "video" || !videoDataUrl?.startsWith("data:")) {
+    return params;
+  }
+
+  const videoBlob = await (await fetch(videoDataUrl)).blob();
+  const response = await fetch(`${HTTP_BACKEND_URL}/video/upload`, {
+    method: "POST",
+    headers: { "Content-Type": videoBlob.type },
+    body: videoBlob,
+  });
+  if (!response.ok) {
+    throw new Error(`Video upload failed: ${response.status}`);
+  }
+  const { videoUploadId } = await response.json();
+
+  return {
+    ...params,
+    prompt: { ...params.prompt, images: [], videoUploadId },
+  };
+}
+
+export async function generateCode(
   wsRef: React.MutableRefObject<WebSocket | null>,
   params: FullGenerationSettings,
   callbacks: CodeGenerationCallbacks
 ) {
+  try {
+    params = await uploadVideoFromPrompt(params);
+  } catch (error) {
+    console.error("Error uploading video", error);
+    toast.error(ERROR_MESSAGE);
+    callbacks.onCancel();
+    return;
+  }
+
   const wsUrl = `${WS_BACKEND_URL}/generate-code`;
   console.log("Connecting to backend @ ", wsUrl);
 
@@ -71,6 +109,9 @@ export function generateCode(
       callbacks.onVariantError(response.variantIndex, response.value);
     } else if (response.type === "variantCount") {
       callbacks.onVariantCount(parseInt(response.value));
+    } else if (response.type === "imageReady") {
+      const { alt, url } = JSON.parse(response.value);
+      callbacks.onImageReady(alt, url, response.variantIndex);
     } else if (response.type === "thinking") {
       callbacks.onThinking(response.value, response.variantIndex);
     } else if (response.type === "reasoning") {
@@ -0,0 +1,85 @@
+const PLACEHOLDER_URL_PREFIX = "https://placehold.co";
+
+// An <img> tag ends at the first ">" outside of a quoted attribute value
+const IMG_TAG_PATTERN = /<img\b(?:"[^"]*"|'[^']*'|[^'">])*>/gi;
+const ATTRIBUTE_PATTERN =
+  /([^\s"'>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?/g;
+
+function decodeEntities(value: string): string {
+  const textarea = document.createElement("textarea");
+  textarea.innerHTML = value;
+  return textarea.value;
+}
+
+function escapeAttribute(value: string): string {
+  return value
+    .replace(/&/g, "&amp;")
+    .replace(/"/g, "&quot;")
+    .replace(/</g, "&lt;")
+    .replace(/>/g, "&gt;");
+}
+
+function placeholderDimensions(src: string): [number, number] {
+  const match = src.match(/(\d+)x(\d+)/);
+  return match ? [parseInt(match[1]), parseInt(match[2])] : [100, 100];
+}
+
+function setAttributes(tag: string, updates: Record<string, string>): string {
+  const attributes = tag.slice(4, -1);
+  const seen = new Set<string>();
+  let rewritten = attributes.replace(
+    ATTRIBUTE_PATTERN,
+    (attribute: string, name: string) => {
+      const key = name.toLowerCase();
+      if (key in updates && !seen.has(key)) {
+        seen.add(key);
+        return `${key}="${escapeAttribute(updates[key])}"`;
+      }
+      return attribute;
+    }
+  );
+
+  const missing = Object.keys(updates)
+    .filter((name) => !seen.has(name))
+    .map((name) => ` ${name}="${escapeAttribute(updates[name])}"`)
+    .join("");
+  if (missing) {
+    const selfClosing = rewritten.match(/\s*\/?\s*$/)?.[0] ?? "";
+    rewritten =
+      rewritten.slice(0, rewritten.length - selfClosing.length) +
+      missing +
+      selfClosing;
+  }
+  return `<img${rewritten}>`;
+}
+
+// Swap placeholder images with the given alt text for a generated image,
+// leaving the rest of the code untouched. Mirrors replace_placeholder_images
+// in the backend.
+export function replacePlaceholderImage(
+  code: string,
+  alt: string,
+  url: string
+): string {
+  return code.replace(IMG_TAG_PATTERN, (tag) => {
+    const attributes: Record<string, string> = {};
+    for (const match of tag.slice(4, -1).matchAll(ATTRIBUTE_PATTERN)) {
+      const name = match[1].toLowerCase();
+      if (!(name in attributes)) {
+        attributes[name] = decodeEntities(match[2] ?? match[3] ?? match[4] ?? "");
+      }
+    }
+
+    const src = attributes["src"];
+    if (!src?.startsWith(PLACEHOLDER_URL_PREFIX) || attributes["alt"] !== alt) {
+      return tag;
+    }
+
+    const [width, height] = placeholderDimensions(src);
+    return setAttributes(tag, {
+      src: url,
+      width: String(width),
+      height: String(height),
+    });
+  });
+}
@@ -36,6 +36,7 @@ export interface PromptContent {
   text: string;
   images: string[]; // Array of data URLs
   additionalFiles?: any[]; // Additional files like CSS, assets, etc.
+  videoUploadId?: string; // Set instead of images for videos uploaded via /video/upload
 }
 
 export interface SerializedFile {